@@ -1,10 +1,12 @@
 import pygame as pg
-import random
 from typing import List
 from game_settings import SCREENRECT
+from pool import Pooled
+from entity_store import StoredEntity
+from random_streams import STREAMS
 
 
-class Alien(pg.sprite.Sprite):
+class Alien(StoredEntity, Pooled, pg.sprite.Sprite):
     """An alien spaceship. That slowly moves down the screen"""
 
     animcycle = 12
@@ -12,15 +14,24 @@ class Alien(pg.sprite.Sprite):
     images: List[pg.Surface] = []
 
     def __init__(self, *groups):
-        pg.sprite.Sprite.__init__(self, *groups)
+        pg.sprite.Sprite.__init__(self)
+        self.rect = pg.Rect(0, 0, 0, 0)
+        self.reset(*groups)
+
+    def reset(self, *groups):
         self.image = self.images[0]
-        self.rect = self.image.get_rect()
-        self.x_vel = random.choice((-1, 1, 0))
+        self.rect.size = self.image.get_size()
+        self.rect.topleft = (0, 0)
+        self.x_vel = STREAMS.movement.choice((-1, 1, 0))
         self.y_vel = 1
         self.frame = 0
-        self.rect.right = random.uniform(111, SCREENRECT.right)
+        self.rect.right = STREAMS.spawn.uniform(111, SCREENRECT.right)
+        self.add(*groups)
+        self.attach_to_store()
 
     def update(self):
+        if self.slot is not None:
+            return  # moved by the entity store
         self.rect.move_ip(self.x_vel, self.y_vel)
         if not SCREENRECT.contains(self.rect):
             self.x_vel = -self.x_vel
@@ -28,6 +39,6 @@ class Alien(pg.sprite.Sprite):
         self.frame = self.frame + 1
         self.image = self.images[self.frame // self.animcycle % 3]
         if self.frame % self.period == 0:
-            self.x_vel = random.choice((-1, 1, 0))
+            self.x_vel = STREAMS.movement.choice((-1, 1, 0))
         if self.rect.bottom >= SCREENRECT.height:
-            self.kill()
+            self.despawn()
@@ -0,0 +1,293 @@
+"""
+Packed cache of the decoded game assets.
+
+The cache file holds the images as raw pixels in the display format
+(with the flipped variants and the tiled background already made)
+and the sound effects as raw PCM samples. At startup it is memory
+mapped and the assets are read from it instead of being decoded.
+It is ignored when one of its source files has changed, when the
+display or mixer format differs, or when its version is outdated.
+
+Build it ahead of time with:
+    python asset_cache.py
+"""
+
+import hashlib
+import json
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import pygame as pg
+
+from tools import decode_image, load_sound
+from game_settings import MAIN_DIR, ASSET_CACHE_FILE
+
+CACHE_MAGIC = b"GSSASSET"
+CACHE_VERSION = 1
+_PREFIX = struct.Struct("<8sII")   # magic, version, header length
+_PIXEL_FORMAT = "BGRA"
+
+
+def _source_path(file):
+    return os.path.join(MAIN_DIR, "data", file)
+
+
+def _file_hash(path):
+    with open(path, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def _display_key():
+    surface = pg.display.get_surface()
+    if surface is None:
+        return None
+    return [surface.get_bitsize(), *surface.get_masks()]
+
+
+def _mixer_key():
+    if not pg.mixer or not pg.mixer.get_init():
+        return None
+    return list(pg.mixer.get_init())
+
+
+class AssetCache:
+    """Loads images and sounds from the cache file, falling back to
+    tools.load_image / load_sound. Everything loaded the slow way is
+    remembered so that save() can write a fresh cache.
+    """
+
+    def __init__(self, path=ASSET_CACHE_FILE):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._map = None
+        self._file = None
+        self._entries = {}
+        self._data_start = 0
+        self._sounds_valid = False
+        self._cached_sources = {}
+        # assets loaded without the cache, kept for save()
+        self._images = {}
+        self._sounds = {}
+        self._sources = set()
+        # images being decoded by worker threads, by file
+        self._decoding = {}
+        self._lock = threading.Lock()
+
+    def open(self):
+        """Maps the cache file. Returns False if it is missing or stale."""
+        self.close()
+        try:
+            self._file = open(self.path, "rb")
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, version, header_len = _PREFIX.unpack_from(self._map, 0)
+            if magic != CACHE_MAGIC or version != CACHE_VERSION:
+                raise ValueError("outdated asset cache")
+            start = _PREFIX.size
+            header = json.loads(self._map[start:start + header_len])
+        except (OSError, ValueError, struct.error):
+            self.close()
+            return False
+        if header["display"] != _display_key() or not self._sources_valid(header["sources"]):
+            self.close()
+            return False
+        self._entries = header["entries"]
+        self._cached_sources = header["sources"]
+        self._data_start = _PREFIX.size + header_len
+        self._sounds_valid = header["mixer"] == _mixer_key()
+        return True
+
+    def close(self):
+        self._entries = {}
+        self._cached_sources = {}
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    @staticmethod
+    def _sources_valid(sources):
+        for file, (mtime_ns, digest) in sources.items():
+            path = _source_path(file)
+            try:
+                if os.stat(path).st_mtime_ns == mtime_ns:
+                    continue
+                # touched, but the content may still be the same
+                if _file_hash(path) == digest:
+                    continue
+            except OSError:
+                pass
+            return False
+        return True
+
+    def _blob(self, entry):
+        start = self._data_start + entry["offset"]
+        return memoryview(self._map)[start:start + entry["length"]]
+
+    def prefetch_images(self, executor, files):
+        """Starts decoding the files that are not in the cache
+        on the 'executor' threads.
+        """
+        for file in files:
+            cached = any(name == file or name.startswith(file + ":")
+                         for name in self._entries)
+            if not cached and file not in self._decoding:
+                self._decoding[file] = executor.submit(decode_image, file)
+
+    def _load_image(self, file):
+        future = self._decoding.pop(file, None)
+        surface = future.result() if future is not None else decode_image(file)
+        return surface.convert()
+
+    def image(self, file, flip=False):
+        name = f"{file}:flip" if flip else file
+        entry = self._entries.get(name)
+        if entry is not None:
+            self.hits += 1
+            blob = self._blob(entry)
+            surface = pg.image.frombuffer(blob, entry["size"], _PIXEL_FORMAT).convert()
+            blob.release()
+            if entry["colorkey"] is not None:
+                surface.set_colorkey(entry["colorkey"])
+            return surface
+        self.misses += 1
+        surface = self._load_image(file)
+        if flip:
+            surface = pg.transform.flip(surface, 1, 0)
+        self._images[name] = surface
+        self._sources.add(file)
+        return surface
+
+    def background(self, file, size):
+        """The 'file' image tiled across a surface of 'size'."""
+        name = f"{file}:tiled:{size[0]}x{size[1]}"
+        entry = self._entries.get(name)
+        if entry is not None:
+            self.hits += 1
+            blob = self._blob(entry)
+            background = pg.image.frombuffer(blob, entry["size"], _PIXEL_FORMAT).convert()
+            blob.release()
+            return background
+        self.misses += 1
+        bgdtile = self._load_image(file)
+        background = pg.Surface(size)
+        for x in range(0, size[0], bgdtile.get_width()):
+            background.blit(bgdtile, (x, 0))
+        self._images[name] = background
+        self._sources.add(file)
+        return background
+
+    def sound(self, file):
+        """Can be called from worker threads."""
+        if not pg.mixer:
+            return None
+        entry = self._entries.get(file) if self._sounds_valid else None
+        if entry is not None:
+            with self._lock:
+                self.hits += 1
+            blob = self._blob(entry)
+            sound = pg.mixer.Sound(buffer=blob)
+            blob.release()
+            return sound
+        sound = load_sound(file)
+        with self._lock:
+            self.misses += 1
+            if sound is not None:
+                self._sounds[file] = sound
+                self._sources.add(file)
+        return sound
+
+    @property
+    def stale(self):
+        """True if something had to be loaded without the cache."""
+        return bool(self.misses)
+
+    def save(self):
+        """Writes every asset loaded so far to the cache file. Returns
+        False when it could not be written; the game runs without it.
+        """
+        entries = {}
+        blobs = []
+        offset = 0
+
+        def add(name, data, **info):
+            nonlocal offset
+            entries[name] = dict(info, offset=offset, length=len(data))
+            blobs.append(data)
+            offset += len(data)
+
+        for name, surface in self._images.items():
+            colorkey = surface.get_colorkey()
+            add(name, pg.image.tobytes(surface, _PIXEL_FORMAT), kind="image",
+                size=list(surface.get_size()),
+                colorkey=list(colorkey) if colorkey is not None else None)
+        # the sounds may still be coming in from the loader threads
+        with self._lock:
+            sounds = dict(self._sounds)
+            loaded_sources = set(self._sources)
+        for name, sound in sounds.items():
+            add(name, sound.get_raw(), kind="sound")
+        # keep what is still valid in the old cache
+        for name, entry in self._entries.items():
+            if name in entries or (entry["kind"] == "sound" and not self._sounds_valid):
+                continue
+            info = {key: value for key, value in entry.items()
+                    if key not in ("offset", "length")}
+            add(name, bytes(self._blob(entry)), **info)
+
+        sources = dict(self._cached_sources)
+        for file in loaded_sources:
+            path = _source_path(file)
+            sources[file] = [os.stat(path).st_mtime_ns, _file_hash(path)]
+        has_sounds = any(entry["kind"] == "sound" for entry in entries.values())
+        header = json.dumps({
+            "display": _display_key(),
+            "mixer": _mixer_key() if has_sounds else None,
+            "sources": sources,
+            "entries": entries,
+        }).encode()
+
+        self.close()
+        # a file of its own, other processes may be writing the cache too;
+        # the last one to finish replaces it
+        directory, name = os.path.split(os.path.abspath(self.path))
+        tmp_path = None
+        try:
+            fd, tmp_path = tempfile.mkstemp(prefix=name + ".", suffix=".tmp", dir=directory)
+            # mkstemp makes the file private, a cache is as readable as a plain file
+            umask = os.umask(0)
+            os.umask(umask)
+            os.fchmod(fd, 0o666 & ~umask)
+            with os.fdopen(fd, "wb") as f:
+                f.write(_PREFIX.pack(CACHE_MAGIC, CACHE_VERSION, len(header)))
+                f.write(header)
+                for data in blobs:
+                    f.write(data)
+            os.replace(tmp_path, self.path)
+        except OSError as error:
+            print(f"Warning, unable to write the asset cache {self.path}: {error}")
+            if tmp_path is not None and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return False
+        self.misses = 0
+        return True
+
+
+def main():
+    from game import Game
+
+    game = Game(asset_cache=False)
+    game.initialize(False)
+    # the sounds load in the background, the cache needs all of them
+    game.wait_for_assets()
+    game.assets.save()
+    print(f"Wrote {game.assets.path}")
+
+
+if __name__ == "__main__":
+    main()
+    pg.quit()
@@ -0,0 +1,116 @@
+import math
+import pygame as pg
+
+
+class Voice:
+    """A reserved mixer channel and what it plays."""
+
+    def __init__(self, channel, owner):
+        self.channel = channel
+        self.owner = owner          # the sound the channel is reserved for
+        self.playing = None         # the sound it played last
+        self.started = 0
+
+    def busy(self):
+        return self.channel.get_busy()
+
+
+class VoiceManager:
+    """Plays the sound effects on reserved mixer channels.
+    Requests are queued during a game step and played by flush():
+    - the requests for one sound are merged into a single play,
+      louder with the number of requests
+    - a sound plays on a free channel of its own, or else borrows a
+      free channel of a sound with a lower priority, or else steals
+      one of these channels that played long enough, preferring its
+      own channels lent to other sounds; when there is none the play
+      is dropped
+    Sounds that are not added yet (still loading) are ignored, and so
+    are the sounds with a priority below 'min_priority'.
+    """
+
+    hit_gain = 0.25     # extra volume for every doubling of the requests
+    min_voice_time = 60  # milliseconds a voice plays before it can be stolen
+
+    def __init__(self):
+        self._sounds = {}   # name -> (sound, volume, priority)
+        self._voices = []
+        self._queue = {}
+        self.min_priority = 0
+        self.requests = 0
+        self.played = 0
+        self.merged = 0
+        self.dropped = 0
+        self.stolen = 0
+        self.shed = 0
+
+    def add_sound(self, name, sound, volume=1.0, priority=0, voices=1):
+        """Adds a sound with 'voices' channels reserved for it."""
+        if not pg.mixer or sound is None:
+            return
+        first = len(self._voices)
+        total = first + voices
+        if pg.mixer.get_num_channels() < total:
+            pg.mixer.set_num_channels(total)
+        pg.mixer.set_reserved(total)
+        for i in range(first, total):
+            self._voices.append(Voice(pg.mixer.Channel(i), name))
+        self._sounds[name] = (sound, volume, priority)
+
+    def request(self, name):
+        self.requests += 1
+        if name in self._sounds:
+            if self._sounds[name][2] < self.min_priority:
+                self.shed += 1
+                return
+            self._queue[name] = self._queue.get(name, 0) + 1
+
+    def flush(self):
+        """Plays the requests queued since the last flush."""
+        if not self._queue:
+            return
+        queue = sorted(self._queue.items(),
+                       key=lambda item: -self._sounds[item[0]][2])
+        self._queue = {}
+        for name, count in queue:
+            self.merged += count - 1
+            sound, volume, priority = self._sounds[name]
+            voice = self._find_voice(name, priority)
+            if voice is None:
+                self.dropped += 1
+                continue
+            gain = 1.0 + self.hit_gain * math.log2(count)
+            voice.channel.play(sound)
+            voice.channel.set_volume(min(1.0, volume * gain))
+            voice.playing = name
+            voice.started = pg.time.get_ticks()
+            self.played += 1
+
+    def _find_voice(self, name, priority):
+        own = [voice for voice in self._voices if voice.owner == name]
+        lower = [voice for voice in self._voices
+                 if voice.owner != name and self._sounds[voice.owner][2] < priority]
+        for voice in own + lower:
+            if not voice.busy():
+                return voice
+        # steal a channel lent to another sound first, then the oldest one;
+        # a voice is not cut before it played 'min_voice_time'
+        now = pg.time.get_ticks()
+        candidates = [voice for voice in own + lower
+                      if now - voice.started >= self.min_voice_time
+                      and (voice.owner == name
+                           or self._sounds[voice.playing][2] < priority)]
+        if not candidates:
+            return None
+        self.stolen += 1
+        return min(candidates, key=lambda voice: (voice.playing == name, voice.started))
+
+    def stats(self):
+        return {
+            "requests": self.requests,
+            "played": self.played,
+            "merged": self.merged,
+            "dropped": self.dropped,
+            "stolen": self.stolen,
+            "shed": self.shed,
+        }
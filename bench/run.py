@@ -0,0 +1,172 @@
+#!/usr/bin/env python
+"""
+Benchmark suite: runs the scripted scenarios of bench/scenarios.py on
+a headless Game (drawing to the dummy display) and measures for each:
+- frame time percentiles (p50, p99, mean) in milliseconds
+- bytes allocated per frame (peak traced memory above the frame start)
+- peak resident memory of the process
+- time from Game.initialize() to the first drawn frame, to track the
+  startup over releases (it depends on the asset cache being built)
+
+Every scenario runs in its own process. The results are compared
+with bench/baselines.json and the run fails when a scenario got
+slower or bigger than the baseline by more than the threshold, or
+has no baseline at all. Baselines are machine specific: record them
+on the reference machine.
+
+    python bench/run.py                 compare with the baselines
+    python bench/run.py --record        write the baselines
+    python bench/run.py idle laser      run some scenarios only
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tracemalloc
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+BASELINE_FILE = os.path.join(BENCH_DIR, "baselines.json")
+ALLOC_FRAMES = 100
+# slack on top of the relative threshold, for metrics close to zero
+ABSOLUTE_SLACK = {"p50_ms": 0.05, "p99_ms": 0.2, "alloc_kb_per_frame": 4.0,
+                  "peak_rss_mb": 4.0, "first_frame_ms": 20.0}
+
+
+class ScriptedInput:
+    """Feeds the keys of a scenario to the game, like a replay."""
+
+    def __init__(self, scenario):
+        self.scenario = scenario
+        self.frame = 0
+
+    def next_keystate(self):
+        from replay import KeyState
+        keystate = KeyState(self.scenario.keys(self.frame))
+        self.frame += 1
+        return keystate
+
+
+def measure(name):
+    from game import Game, PROFILER_PHASES
+    from profiler import FrameProfiler
+    from scenarios import SCENARIOS
+
+    scenario = SCENARIOS[name]
+    game = Game(headless=True, seed=0, replay=ScriptedInput(scenario))
+    game.initialize(True)
+    # the player is invulnerable, so every scenario runs to the end
+    game.player.kill = lambda: None
+    scenario.setup(game)
+
+    frames = scenario.frames
+    game.profiler = FrameProfiler(PROFILER_PHASES, size=frames)
+    game.profiler.set_enabled(True)
+    for frame in range(frames):
+        scenario.tick(game, frame)
+        game.advance(draw=True)
+    game.profiler.begin_frame()
+    times = game.profiler.summary()["frame"]
+    game.profiler.set_enabled(False)
+
+    tracemalloc.start()
+    allocated = 0
+    for frame in range(frames, frames + ALLOC_FRAMES):
+        scenario.tick(game, frame)
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        game.advance(draw=True)
+        allocated += tracemalloc.get_traced_memory()[1] - before
+    tracemalloc.stop()
+
+    return {
+        "p50_ms": round(times["p50"], 4),
+        "p99_ms": round(times["p99"], 4),
+        "mean_ms": round(times["mean"], 4),
+        "alloc_kb_per_frame": round(allocated / ALLOC_FRAMES / 1024, 2),
+        # ru_maxrss is in kilobytes on Linux
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "first_frame_ms": round(game.time_to_first_frame * 1000, 1),
+    }
+
+
+def run_scenario(name):
+    output = subprocess.run(
+        [sys.executable, __file__, "--one", name],
+        check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def regressions(result, baseline, threshold):
+    found = []
+    for metric, slack in ABSOLUTE_SLACK.items():
+        if metric not in baseline:
+            continue
+        limit = baseline[metric] * (1 + threshold) + slack
+        if result[metric] > limit:
+            found.append(f"{metric} {result[metric]} > {limit:.2f} "
+                         f"(baseline {baseline[metric]})")
+    return found
+
+
+def main():
+    sys.path.insert(0, BENCH_DIR)
+    parser = argparse.ArgumentParser(description="Run the benchmark scenarios")
+    parser.add_argument("scenarios", nargs="*", help="scenarios to run (default: all)")
+    parser.add_argument("--record", "--update", dest="update", action="store_true",
+                        help="write the results as baselines")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="allowed relative regression (default: 0.25)")
+    parser.add_argument("--one", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.one:
+        print(json.dumps(measure(args.one)))
+        return
+
+    from scenarios import SCENARIOS
+    names = args.scenarios or list(SCENARIOS)
+    for name in names:
+        if name not in SCENARIOS:
+            raise SystemExit(f"Unknown scenario {name}, choose from {', '.join(SCENARIOS)}")
+
+    baselines = {}
+    if os.path.exists(BASELINE_FILE):
+        with open(BASELINE_FILE) as f:
+            baselines = json.load(f)
+
+    failed = False
+    results = {}
+    for name in names:
+        result = results[name] = run_scenario(name)
+        print(f"{name:<16} p50 {result['p50_ms']:7.3f} ms  p99 {result['p99_ms']:7.3f} ms  "
+              f"alloc {result['alloc_kb_per_frame']:8.2f} KB/frame  "
+              f"rss {result['peak_rss_mb']:6.1f} MB  "
+              f"first frame {result['first_frame_ms']:6.1f} ms")
+        if args.update:
+            continue
+        if name not in baselines:
+            # a missing baseline must not pass as "no regression"
+            print(f"  NO BASELINE in {BASELINE_FILE}, record one with --record")
+            failed = True
+            continue
+        for problem in regressions(result, baselines[name], args.threshold):
+            print(f"  REGRESSION {problem}")
+            failed = True
+
+    if args.update:
+        baselines.update(results)
+        with open(BASELINE_FILE, "w") as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Wrote {BASELINE_FILE}")
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""Scripted scenarios for the benchmark suite.
+
+Every scenario prepares a headless Game in setup(), may act on it
+before every frame in tick() and chooses the pressed keys per frame
+with keys(), as replay.KEY_BITS bits.
+"""
+
+import random
+import pygame as pg
+
+import game as game_module
+from alien import Alien
+from explosion import Explosion
+from masks import COLLISION_CATEGORIES
+from replay import KEY_BITS
+from game_settings import SCREENRECT
+
+LEFT = KEY_BITS[pg.K_LEFT]
+RIGHT = KEY_BITS[pg.K_RIGHT]
+SPACE = KEY_BITS[pg.K_SPACE]
+ROCKET = KEY_BITS[pg.K_n]
+DETONATE = KEY_BITS[pg.K_m]
+LASER = KEY_BITS[pg.K_l]
+
+
+def spawn_aliens(game, count):
+    for _ in range(count):
+        Alien.spawn(game.aliens, game._all, game.lastalien)
+
+
+class Scenario:
+    name = ""
+    frames = 600
+
+    def setup(self, game):
+        pass
+
+    def tick(self, game, frame):
+        pass
+
+    def keys(self, frame):
+        return 0
+
+
+class Idle(Scenario):
+    """Nothing pressed, default settings."""
+    name = "idle"
+
+
+class Aliens500(Scenario):
+    """500 aliens on the screen while the player moves and shoots."""
+    name = "aliens_500"
+
+    def setup(self, game):
+        spawn_aliens(game, 500)
+
+    def keys(self, frame):
+        move = LEFT if frame // 60 % 2 else RIGHT
+        return move | (SPACE if frame % 2 else 0)
+
+
+class BombStorm(Scenario):
+    """A bomb every frame from a screen of aliens."""
+    name = "bomb_storm"
+
+    def setup(self, game):
+        game_module.BOMB_ODDS = 1
+        game_module.ALIEN_RELOAD = 5
+        spawn_aliens(game, 100)
+
+
+class RocketField(Scenario):
+    """Rockets detonated in a dense alien field."""
+    name = "rocket_field"
+
+    def setup(self, game):
+        spawn_aliens(game, 300)
+
+    def tick(self, game, frame):
+        # keep the field dense
+        if len(game.aliens) < 300:
+            spawn_aliens(game, 300 - len(game.aliens))
+
+    def keys(self, frame):
+        phase = frame % 10
+        if phase == 0:
+            return ROCKET
+        if phase == 5:
+            return DETONATE
+        return 0
+
+
+class ContinuousLaser(Scenario):
+    """The laser fired again as soon as it is over."""
+    name = "laser"
+
+    def setup(self, game):
+        spawn_aliens(game, 200)
+
+    def tick(self, game, frame):
+        if len(game.aliens) < 200:
+            spawn_aliens(game, 200 - len(game.aliens))
+
+    def keys(self, frame):
+        move = LEFT if frame // 40 % 2 else RIGHT
+        # release the key for one frame so the laser can reload
+        return move | (LASER if frame % 42 else 0)
+
+
+class ExplosionFlood(Scenario):
+    """Fifty explosions of all sizes started every frame."""
+    name = "explosion_flood"
+
+    def setup(self, game):
+        self.rng = random.Random(0)
+        self.widths = [Alien.images[0].get_width(), 16, 179, 400]
+
+    def tick(self, game, frame):
+        rng = self.rng
+        for _ in range(50):
+            rect = pg.Rect(0, 0, rng.choice(self.widths), 10)
+            rect.center = (rng.randrange(SCREENRECT.width), rng.randrange(SCREENRECT.height))
+            Explosion.spawn(rect, game._all)
+
+
+class PixelCollisions(Scenario):
+    """A dense field of aliens and bombs shot at, every collision
+    category tested on the masks after the rects.
+    """
+    name = "pixel_collisions"
+    pixel_collisions = COLLISION_CATEGORIES
+
+    def setup(self, game):
+        game.pixel_collisions = frozenset(self.pixel_collisions)
+        game_module.BOMB_ODDS = 1
+        spawn_aliens(game, 400)
+
+    def tick(self, game, frame):
+        if len(game.aliens) < 400:
+            spawn_aliens(game, 400 - len(game.aliens))
+
+    def keys(self, frame):
+        move = LEFT if frame // 60 % 2 else RIGHT
+        return move | (SPACE if frame % 2 else 0)
+
+
+class RectCollisions(PixelCollisions):
+    """The pixel_collisions scenario with rect-only collisions."""
+    name = "rect_collisions"
+    pixel_collisions = ()
+
+
+SCENARIOS = {scenario.name: scenario for scenario in (
+    Idle(), Aliens500(), BombStorm(), RocketField(), ContinuousLaser(), ExplosionFlood(),
+    PixelCollisions(), RectCollisions())}
@@ -1,13 +1,16 @@
 import pygame as pg
 
 
-class Blast(pg.sprite.Sprite):
-    """describes a blast from rocket"""
+class Blast:
+    """describes the area of a blast from rocket or laser.
+    A blast is not a sprite, it is only used to find the aliens it hits.
+    """
 
     width = 400
     height = 400
 
-    def __init__(self, pos, *groups):
-        pg.sprite.Sprite.__init__(self, *groups)
-        self.image = pg.Surface([self.width, self.height])
-        self.rect = self.image.get_rect(center=pos)
+    @classmethod
+    def area(cls, pos):
+        rect = pg.Rect(0, 0, cls.width, cls.height)
+        rect.center = pos
+        return rect
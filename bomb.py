@@ -2,18 +2,35 @@ import pygame as pg
 from typing import List
 from game_settings import SCREENRECT
 from explosion import Explosion
+from pool import Pooled
+from entity_store import StoredEntity
 
 
-class Bomb(pg.sprite.Sprite):
+class Bomb(StoredEntity, Pooled, pg.sprite.Sprite):
     """A bomb the aliens drop"""
     speed = 4
     images: List[pg.Surface] = []
 
     def __init__(self, alien, explosion_group, *groups):
-        pg.sprite.Sprite.__init__(self, *groups)
+        pg.sprite.Sprite.__init__(self)
+        self.rect = pg.Rect(0, 0, 0, 0)
+        self.reset(alien, explosion_group, *groups)
+
+    def reset(self, alien, explosion_group, *groups):
         self.image = self.images[0]
-        self.rect = self.image.get_rect(midbottom=alien.rect.move(0, 5).midbottom)
+        self.rect.size = self.image.get_size()
+        self.rect.midbottom = alien.rect.midbottom
+        self.rect.move_ip(0, 5)
         self.explosion_group = explosion_group
+        self.add(*groups)
+        self.attach_to_store()
+
+    def velocity(self):
+        return 0, self.speed
+
+    def despawn(self):
+        Explosion.spawn(self.rect, self.explosion_group)
+        self.kill()
 
     def update(self):
         """Called every time around the game loop.
@@ -22,7 +39,8 @@ class Bomb(pg.sprite.Sprite):
         - make an explosion
         - remove the Bomb
         """
+        if self.slot is not None:
+            return  # moved by the entity store
         self.rect.move_ip(0, self.speed)
         if self.rect.bottom >= SCREENRECT.height:
-            Explosion(self, self.explosion_group)
-            self.kill()
+            self.despawn()
@@ -0,0 +1,163 @@
+"""
+Capture of the drawn frames to PNG files or to a video encoder.
+
+grab() copies the screen into one of a ring of preallocated surfaces,
+through the buffer views of the surfaces, and returns at once; a
+worker thread writes the frames out. When all the surfaces are still
+waiting for the worker the frame is dropped (and counted), so the
+capture never holds up the game; with drop=False grab() waits instead,
+for rendering offline.
+
+The output is a PNG file name pattern, "frames/shot_%06d.png" (the
+frame number is added when there is no %), or a video file that a
+local encoder (ffmpeg by default) reads as raw frames from a pipe.
+PNG files are written by CAPTURE_WORKERS threads at a fast zlib level
+(pg.image.save compresses too hard to keep up), the pipe by one thread.
+"""
+
+import os
+import queue
+import shlex
+import struct
+import subprocess
+import threading
+import zlib
+import pygame as pg
+from game_settings import CAPTURE_RING, CAPTURE_WORKERS, CAPTURE_PNG_LEVEL, TICK_RATE
+
+DEFAULT_ENCODER = ("ffmpeg -loglevel error -y -f rawvideo -pix_fmt {pix_fmt} "
+                   "-s {width}x{height} -r {fps} -i - -pix_fmt yuv420p {output}")
+# raw pixel layouts ffmpeg takes as they are: (bytes per pixel, masks) -> pix_fmt
+_PIX_FMTS = {
+    (4, (0xFF0000, 0xFF00, 0xFF)): "bgr0",
+    (4, (0xFF, 0xFF00, 0xFF0000)): "rgb0",
+}
+
+
+def _png_chunk(kind, data):
+    return (struct.pack(">I", len(data)) + kind + data
+            + struct.pack(">I", zlib.crc32(kind + data)))
+
+
+def write_png(surface, path, level=CAPTURE_PNG_LEVEL):
+    """Saves 'surface' as an RGB PNG compressed at zlib 'level'."""
+    width, height = surface.get_size()
+    pixels = memoryview(pg.image.tobytes(surface, "RGB"))
+    stride = width * 3
+    # every row starts with filter type 0 (none)
+    rows = b"".join(b"\0" + pixels[y * stride:(y + 1) * stride] for y in range(height))
+    with open(path, "wb") as f:
+        f.write(b"\x89PNG\r\n\x1a\n")
+        f.write(_png_chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)))
+        f.write(_png_chunk(b"IDAT", zlib.compress(rows, level)))
+        f.write(_png_chunk(b"IEND", b""))
+
+
+class FrameCapture:
+    """Writes the frames given to grab(), see the module doc."""
+
+    def __init__(self, screen, output, encoder=DEFAULT_ENCODER, fps=TICK_RATE,
+                 ring_size=CAPTURE_RING, drop=True):
+        self.output = output
+        self.drop = drop
+        self.size = screen.get_size()
+        self._ring = [screen.copy() for _ in range(ring_size)]
+        self._free = queue.Queue()
+        for slot in range(ring_size):
+            self._free.put(slot)
+        self._filled = queue.Queue()
+        self.frames = 0
+        self.written = 0
+        self.dropped = 0
+        self.error = None
+        self._pipe = None
+        if output.lower().endswith(".png"):
+            if "%" not in output:
+                output = output[:-4] + "_%06d.png"
+            self._pattern = output
+            directory = os.path.dirname(output)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+        else:
+            self._pattern = None
+            first = self._ring[0]
+            self._pix_fmt = _PIX_FMTS.get((first.get_bytesize(), first.get_masks()[:3]))
+            if first.get_pitch() != first.get_width() * first.get_bytesize():
+                self._pix_fmt = None
+            command = encoder.format(
+                pix_fmt=self._pix_fmt or "rgb24", width=self.size[0],
+                height=self.size[1], fps=fps, output=shlex.quote(output))
+            self._pipe = subprocess.Popen(command, shell=True, stdin=subprocess.PIPE)
+        self._lock = threading.Lock()
+        # the frames go through the pipe in order, to files in any order
+        workers = CAPTURE_WORKERS if self._pattern is not None else 1
+        self._workers = [threading.Thread(target=self._work, name="capture", daemon=True)
+                         for _ in range(workers)]
+        for worker in self._workers:
+            worker.start()
+
+    def grab(self, screen):
+        """Queues a copy of 'screen'; returns False when it was dropped."""
+        self.frames += 1
+        try:
+            slot = self._free.get(block=not self.drop)
+        except queue.Empty:
+            self.dropped += 1
+            return False
+        target = self._ring[slot]
+        if screen.get_pitch() == target.get_pitch():
+            # a straight copy of the pixel memory, no surface is made
+            source_view = screen.get_view("0")
+            target_view = target.get_view("0")
+            memoryview(target_view)[:] = memoryview(source_view)
+            del source_view, target_view
+        else:
+            target.blit(screen, (0, 0))
+        self._filled.put((slot, self.frames))
+        return True
+
+    def _work(self):
+        while True:
+            item = self._filled.get()
+            if item is None:
+                return
+            slot, frame = item
+            surface = self._ring[slot]
+            try:
+                if self.error is None:
+                    self._write(surface, frame)
+                    with self._lock:
+                        self.written += 1
+            except (OSError, pg.error) as error:
+                self.error = error
+            self._free.put(slot)
+
+    def _write(self, surface, frame):
+        if self._pattern is not None:
+            write_png(surface, self._pattern % frame)
+        elif self._pix_fmt is not None:
+            self._pipe.stdin.write(surface.get_view("0"))
+        else:
+            self._pipe.stdin.write(pg.image.tobytes(surface, "RGB"))
+
+    def close(self):
+        """Writes out the queued frames and closes the encoder."""
+        for worker in self._workers:
+            self._filled.put(None)
+        for worker in self._workers:
+            worker.join()
+        if self._pipe is not None:
+            try:
+                self._pipe.stdin.close()
+            except OSError:
+                pass
+            self._pipe.wait()
+        if self.error is not None:
+            print(f"Warning, capture to {self.output} failed: {self.error}")
+
+    def stats(self):
+        return {
+            "frames": self.frames,
+            "written": self.written,
+            "dropped": self.dropped,
+        }
@@ -0,0 +1,209 @@
+import pygame as pg
+from game_settings import SCREENRECT, COLLISION_CELL_SIZE
+from random_streams import STREAMS
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+class StoredEntity:
+    """Mixin for sprites whose movement can be run by an EntityStore.
+    When the sprite class has a store, every sprite is attached to it
+    at spawn time, its own update() does nothing and its rect and
+    image are written by the store.
+    """
+
+    store = None
+    slot = None
+
+    def attach_to_store(self):
+        if self.store is not None:
+            self.store.attach(self)
+
+    def velocity(self):
+        return self.x_vel, self.y_vel
+
+    def despawn(self):
+        """Called when the entity leaves the bottom of the screen."""
+        self.kill()
+
+    def kill(self):
+        if self.slot is not None:
+            self.store.detach(self)
+        super().kill()
+
+
+class StoreAwareGroup(pg.sprite.RenderUpdates):
+    """RenderUpdates whose update() leaves out the sprites of the classes
+    that have an EntityStore: their own update() would do nothing. The
+    others are updated in the order of the group.
+    The stores must be set up before the sprites are added.
+    """
+
+    def __init__(self, *sprites):
+        self._updated = {}
+        pg.sprite.RenderUpdates.__init__(self, *sprites)
+
+    def add_internal(self, sprite, layer=None):
+        pg.sprite.RenderUpdates.add_internal(self, sprite, layer)
+        if getattr(sprite, "store", None) is None:
+            self._updated[sprite] = None
+
+    def remove_internal(self, sprite):
+        pg.sprite.RenderUpdates.remove_internal(self, sprite)
+        self._updated.pop(sprite, None)
+
+    def update(self, *args, **kwargs):
+        for sprite in list(self._updated):
+            sprite.update(*args, **kwargs)
+
+
+class EntityStore:
+    """Positions, velocities and frame counters of one kind of entity
+    kept in NumPy arrays (struct of arrays) and stepped in one pass:
+    - move by the velocity
+    - bounce off the sides of the screen ('bounce')
+    - animate with 'animcycle' over the class images
+    - pick a new x velocity from 'x_vels' every 'period' frames
+    - despawn at the bottom of the screen
+    The live entities are kept packed at the front of the arrays.
+    After update(), 'crossed' lists the sprites whose rect entered other
+    cells of a spatial hash of 'cell_size' over SCREENRECT (the grid of
+    a SpatialGroup), the only ones its refresh() has to re-bin.
+    """
+
+    def __init__(self, sprite_class, bounce=False, animcycle=0, period=0,
+                 x_vels=(0,), capacity=256, rng=None, cell_size=COLLISION_CELL_SIZE):
+        if np is None:
+            raise SystemExit("Sorry, numpy is required for the entity store")
+        self.sprite_class = sprite_class
+        self.bounce = bounce
+        self.animcycle = animcycle
+        self.period = period
+        self.x_vels = np.array(x_vels, dtype=np.int32)
+        # a RandomStream for the velocity re-rolls
+        self.rng = rng if rng is not None else STREAMS.movement
+        self.cell_size = cell_size
+        self.count = 0
+        self.crossed = []
+        self._sprites = []
+        self._allocate(capacity)
+
+    def _allocate(self, capacity):
+        def grow(old):
+            new = np.zeros(capacity, dtype=np.int32)
+            if old is not None:
+                new[:self.count] = old[:self.count]
+            return new
+        for name in ("x", "y", "w", "h", "x_vel", "y_vel", "frame", "cells"):
+            setattr(self, name, grow(getattr(self, name, None)))
+        self.capacity = capacity
+
+    def __len__(self):
+        return self.count
+
+    def attach(self, sprite):
+        if self.count == self.capacity:
+            self._allocate(self.capacity * 2)
+        i = self.count
+        rect = sprite.rect
+        self.x[i], self.y[i] = rect.topleft
+        self.w[i], self.h[i] = rect.size
+        self.x_vel[i], self.y_vel[i] = sprite.velocity()
+        self.frame[i] = getattr(sprite, "frame", 0)
+        if self.animcycle:
+            # update() changes the image only when the next one is due
+            images = self.sprite_class.images
+            sprite.image = images[self.frame[i] // self.animcycle % len(images)]
+        # no cell yet, the SpatialGroup bins a new member itself
+        self.cells[i] = -1
+        self._sprites.append(sprite)
+        sprite.slot = i
+        self.count += 1
+
+    def detach(self, sprite):
+        """Frees the sprite's slot by moving the last entity into it."""
+        i = sprite.slot
+        last = self.count - 1
+        if i != last:
+            for array in (self.x, self.y, self.w, self.h,
+                          self.x_vel, self.y_vel, self.frame, self.cells):
+                array[i] = array[last]
+            moved = self._sprites[last]
+            self._sprites[i] = moved
+            moved.slot = i
+        self._sprites.pop()
+        sprite.slot = None
+        self.count = last
+
+    def update(self):
+        n = self.count
+        if not n:
+            return
+        x, y = self.x[:n], self.y[:n]
+        w, h = self.w[:n], self.h[:n]
+        x_vel, y_vel = self.x_vel[:n], self.y_vel[:n]
+        frame = self.frame[:n]
+
+        x += x_vel
+        y += y_vel
+        if self.bounce:
+            outside = ((x < SCREENRECT.left) | (y < SCREENRECT.top)
+                       | (x + w > SCREENRECT.right) | (y + h > SCREENRECT.bottom))
+            x_vel[outside] = -x_vel[outside]
+            np.minimum(x, SCREENRECT.right - w, out=x)
+            np.maximum(x, SCREENRECT.left, out=x)
+            np.minimum(y, SCREENRECT.bottom - h, out=y)
+            np.maximum(y, SCREENRECT.top, out=y)
+        frame += 1
+        if self.period:
+            reroll = frame % self.period == 0
+            rerolls = int(np.count_nonzero(reroll))
+            if rerolls and len(self.x_vels) == 1:
+                # nothing to choose from, draw no numbers like the sprites
+                x_vel[reroll] = self.x_vels[0]
+            elif rerolls:
+                picks = (self.rng.floats(rerolls) * len(self.x_vels)).astype(np.intp)
+                x_vel[reroll] = self.x_vels[picks]
+
+        # write the new state back to the sprites, their rects are
+        # collided and drawn; an image changes once per 'animcycle' frames
+        sprites = self._sprites
+        for sprite, left, top in zip(sprites, x.tolist(), y.tolist()):
+            sprite.rect.topleft = (left, top)
+        if self.animcycle:
+            images = self.sprite_class.images
+            turned = np.flatnonzero(frame % self.animcycle == 0)
+            for i, index in zip(turned.tolist(),
+                                (frame[turned] // self.animcycle % len(images)).tolist()):
+                sprites[i].image = images[index]
+        self.crossed = self._crossed_cells(n)
+
+        gone = np.flatnonzero(y + h >= SCREENRECT.height).tolist()
+        if gone:
+            for sprite in [self._sprites[i] for i in gone]:
+                sprite.despawn()
+
+    def _crossed_cells(self, n):
+        """The sprites whose rect spans other grid cells than before,
+        with the cells clamped to the grid like SpatialHash._span().
+        The span is kept as one number per sprite.
+        """
+        size = self.cell_size
+        x = self.x[:n] - SCREENRECT.left
+        y = self.y[:n] - SCREENRECT.top
+        right = x + np.maximum(self.w[:n], 1) - 1
+        bottom = y + np.maximum(self.h[:n], 1) - 1
+        last_col = -(-SCREENRECT.width // size) - 1
+        last_row = -(-SCREENRECT.height // size) - 1
+        # 7 bits a coordinate, for grids of up to 128 cells a side
+        cells = np.zeros(n, dtype=np.int32)
+        for coordinate, last in ((x, last_col), (y, last_row),
+                                 (right, last_col), (bottom, last_row)):
+            cells <<= 7
+            cells |= np.clip(coordinate // size, 0, last)
+        changed = np.flatnonzero(cells != self.cells[:n])
+        self.cells[:n] = cells
+        return [self._sprites[i] for i in changed.tolist()]
@@ -0,0 +1,325 @@
+"""
+Gym-style interface to the game, for reinforcement learning and
+Monte-Carlo experiments.
+
+GameEnv wraps one headless Game: reset() starts a round and step(action)
+plays one simulation step. An action is a bit mask of the keys held
+during the step (see ACTIONS), so it has the same effects as the
+keyboard. The reward is the change of the score.
+
+VecGameEnv runs several GameEnvs in worker processes and returns
+batched NumPy arrays; the observations are written by the workers
+straight into shared memory.
+
+Only one GameEnv can live in a process: the sprite classes and the
+score are shared by the whole process.
+"""
+
+import multiprocessing as mp
+import traceback
+from multiprocessing import shared_memory
+import pygame as pg
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from game import Game
+from replay import KEY_BITS, KeyState
+from game_settings import SCORE, SCREENRECT
+
+ACTIONS = {
+    "left": KEY_BITS[pg.K_LEFT],
+    "right": KEY_BITS[pg.K_RIGHT],
+    "fire": KEY_BITS[pg.K_SPACE],
+    "rocket": KEY_BITS[pg.K_n],
+    "detonate": KEY_BITS[pg.K_m],
+    "laser": KEY_BITS[pg.K_l],
+}
+NUM_ACTIONS = 1 << len(ACTIONS)
+# seconds between two checks that a worker is still alive while waiting
+WORKER_POLL_INTERVAL = 1.0
+
+# sprite kinds, the kind id in the observation is the index plus one
+KINDS = ("player", "alien", "bomb", "gift", "shot", "rocket", "laser")
+MAX_OBJECTS = 128
+
+
+class GameEnv:
+    """One headless game stepped by actions.
+    The observation is a (MAX_OBJECTS, 5) float32 array with a row
+    (kind id, center x, center y, width, height) per sprite, positions
+    scaled to 0.0 - 1.0 of the screen and unused rows zero. With
+    'screen_size' it is a tuple of that array and the screen scaled
+    down to a (height, width, 3) uint8 array.
+    """
+
+    def __init__(self, seed=None, screen_size=None, max_steps=None, seed_stride=1):
+        if np is None:
+            raise SystemExit("Sorry, numpy is required for the game environment")
+        self.screen_size = screen_size
+        self.max_steps = max_steps
+        self.steps = 0
+        # reset() without a seed plays the round seed + episodes * seed_stride,
+        # a VecGameEnv strides by its number of envs so no two rounds repeat
+        self.seed_stride = seed_stride
+        self.episodes = 0
+        self._keystate = KeyState(0)
+        # no asset cache: the workers of a VecGameEnv would all write it
+        self.game = Game(headless=True, seed=seed, replay=self, asset_cache=False)
+        self.game.initialize(True)
+        self.seed = self.game.seed
+        self._score = SCORE.value
+
+    def next_keystate(self):
+        """Called by the game for the input of a step."""
+        return self._keystate
+
+    def reset(self, seed=None):
+        """Starts a round with 'seed', or with the next seed of the
+        episodes after the last seed given.
+        """
+        if seed is not None:
+            self.seed = seed
+            self.episodes = 0
+        self.game.reset(self.seed + self.episodes * self.seed_stride)
+        self.episodes += 1
+        if self.screen_size is not None:
+            # nothing of the new round is on the screen yet
+            self.game.draw()
+        self.steps = 0
+        self._score = SCORE.value
+        return self.observe()
+
+    def step(self, action):
+        """Returns (observation, reward, done, info)."""
+        self._keystate = KeyState(int(action))
+        self.game.advance(draw=self.screen_size is not None)
+        self.steps += 1
+        reward = SCORE.value - self._score
+        self._score = SCORE.value
+        done = not self.game.player.alive() or (
+            self.max_steps is not None and self.steps >= self.max_steps)
+        info = {"score": SCORE.value, "steps": self.steps}
+        return self.observe(), reward, done, info
+
+    def observe(self):
+        sprites = self.observe_sprites(np.zeros((MAX_OBJECTS, 5), dtype=np.float32))
+        if self.screen_size is None:
+            return sprites
+        return sprites, self.observe_screen(
+            np.zeros((self.screen_size[1], self.screen_size[0], 3), dtype=np.uint8))
+
+    def observe_sprites(self, out):
+        out[:] = 0
+        game = self.game
+        groups = (
+            (1, [game.player] if game.player.alive() else []),
+            (2, game.aliens), (3, game.bombs), (4, game.gifts), (5, game.shots),
+            (6, [game.rocket] if game.rocket and game.rocket.alive() else []),
+            (7, [game.laser] if game.laser and game.laser.alive() else []),
+        )
+        width, height = SCREENRECT.size
+        row = 0
+        for kind, sprites in groups:
+            for sprite in sprites:
+                if row == MAX_OBJECTS:
+                    return out
+                rect = sprite.rect
+                out[row] = (kind, rect.centerx / width, rect.centery / height,
+                            rect.width / width, rect.height / height)
+                row += 1
+        return out
+
+    def observe_screen(self, out):
+        small = pg.transform.smoothscale(self.game.screen, self.screen_size)
+        # surfarray is indexed (x, y)
+        out[:] = pg.surfarray.pixels3d(small).transpose(1, 0, 2)
+        return out
+
+    def close(self):
+        pg.quit()
+
+
+class WorkerError(RuntimeError):
+    """A VecGameEnv worker failed or died; the env is closed."""
+
+
+def _worker(index, seed, screen_size, max_steps, pipe, shm_names, num_envs):
+    """Answers every command with ("ok", result), or with ("error",
+    traceback) when it fails, and stops then.
+    """
+    env = None
+    blocks = []
+    sprites = screen = None
+    try:
+        env = GameEnv(seed=seed, screen_size=screen_size, max_steps=max_steps,
+                      seed_stride=num_envs)
+        blocks = [shared_memory.SharedMemory(name=name) for name in shm_names]
+        sprites = np.ndarray((num_envs, MAX_OBJECTS, 5), np.float32, blocks[0].buf)[index]
+        if screen_size is not None:
+            screen = np.ndarray((num_envs, screen_size[1], screen_size[0], 3),
+                                np.uint8, blocks[1].buf)[index]
+
+        def write_observation():
+            env.observe_sprites(sprites)
+            if screen is not None:
+                env.observe_screen(screen)
+
+        while True:
+            command, arg = pipe.recv()
+            if command == "step":
+                _, reward, done, info = env.step(arg)
+                if done:
+                    # start over, the next observation is of the new round
+                    env.reset()
+                write_observation()
+                pipe.send(("ok", (reward, done, info)))
+            elif command == "reset":
+                env.reset(arg)
+                write_observation()
+                pipe.send(("ok", None))
+            elif command == "close":
+                break
+    except (EOFError, KeyboardInterrupt):
+        # the parent is gone or interrupted, nobody to report to
+        pass
+    except Exception:
+        try:
+            pipe.send(("error", traceback.format_exc()))
+        except OSError:
+            pass
+    finally:
+        del sprites, screen
+        for block in blocks:
+            block.close()
+        if env is not None:
+            env.close()
+        pipe.close()
+
+
+class VecGameEnv:
+    """'num_envs' GameEnvs in worker processes, stepped together.
+    step(actions) returns (observations, rewards, dones, infos) with
+    the observations as arrays over all the games; a game that is done
+    is reset at once and returns the first observation of its new round.
+    The observation arrays live in shared memory and are overwritten
+    by the next step; copy them to keep them.
+    When a worker fails or dies, the env is closed and reset() or
+    step() raises a WorkerError with the worker's traceback.
+    """
+
+    def __init__(self, num_envs, seed=0, screen_size=None, max_steps=None):
+        if np is None:
+            raise SystemExit("Sorry, numpy is required for the game environment")
+        self.num_envs = num_envs
+        self.screen_size = screen_size
+        shapes = [((num_envs, MAX_OBJECTS, 5), np.float32)]
+        if screen_size is not None:
+            shapes.append(((num_envs, screen_size[1], screen_size[0], 3), np.uint8))
+        self._blocks = []
+        self._arrays = []
+        for shape, dtype in shapes:
+            size = int(np.prod(shape)) * np.dtype(dtype).itemsize
+            block = shared_memory.SharedMemory(create=True, size=size)
+            self._blocks.append(block)
+            self._arrays.append(np.ndarray(shape, dtype, block.buf))
+
+        context = mp.get_context("spawn")
+        self._pipes = []
+        self._processes = []
+        self.closed = False
+        for index in range(num_envs):
+            parent, child = context.Pipe()
+            process = context.Process(
+                target=_worker, daemon=True,
+                args=(index, seed + index, screen_size, max_steps, child,
+                      [block.name for block in self._blocks], num_envs))
+            process.start()
+            child.close()
+            self._pipes.append(parent)
+            self._processes.append(process)
+
+    def _observations(self):
+        if self.screen_size is None:
+            return self._arrays[0]
+        return self._arrays[0], self._arrays[1]
+
+    def _send(self, index, message):
+        try:
+            self._pipes[index].send(message)
+        except OSError:
+            self._fail(index, "its pipe is closed")
+
+    def _recv(self, index):
+        """The result of worker 'index', checking that it is still alive
+        while waiting, so a dead worker cannot block the caller.
+        """
+        pipe = self._pipes[index]
+        process = self._processes[index]
+        try:
+            while not pipe.poll(WORKER_POLL_INTERVAL):
+                if not process.is_alive():
+                    if pipe.poll():
+                        break
+                    self._fail(index, f"it exited with code {process.exitcode}")
+            status, result = pipe.recv()
+        except (EOFError, OSError):
+            # the pipe closes a moment before the exit code is known
+            process.join(WORKER_POLL_INTERVAL)
+            self._fail(index, f"it exited with code {process.exitcode}")
+        if status == "error":
+            self._fail(index, f"it raised:\n{result}")
+        return result
+
+    def _fail(self, index, reason):
+        self.close()
+        raise WorkerError(f"Game worker {index} failed, {reason}")
+
+    def reset(self, seed=None):
+        for index in range(self.num_envs):
+            self._send(index, ("reset", None if seed is None else seed + index))
+        for index in range(self.num_envs):
+            self._recv(index)
+        return self._observations()
+
+    def step(self, actions):
+        for index, action in enumerate(actions):
+            self._send(index, ("step", int(action)))
+        results = [self._recv(index) for index in range(self.num_envs)]
+        rewards = np.array([reward for reward, _, _ in results], dtype=np.float32)
+        dones = np.array([done for _, done, _ in results], dtype=bool)
+        infos = [info for _, _, info in results]
+        return self._observations(), rewards, dones, infos
+
+    def close(self):
+        """Stops the workers and frees the shared memory; can be called
+        again, also after a failure.
+        """
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            for pipe in self._pipes:
+                try:
+                    pipe.send(("close", None))
+                except OSError:
+                    pass
+            for process in self._processes:
+                process.join(timeout=5)
+                if process.is_alive():
+                    process.terminate()
+                    process.join()
+            for pipe in self._pipes:
+                pipe.close()
+        finally:
+            # the shared memory outlives the processes unless unlinked
+            self._arrays = []
+            for block in self._blocks:
+                block.close()
+                try:
+                    block.unlink()
+                except FileNotFoundError:
+                    pass
+            self._blocks = []
@@ -1,32 +1,109 @@
 import pygame as pg
+from collections import OrderedDict
 from typing import List
+from pool import Pooled
 
+# the explosion when nothing is shed, see Explosion.set_limits()
+EXPLOSION_LIFE = 12
+EXPLOSION_ANIMCYCLE = 3
 
-class Explosion(pg.sprite.Sprite):
+
+class Explosion(Pooled, pg.sprite.Sprite):
     """Alien's explosion"""
-    defaultlife = 12
-    animcycle = 3
+    defaultlife = EXPLOSION_LIFE
+    animcycle = EXPLOSION_ANIMCYCLE
     orig_images: List[pg.Surface] = []
+    # explosions alive at once, more are not started (None - no limit)
+    max_alive = None
+    # explosions in a group, Game.reset() starts it over
+    alive_count = 0
+
+    # scaled frame sets shared by all explosions, keyed by actor width
+    cache_size = 16
+    cache_hits = 0
+    cache_misses = 0
+    _scaled_cache: "OrderedDict[int, List[pg.Surface]]" = OrderedDict()
+
+    def __init__(self, actor_rect, *groups):
+        pg.sprite.Sprite.__init__(self)
+        self.rect = pg.Rect(0, 0, 0, 0)
+        self.reset(actor_rect, *groups)
+
+    @classmethod
+    def set_limits(cls, life_scale=1.0, animcycle_scale=1, max_alive=None):
+        """Scales the life and the animation cycle of the explosions
+        started from now on, from EXPLOSION_LIFE and EXPLOSION_ANIMCYCLE,
+        and caps the number alive; no arguments bring the defaults back.
+        """
+        cls.defaultlife = max(1, round(EXPLOSION_LIFE * life_scale))
+        cls.animcycle = EXPLOSION_ANIMCYCLE * animcycle_scale
+        cls.max_alive = max_alive
+
+    @classmethod
+    def spawn(cls, actor_rect, *groups):
+        """Starts an explosion unless 'max_alive' are running already;
+        returns None then.
+        """
+        if cls.max_alive is not None and cls.alive_count >= cls.max_alive:
+            return None
+        return super().spawn(actor_rect, *groups)
 
-    def __init__(self, actor, *groups):
-        pg.sprite.Sprite.__init__(self, *groups)
-        self.images = self.scale_by_actor(
-            actor.rect.center,
-            actor.rect.width,
-            self.orig_images)
+    def reset(self, actor_rect, *groups):
+        self.images = self.scaled_images(actor_rect.width)
         self.image = self.images[0]
-        self.rect = self.image.get_rect(center=actor.rect.center)
+        self.rect.size = self.image.get_size()
+        self.rect.center = actor_rect.center
         self.life = self.defaultlife
+        self.add(*groups)
+        # only what is in a group is drawn and ever killed
+        if self.alive():
+            Explosion.alive_count += 1
 
-    def scale_by_actor(self, center_coor, actor_width, orig_imgs):
-        imgs = []
-        for i in range(len(orig_imgs)):
-            rect = orig_imgs[i].get_rect(center=center_coor)
-            imgs.append(
-                pg.transform.scale_by(
-                    orig_imgs[i], (actor_width / rect.width)))
+    @classmethod
+    def scaled_images(cls, actor_width):
+        """Returns the explosion frames scaled to 'actor_width'.
+        The frames are shared, so they must not be drawn on.
+        """
+        cache = cls._scaled_cache
+        imgs = cache.get(actor_width)
+        if imgs is not None:
+            cls.cache_hits += 1
+            cache.move_to_end(actor_width)
+            return imgs
+        cls.cache_misses += 1
+        return cls._store(actor_width)
+
+    @classmethod
+    def _store(cls, actor_width):
+        cache = cls._scaled_cache
+        imgs = cls.scale_by_width(actor_width, cls.orig_images)
+        cache[actor_width] = imgs
+        if len(cache) > cls.cache_size:
+            # drop the least recently used frame set
+            cache.popitem(last=False)
         return imgs
 
+    @staticmethod
+    def scale_by_width(actor_width, orig_imgs):
+        return [pg.transform.scale_by(img, actor_width / img.get_width())
+                for img in orig_imgs]
+
+    @classmethod
+    def warm_up(cls, actor_widths):
+        """Scales the frames for the known actor sizes ahead of time.
+        Warming up does not count as cache misses.
+        """
+        for width in actor_widths:
+            if width not in cls._scaled_cache:
+                cls._store(width)
+
+    @classmethod
+    def clear_cache(cls):
+        """Must be called when 'orig_images' changes."""
+        cls._scaled_cache.clear()
+        cls.cache_hits = 0
+        cls.cache_misses = 0
+
     def update(self):
         """Called every time around the game loop.
         Shows the explosion surface for 'default life'.
@@ -37,3 +114,8 @@ class Explosion(pg.sprite.Sprite):
         self.image = self.images[self.life // self.animcycle % 2]
         if self.life <= 0:
             self.kill()
+
+    def kill(self):
+        if self.alive():
+            Explosion.alive_count -= 1
+        super().kill()
@@ -8,101 +8,359 @@ Controls:
 'm' key for rocket explosion
 'l' key for laser
 'f' key to toggle between fullscreen
+'p' key to toggle the frame profiler overlay
+
+Run with '--headless' (optionally '--frames N') to step the simulation
+without window, sound and framerate cap and report the frames per second.
 """
 
 import os
+import time
 import pygame as pg
 import random
 import argparse
+from concurrent.futures import ThreadPoolExecutor, wait
 
 from alien import Alien
 from blast import Blast
 from bomb import Bomb
 from explosion import Explosion
+from particles import ParticleSystem
 from player import Player
 from rocket import Rocket
 from score import Score
+from glyphs import HudField
 from shot import Shot
 from laser import Laser
 from gift import Gift
-from tools import load_image, load_sound
+from spatial_hash import SpatialGroup, groupcollide
+from pool import SpritePool
+from renderer import DirtyRenderer, ScaledImages
+from profiler import FrameProfiler, ProfilerHud
+from replay import Recorder, KEY_BITS
+from latency import LatencyTracker
+from capture import FrameCapture
+from governor import PerformanceGovernor
+from audio import VoiceManager
+from entity_store import EntityStore, StoreAwareGroup
+from asset_cache import AssetCache
+from masks import COLLISION_CATEGORIES, add_masks, clear_masks
+from random_streams import STREAMS
 from game_settings import (MAX_SHOTS, ALIEN_ODDS, BOMB_ODDS, GIFT_ODDS, ALIEN_RELOAD,
-                           GIFT_RELOAD, SCREENRECT, SCORE, MAIN_DIR)
+                           GIFT_RELOAD, TICK_RATE, MAX_CATCHUP_STEPS, MAX_RENDER_FPS,
+                           FALLBACK_REFRESH_RATE,
+                           ENTITY_STORE, ASSET_CACHE, ASSET_LOADER_THREADS, SHOW_HUD, GOVERNOR,
+                           LOW_LATENCY, EXPLOSION_PARTICLES, EXPLOSION_SPRITES,
+                           PIXEL_COLLISIONS, RENDER_SCALE, SCREENRECT, SCORE, MAIN_DIR)
 
 
 # see if we can load more than standard BMP
 if not pg.image.get_extended():
     raise SystemExit("Sorry, extended image module required")
 
+# images decoded before the first frame, in the order they are needed
+FIRST_FRAME_IMAGES = (
+    "fonn.jpg", "spaceship.gif", "ali1.gif", "ali2.gif", "ali3.gif",
+    "explo.gif", "bomb.gif", "shot.gif", "rocket.gif", "lazer.gif",
+    "cow1.gif", "cow2.gif", "cow3.gif",
+)
+# phases of a frame timed by the profiler
+PROFILER_PHASES = (
+    "events", "update", "input", "spawn",
+    "alien_player", "bomb_player", "gift_player",
+    "shots_aliens", "rocket_aliens", "laser_aliens",
+    "draw", "wait",
+)
+# sound effects loaded in the background:
+# attribute -> (file, volume, priority, reserved channels)
+SOUND_EFFECTS = {
+    "boom_sound": ("boom.wav", 0.5, 1, 3),
+    "shoot_sound": ("car_door.wav", 1.0, 0, 2),
+    "rocket_sound": ("rocket.mp3", 1.0, 2, 1),
+    "laser_sound": ("laser.mp3", 0.4, 2, 1),
+    "gift_sound": ("moo.mp3", 1.0, 2, 1),
+}
+
+
+def load_sprite_images(assets):
+    """Loads the images from 'assets' and assigns them to the sprite classes."""
+    Player.images = [assets.image("spaceship.gif"),
+                     assets.image("spaceship.gif", flip=True)]
+    Explosion.orig_images = [assets.image("explo.gif"),
+                             assets.image("explo.gif", flip=True)]
+    Alien.images = [assets.image(im) for im in ("ali1.gif", "ali2.gif", "ali3.gif")]
+    Bomb.images = [assets.image("bomb.gif")]
+    Shot.images = [assets.image("shot.gif")]
+    Rocket.images = [assets.image("rocket.gif")]
+    Laser.images = [assets.image("lazer.gif")]
+    Gift.images = [assets.image(im) for im in ("cow1.gif", "cow2.gif", "cow3.gif")]
+
 
 class Game:
 
-    def __init__(self):
+    def __init__(self, headless=False, entity_store=ENTITY_STORE,
+                 asset_cache=ASSET_CACHE, seed=None, replay=None,
+                 pixel_collisions=PIXEL_COLLISIONS, render_scale=RENDER_SCALE,
+                 governor=GOVERNOR, low_latency=LOW_LATENCY,
+                 explosion_particles=EXPLOSION_PARTICLES,
+                 explosion_sprites=EXPLOSION_SPRITES):
+        self.headless = headless
+        # all the randomness of a session comes from this seed
+        self.seed = seed if seed is not None else random.randrange(2 ** 63)
+        # recorded key states to play instead of the keyboard
+        self.replay = replay
+        self.recorder = None
+        self.entity_store = entity_store
+        self.asset_cache = asset_cache
+        # collision categories tested pixel by pixel after the rect test
+        unknown = set(pixel_collisions) - set(COLLISION_CATEGORIES)
+        if unknown:
+            raise ValueError(f"Unknown collision categories: {', '.join(sorted(unknown))}")
+        self.pixel_collisions = frozenset(pixel_collisions)
+        # the sprites are drawn scaled to a render target of 'render_scale'
+        # of the screen, the simulation keeps the SCREENRECT coordinates
+        self.render_size = (round(SCREENRECT.width * render_scale),
+                            round(SCREENRECT.height * render_scale))
+        self.scaled_images = ScaledImages(render_scale) if render_scale != 1 else None
         self.winstyle = 0
         self.fullscreen = False
         self.screen = None
         self.bestdepth = None
         self.alienreload = ALIEN_RELOAD
         self.giftreload = GIFT_RELOAD
+        # sprite positions before the last simulation step, for interpolation
+        self._prev_positions = {}
+        # sounds and music still loading in the background
+        self._loader = None
+        self._pending_assets = {}
+        self._init_started = None
+        self.time_to_first_frame = None
+        self.profiler = FrameProfiler(PROFILER_PHASES)
+        self.profiler_hud = None
+        self.capture = None
+        # sheds effects when play() runs out of frame time
+        self.governor = PerformanceGovernor(1000.0 / TICK_RATE) if governor else None
+        # the explosion limits are shared by the process, a new game
+        # must not start with what an earlier one shed
+        Explosion.set_limits()
+        # key presses followed to the frame that shows them
+        self.latency = LatencyTracker(KEY_BITS)
+        self.low_latency = low_latency
+        # an explosion is a sprite animation, a particle burst or both
+        self.explosion_sprites = explosion_sprites
+        self.explosion_particles = explosion_particles
+        self.particles = ParticleSystem() if explosion_particles else None
 
     ########################################
     # public interfaces
     ########################################
     def initialize(self, no_sound):
+        self._init_started = time.perf_counter()
         # Initialize pygame
-        if pg.get_sdl_version()[0] == 2:
+        if self.headless:
+            # no window and no audio device: run against SDL's dummy drivers
+            os.environ["SDL_VIDEODRIVER"] = "dummy"
+            os.environ["SDL_AUDIODRIVER"] = "dummy"
+            no_sound = True
+        if pg.mixer and pg.get_sdl_version()[0] == 2:
             pg.mixer.pre_init(44100, 32, 2, 1024)
         pg.init()
 
         self._init_sound(no_sound)
         self._init_display()
+        self._start_asset_loading()
         self._load_images()
-        self._load_sounds()
-        self._init_groups()
-
+        self._collect_loaded_assets()
+        self.renderer = DirtyRenderer(self.screen, self.background)
+        self._init_pools()
         self.clock = pg.time.Clock()
+        self.reset()
+
+    def reset(self, seed=None):
+        """Starts a new round: the sprites, counters and score are set
+        up again and the random numbers restart from the seed.
+        """
+        if seed is not None:
+            self.seed = seed
+        if hasattr(self, "_all"):
+            # dead sprites go back to their pools
+            for sprite in self._all.sprites():
+                sprite.kill()
+        # the count is shared by the process, an earlier game may have
+        # left explosions behind that will never be killed
+        Explosion.alive_count = 0
+        STREAMS.seed(self.seed)
+        self.alienreload = ALIEN_RELOAD
+        self.giftreload = GIFT_RELOAD
+        self._prev_positions = {}
+        self._init_entity_stores()
+        self._init_groups()
+        if self.particles is not None:
+            self.particles.clear()
+            self._all.add(self.particles)
+        if self.profiler_hud is not None:
+            self._all.add(self.profiler_hud)
+        self.renderer.invalidate()
+        if self.recorder is not None:
+            self.start_recording()
 
     def play(self):
+        """Fixed-timestep loop: the simulation advances TICK_RATE times per
+        second whatever the drawing speed is, and every drawn frame shows the
+        sprites interpolated between the last two simulation steps.
+        """
+        if self.low_latency:
+            self._play_late_latched()
+            return
+        step_time = 1.0 / TICK_RATE
+        accumulator = 0.0
+        previous = time.perf_counter()
+        profiler = self.profiler
         while self.player.alive():
-            self._process_events()
+            profiler.begin_frame()
+            now = time.perf_counter()
+            accumulator += now - previous
+            previous = now
 
-            # clear/erase the last drawn sprites
-            self._all.clear(self.screen, self.background)
-            # update all the sprites
-            self._all.update()
-
-            # handle player input
-            keystate = pg.key.get_pressed()
-
-            self._input_move_player(keystate)
-            self._input_fire_bullet(keystate)
-            self._input_fire_rocket(keystate)
-            self._input_explode_rocket(keystate)
-            self._input_fire_laser(keystate)
-
-            self._create_new_alien()
-            self._alien_drop_bombs()
-            self._create_new_gift()
-
-            self._check_alien_player_collision()
-            self._check_bomb_player_collision()
-            self._check_gift_player_collision()
-
-            self._check_bullets_aliens_collision()
-            self._check_rocket_aliens_collision()
-            self._check_laser_aliens_collision()
+            self._process_events()
+            self._collect_loaded_assets()
+            profiler.mark("events")
+
+            # catch up with the real time, but never spiral on a slow machine
+            steps = 0
+            while (accumulator >= step_time
+                    and steps < MAX_CATCHUP_STEPS
+                    and self.player.alive()):
+                self._save_positions()
+                self._step()
+                accumulator -= step_time
+                steps += 1
+            if steps == MAX_CATCHUP_STEPS:
+                accumulator = min(accumulator, step_time)
 
             # draw the scene
-            dirty = self._all.draw(self.screen)
-            pg.display.update(dirty)
+            self._draw_interpolated(accumulator / step_time)
+            self._frame_drawn(now, steps)
+            profiler.mark("draw")
+
+            self.clock.tick(self.max_render_fps)
+            profiler.mark("wait")
+
+    def _play_late_latched(self):
+        """Low-latency loop: sleeps until the next simulation step is due,
+        then takes the events, reads the keys, steps and draws the new
+        state at once. The sprites are not interpolated, which would show
+        them a step behind, and no frame is drawn between two steps.
+        """
+        step_time = 1.0 / TICK_RATE
+        next_step = time.perf_counter()
+        profiler = self.profiler
+        while self.player.alive():
+            profiler.begin_frame()
+            delay = next_step - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            profiler.mark("wait")
+            now = time.perf_counter()
 
-            # cap the framerate at 40fps. Also called 40HZ or 40 times per second.
-            self.clock.tick(40)
+            self._process_events()
+            self._collect_loaded_assets()
+            profiler.mark("events")
+
+            steps = 0
+            while (next_step <= now
+                    and steps < MAX_CATCHUP_STEPS
+                    and self.player.alive()):
+                self._step()
+                next_step += step_time
+                steps += 1
+            if steps == MAX_CATCHUP_STEPS:
+                next_step = max(next_step, now)
+
+            self._draw_interpolated(1.0)
+            self._frame_drawn(now, steps)
+            profiler.mark("draw")
+
+    def _frame_drawn(self, start, steps):
+        """Bookkeeping after the display update of a frame started at 'start'."""
+        self.latency.presented()
+        if self.capture is not None and steps:
+            # one captured frame per simulation step at most
+            self.capture.grab(self.screen)
+        if self.governor is not None and self.governor.observe(
+                (time.perf_counter() - start) * 1000):
+            self._apply_governor_level()
+        if self.time_to_first_frame is None:
+            self._report_first_frame()
+
+    def play_headless(self, max_frames=None, draw=False):
+        """Step the simulation without a framerate cap, drawing only
+        with 'draw'. Runs until the player dies or 'max_frames' steps
+        were made. Returns the number of frames and the elapsed time
+        in seconds.
+        """
+        frames = 0
+        start = time.perf_counter()
+        while self.player.alive() and (max_frames is None or frames < max_frames):
+            self.advance(draw)
+            frames += 1
+        return frames, time.perf_counter() - start
+
+    def advance(self, draw=False):
+        """One uncapped frame: a simulation step and, with 'draw',
+        the drawing of its result.
+        """
+        profiler = self.profiler
+        profiler.begin_frame()
+        # keep SDL's event queue from filling up
+        pg.event.pump()
+        self._collect_loaded_assets()
+        profiler.mark("events")
+        if draw:
+            self._save_positions()
+        self._step()
+        if draw:
+            self._draw_interpolated(1.0)
+            if self.capture is not None:
+                self.capture.grab(self.screen)
+            profiler.mark("draw")
+        if self.time_to_first_frame is None:
+            self._report_first_frame()
+
+    def draw(self):
+        """Draws the sprites where they are, like after a reset()."""
+        self._draw_interpolated(1.0)
+
+    def wait_for_assets(self):
+        """Blocks until the sounds and the music loading in the
+        background are ready.
+        """
+        if self._loader is not None:
+            wait(self._pending_assets.values())
+            self._collect_loaded_assets()
+
+    def toggle_profiler(self):
+        """Switches the frame profiler and its overlay on or off."""
+        enabled = not self.profiler.enabled
+        self.profiler.set_enabled(enabled)
+        if self.profiler_hud is not None:
+            self.profiler_hud.kill()
+            self.profiler_hud = None
+        if enabled and pg.font:
+            self.profiler_hud = ProfilerHud(self.profiler, self._all)
 
     def close(self):
-        if pg.mixer:
-            pg.mixer.music.fadeout(1000)
-        pg.time.wait(1000)
+        if self._loader is not None:
+            self._loader.shutdown(wait=True, cancel_futures=True)
+            self._loader = None
+        if self.asset_cache and self.assets.stale:
+            self.assets.save()
+        self.assets.close()
+        if not self.headless:
+            # a headless game plays no music to fade out
+            if pg.mixer:
+                pg.mixer.music.fadeout(1000)
+            pg.time.wait(1000)
     ########################################
     # private interfaces
     ########################################
@@ -117,28 +375,45 @@ class Game:
             print("Warning, no sound")
             pg.mixer = None
 
+    def _display_flags(self):
+        # without a window there is nothing to scale to
+        return self.winstyle if self.headless else self.winstyle | pg.SCALED
+
     def _init_display(self):
+        # the game draws on a surface of the render size, which SDL
+        # scales up to the window or the full screen
         self.bestdepth = pg.display.mode_ok(
-            SCREENRECT.size,
-            self.winstyle,
+            self.render_size,
+            self._display_flags(),
             32)
         self.screen = pg.display.set_mode(
-            SCREENRECT.size,
-            self.winstyle,
+            self.render_size,
+            self._display_flags(),
             self.bestdepth)
+        self.max_render_fps = self._render_fps_cap()
+
+    @staticmethod
+    def _render_fps_cap():
+        # without a cap play() would spin a core drawing frames nobody sees
+        if MAX_RENDER_FPS is not None:
+            return MAX_RENDER_FPS
+        refresh_rate = getattr(pg.display, "get_current_refresh_rate", None)
+        rate = refresh_rate() if refresh_rate is not None else 0
+        return rate if rate > 0 else FALLBACK_REFRESH_RATE
 
     def _load_images(self):
-        # Load images, assign to sprite classes
-        img = load_image('spaceship.gif')
-        Player.images = [img, pg.transform.flip(img, 1, 0)]
-        img = load_image("explo.gif")
-        Explosion.orig_images = [img, pg.transform.flip(img, 1, 0)]
-        Alien.images = [load_image(im) for im in ("ali1.gif", "ali2.gif", "ali3.gif")]
-        Bomb.images = [load_image("bomb.gif")]
-        Shot.images = [load_image("shot.gif")]
-        Rocket.images = [load_image("rocket.gif")]
-        Laser.images = [load_image("lazer.gif")]
-        Gift.images = [load_image(im) for im in ("cow1.gif", "cow2.gif", "cow3.gif")]
+        assets = self.assets
+        load_sprite_images(assets)
+
+        # masks of every frame that takes part in pixel collisions
+        clear_masks()
+        add_masks(Player.images + Alien.images + Bomb.images + Shot.images)
+
+        # pre-scale the explosion frames for everything that can explode
+        Explosion.clear_cache()
+        Explosion.warm_up(img.get_width() for img in (
+            Alien.images[0], Player.images[0], Bomb.images[0]))
+        Explosion.warm_up([Blast.width])
 
         # decorate the game window
         icon = pg.transform.scale(Alien.images[0], (32, 32))
@@ -147,77 +422,302 @@ class Game:
         pg.mouse.set_visible(0)
 
         # create the background, tile the bgd image
-        bgdtile = load_image("fonn.jpg")
-        self.background = pg.Surface(SCREENRECT.size)
-        for x in range(0, SCREENRECT.width, bgdtile.get_width()):
-            self.background.blit(bgdtile, (x, 0))
+        self.background = assets.background("fonn.jpg", SCREENRECT.size)
+        if self.render_size != SCREENRECT.size:
+            self.background = pg.transform.smoothscale(self.background, self.render_size)
         self.screen.blit(self.background, (0, 0))
         pg.display.flip()
 
-    def _load_sounds(self):
-        # load the sound effects
-        self.boom_sound = load_sound("boom.wav")
-        self.shoot_sound = load_sound("car_door.wav")
-        self.rocket_sound = load_sound("rocket.mp3")
-        self.laser_sound = load_sound("laser.mp3")
-        self.gift_sound = load_sound("moo.mp3")
+    def _start_asset_loading(self):
+        """Images for the first frame are decoded first on the loader
+        threads, the sound effects and the music follow. The sounds
+        stay None, so they are not played, until they are ready.
+        """
+        self.assets = AssetCache()
+        if self.asset_cache:
+            self.assets.open()
+        self._loader = ThreadPoolExecutor(
+            ASSET_LOADER_THREADS, thread_name_prefix="assets")
+        self.assets.prefetch_images(self._loader, FIRST_FRAME_IMAGES)
+        self.audio = VoiceManager()
+        for name, (file, *_) in SOUND_EFFECTS.items():
+            setattr(self, name, None)
+            if pg.mixer:
+                self._pending_assets[name] = self._loader.submit(
+                    self.assets.sound, file)
         if pg.mixer:
             music = os.path.join(MAIN_DIR, "data", "tango.mp3")
             # Musical composition: Tango-La Cumparsita-Rodríguez-Arranged for Strings
-            pg.mixer.music.load(music)
-            pg.mixer.music.play(-1)
-            self.boom_sound.set_volume(0.5)
-            self.laser_sound.set_volume(0.4)
+            self._pending_assets["music"] = self._loader.submit(
+                pg.mixer.music.load, music)
+
+    def _collect_loaded_assets(self):
+        if self._loader is None:
+            return
+        for name, future in list(self._pending_assets.items()):
+            if not future.done():
+                continue
+            del self._pending_assets[name]
+            if name == "music":
+                self._start_music(future)
+            else:
+                self._set_sound(name, future.result())
+        if not self._pending_assets:
+            # everything is loaded; a stale cache stays open for close()
+            # to rewrite it, not in the middle of a frame
+            if not (self.asset_cache and self.assets.stale):
+                self.assets.close()
+            self._loader.shutdown(wait=False)
+            self._loader = None
+
+    def _set_sound(self, name, sound):
+        _, volume, priority, voices = SOUND_EFFECTS[name]
+        self.audio.add_sound(name, sound, volume, priority, voices)
+        setattr(self, name, sound)
+
+    def _start_music(self, future):
+        try:
+            future.result()
+        except pg.error as error:
+            print(f"Warning, unable to load music, {error}")
+            return
+        pg.mixer.music.play(-1)
+
+    def _report_first_frame(self):
+        self.time_to_first_frame = time.perf_counter() - self._init_started
+        # headless runs print it from main(), the bench records it
+        if self.profiler.enabled and not self.headless:
+            print(f"Time to first frame: {self.time_to_first_frame * 1000:.1f} ms")
+
+    def _init_pools(self):
+        # dead sprites of these classes are recycled instead of reallocated
+        self.pools = {}
+        for sprite_class in (Alien, Bomb, Shot, Explosion):
+            sprite_class.pool = SpritePool(sprite_class)
+            self.pools[sprite_class.__name__] = sprite_class.pool
+
+    def pool_stats(self):
+        return {name: pool.stats() for name, pool in self.pools.items()}
+
+    def _init_entity_stores(self):
+        # optionally step aliens, bombs and gifts in NumPy arrays
+        self.stores = []
+        Alien.store = Bomb.store = Gift.store = None
+        if not self.entity_store:
+            return
+        Alien.store = EntityStore(
+            Alien, bounce=True, animcycle=Alien.animcycle,
+            period=Alien.period, x_vels=(-1, 1, 0))
+        Bomb.store = EntityStore(Bomb)
+        Gift.store = EntityStore(
+            Gift, bounce=True, animcycle=Gift.animcycle,
+            period=Gift.period, x_vels=(0,))
+        self.stores = [Alien.store, Bomb.store, Gift.store]
 
     def _init_groups(self):
+        SCORE.value = 0
         # Initialize Game Groups
-        self.aliens = pg.sprite.Group()
-        self.shots = pg.sprite.Group()
-        self.bombs = pg.sprite.Group()
-        self.gifts = pg.sprite.Group()
-        self._all = pg.sprite.RenderUpdates()
+        # groups checked for collisions keep a spatial hash of their sprites
+        self.aliens = SpatialGroup()
+        self.shots = SpatialGroup()
+        self.bombs = SpatialGroup()
+        self.gifts = SpatialGroup()
+        # the sprites moved by an entity store are not updated one by one
+        self._all = StoreAwareGroup()
         self.lastalien = pg.sprite.GroupSingle()
         # instance for a rocket and laser
         self.rocket = None
         self.laser = None
         self.player = Player(self._all)
-        Alien(
+        Alien.spawn(
             self.aliens, self._all, self.lastalien
         )  # note, this 'lives' because it goes into a sprite group
         if pg.font:
             self._all.add(Score(self._all))
+            if SHOW_HUD:
+                self._init_hud()
+
+    def _init_hud(self):
+        """Fields for the ammo, the weapons and the frame rate, right of
+        the score; they share the glyph atlas of the score.
+        """
+        x = SCREENRECT.width - 160
+        fields = (
+            ("Ammo", lambda: MAX_SHOTS - len(self.shots)),
+            ("Rocket", lambda: "out" if self.rocket else "ready"),
+            ("Laser", lambda: Laser.laser_duration - self.laser.laser_duration_counter
+                if self.laser else "ready"),
+            ("FPS", lambda: f"{self.clock.get_fps():.0f}"),
+            ("Load", lambda: self.governor.level if self.governor else "-"),
+            ("Latency", lambda: f"{self.latency.summary()['total']['p50']:.0f} ms"),
+        )
+        for i, (label, value) in enumerate(fields):
+            HudField(label, value, (x, 10 + 24 * i), 12, self._all)
 
     ########################################
     # game loop
     ########################################
+    def _step(self):
+        """One simulation step: sprites, input, spawners and collisions."""
+        mark = self.profiler.mark
+        # update all the sprites
+        self._all.update()
+        for store in self.stores:
+            store.update()
+        self._forget_dead_weapons()
+        self._refresh_spatial_index()
+        mark("update")
+
+        # handle player input
+        keystate = self._read_keystate()
+
+        self._input_move_player(keystate)
+        self._input_fire_bullet(keystate)
+        self._input_fire_rocket(keystate)
+        self._input_explode_rocket(keystate)
+        self._input_fire_laser(keystate)
+        mark("input")
+
+        self._create_new_alien()
+        self._alien_drop_bombs()
+        self._create_new_gift()
+        mark("spawn")
+
+        self._check_alien_player_collision()
+        mark("alien_player")
+        self._check_bomb_player_collision()
+        mark("bomb_player")
+        self._check_gift_player_collision()
+        mark("gift_player")
+
+        self._check_bullets_aliens_collision()
+        mark("shots_aliens")
+        self._check_rocket_aliens_collision()
+        mark("rocket_aliens")
+        self._check_laser_aliens_collision()
+        mark("laser_aliens")
+
+        # play the sounds requested during the step
+        self.audio.flush()
+
+    def _forget_dead_weapons(self):
+        # a rocket that left the screen killed itself in its update()
+        if self.rocket is not None and not self.rocket.alive():
+            self.rocket = None
+        if self.laser is not None and not self.laser.alive():
+            self.laser = None
+
+    def _read_keystate(self):
+        if self.replay is not None:
+            keystate = self.replay.next_keystate()
+        else:
+            keystate = pg.key.get_pressed()
+            self.latency.sampled(keystate)
+        if self.recorder is not None:
+            self.recorder.record(keystate)
+        return keystate
+
+    def start_capture(self, output, drop=True):
+        """Writes the drawn frames to 'output', see capture.FrameCapture.
+        With 'drop' frames are dropped when the writing falls behind.
+        """
+        self.capture = FrameCapture(self.screen, output, drop=drop)
+
+    def stop_capture(self):
+        """Finishes the capture and returns its stats."""
+        capture, self.capture = self.capture, None
+        capture.close()
+        return capture.stats()
+
+    def start_recording(self):
+        self.recorder = Recorder(self.seed, self.entity_store, self.pixel_collisions)
+
+    def save_recording(self, path):
+        self.recorder.save(path, SCORE.value)
+
+    def _save_positions(self):
+        # pooled sprites can be reused within a step, the generation
+        # tells a new life from the old one
+        self._prev_positions = {
+            sprite: (sprite.rect.topleft, getattr(sprite, "generation", 0))
+            for sprite in self._all}
+
+    def _draw_interpolated(self, alpha):
+        """Draws every sprite at 'alpha' (0.0 - 1.0) of the way from its
+        previous to its current position. The simulated rects are
+        not changed.
+        """
+        if self.particles is not None:
+            self.particles.compose()
+        items = []
+        for sprite in self._all:
+            rect = sprite.rect
+            saved = self._prev_positions.get(sprite)
+            if saved is not None:
+                prev, generation = saved
+                if generation == getattr(sprite, "generation", 0):
+                    dx = round((prev[0] - rect.x) * (1.0 - alpha))
+                    dy = round((prev[1] - rect.y) * (1.0 - alpha))
+                    if dx or dy:
+                        rect = rect.move(dx, dy)
+            items.append((sprite, sprite.image, rect))
+        if self.scaled_images is not None:
+            items = self.scaled_images.scale_items(items)
+        self.renderer.render(items)
+
+    def _refresh_spatial_index(self):
+        self.shots.refresh()
+        for group, sprite_class in ((self.aliens, Alien), (self.bombs, Bomb),
+                                    (self.gifts, Gift)):
+            if sprite_class.store is not None:
+                # the store tells which of them crossed into other cells
+                group.refresh(sprite_class.store.crossed)
+            else:
+                group.refresh()
+
     def _process_events(self):
         for event in pg.event.get():
             if event.type == pg.QUIT:
                 return
             if event.type == pg.KEYDOWN and event.key == pg.K_ESCAPE:
                 return
+            if event.type == pg.KEYUP:
+                self.latency.key_up(event.key)
             if event.type == pg.KEYDOWN:
+                self.latency.key_down(event.key)
                 if event.key == pg.K_f:
-                    if not self.fullscreen:
-                        print("Changing to FULLSCREEN")
-                        screen_backup = self.screen.copy()
-                        self.screen = pg.display.set_mode(
-                            SCREENRECT.size,
-                            self.winstyle | pg.FULLSCREEN,
-                            self.bestdepth
-                        )
-                        self.screen.blit(screen_backup, (0, 0))
-                    else:
-                        print("Changing to windowed mode")
-                        screen_backup = self.screen.copy()
-                        self.screen = pg.display.set_mode(
-                            SCREENRECT.size,
-                            self.winstyle,
-                            self.bestdepth
-                        )
-                        self.screen.blit(screen_backup, (0, 0))
-                    pg.display.flip()
-                    self.fullscreen = not self.fullscreen
+                    self._toggle_fullscreen()
+                if event.key == pg.K_p:
+                    self.toggle_profiler()
+
+    def _apply_governor_level(self):
+        settings = self.governor.settings
+        Explosion.set_limits(settings["explosion_life"], settings["explosion_animcycle"],
+                             settings["max_explosions"])
+        self.audio.min_priority = settings["min_sound_priority"]
+        if self.particles is not None:
+            self.particles.burst_scale = settings["particle_scale"]
+
+    def _spawn_slowdown(self):
+        # spawning changes the game, so a recorded or replayed session
+        # is never throttled and stays the same
+        if self.governor is None or self.recorder is not None or self.replay is not None:
+            return 1
+        return self.governor.settings["spawn_slowdown"]
+
+    def _toggle_fullscreen(self):
+        # the window is scaled by SDL, so switching keeps the render target
+        print("Changing to windowed mode" if self.fullscreen else "Changing to FULLSCREEN")
+        try:
+            pg.display.toggle_fullscreen()
+        except pg.error:
+            # not supported by the video driver, set the mode again
+            flags = self._display_flags()
+            if not self.fullscreen:
+                flags |= pg.FULLSCREEN
+            self.screen = pg.display.set_mode(self.render_size, flags, self.bestdepth)
+        self.fullscreen = not self.fullscreen
+        self.renderer.invalidate(self.screen)
 
     def _input_move_player(self, keystate):
         direction = keystate[pg.K_RIGHT] - keystate[pg.K_LEFT]
@@ -229,7 +729,7 @@ class Game:
                 not self.player.reloading
                 and firing 
                 and len(self.shots) < MAX_SHOTS):
-            Shot(self.player.gunpos(), self.shots, self._all)
+            Shot.spawn(self.player.gunpos(), self.shots, self._all)
             self._play_shoot_sound()
         self.player.reloading = firing
 
@@ -247,14 +747,12 @@ class Game:
             self.rocket = None
 
     def _explode_rocket(self):
-        blast = self.rocket.explode()
-        for alien in pg.sprite.spritecollide(
-                blast, self.aliens, 1):
+        area = self.rocket.explode()
+        for alien, _ in self.area_of_effect(area.center, size=area.size):
             self._explode(alien)
             SCORE.value += 1
-        self._explode(blast)
+        self._explode_area(area)
         self.rocket.kill()
-        blast.kill()
 
     def _input_fire_laser(self, keystate):
         lasering = keystate[pg.K_l]
@@ -264,39 +762,57 @@ class Game:
         self.player.reloading_laser = lasering
 
     def _explode_laser(self):
-        blast = self.laser.explode()
-        for alien in pg.sprite.spritecollide(
-                blast, self.aliens, 1):
+        area = self.laser.explode()
+        for alien, _ in self.area_of_effect(area.center, size=area.size):
             self._explode(alien)
             SCORE.value += 1
-        self._explode(blast)
+        self._explode_area(area)
         self.laser.kill()
-        blast.kill()
+
+    def area_of_effect(self, center, radius=None, size=None, falloff=False,
+                       dokill=True):
+        """Finds the aliens caught by a blast at 'center' without creating
+        any sprite. The blast covers a circle of 'radius' or else a rect
+        of 'size'. Returns (alien, strength) pairs in group order; the
+        strength is 1.0, or with 'falloff' it goes down from 1.0 at the
+        center to 0.0 at the edge of the circle.
+        """
+        if radius is None:
+            area = pg.Rect((0, 0), size)
+            area.center = center
+            return [(alien, 1.0) for alien in self.aliens.collide_rect(area, dokill)]
+        hits = self.aliens.collide_circle(center, radius, dokill)
+        if not falloff:
+            return [(alien, 1.0) for alien, _ in hits]
+        return [(alien, 1.0 - distance / radius if radius else 1.0)
+                for alien, distance in hits]
 
     def _create_new_alien(self):
         # Create new alien
         if self.alienreload:
             self.alienreload = self.alienreload - 1
-        elif not int(random.random() * ALIEN_ODDS):
-            Alien(self.aliens, self._all, self.lastalien)
-            self.alienreload = ALIEN_RELOAD
+        elif not int(STREAMS.spawn.random() * ALIEN_ODDS):
+            Alien.spawn(self.aliens, self._all, self.lastalien)
+            self.alienreload = ALIEN_RELOAD * self._spawn_slowdown()
 
     def _alien_drop_bombs(self):
         # Drop bombs
-        if self.lastalien and not int(random.random() * BOMB_ODDS):
-            Bomb(self.lastalien.sprite, self._all, self.bombs, self._all)
+        if self.lastalien and not int(STREAMS.bombs.random() * BOMB_ODDS
+                                      * self._spawn_slowdown()):
+            Bomb.spawn(self.lastalien.sprite, self._all, self.bombs, self._all)
 
     def _create_new_gift(self):
         if self.giftreload != 0:
             self.giftreload = self.giftreload - 1
         else:
-            if random.random() <= GIFT_ODDS:
+            if STREAMS.gifts.random() <= GIFT_ODDS:
                 Gift(self.gifts, self._all)
                 self.giftreload = GIFT_RELOAD
 
     def _check_alien_player_collision(self):
         # Detect collisions between aliens and players.
-        for alien in pg.sprite.spritecollide(self.player, self.aliens, 1):
+        pixel = "alien_player" in self.pixel_collisions
+        for alien in self.aliens.spritecollide(self.player, 1, pixel):
             self._play_boom_sound()
             self._explode(alien)
             self._explode(self.player)
@@ -305,7 +821,8 @@ class Game:
 
     def _check_bullets_aliens_collision(self):
         # See if shots hit the aliens.
-        for alien in pg.sprite.groupcollide(self.aliens, self.shots, 1, 1).keys():
+        pixel = "shot_alien" in self.pixel_collisions
+        for alien in groupcollide(self.aliens, self.shots, 1, 1, pixel).keys():
             self._play_boom_sound()
             self._explode(alien)
             SCORE.value += 1
@@ -314,7 +831,7 @@ class Game:
         # See if rockets hit the aliens.
         if self.rocket:
             rocket_collision = False
-            for alien in pg.sprite.spritecollide(self.rocket, self.aliens, 1):
+            for alien in self.aliens.spritecollide(self.rocket, 1):
                 self._play_boom_sound()
                 self._explode(alien)
                 SCORE.value += 1
@@ -326,7 +843,7 @@ class Game:
     def _check_laser_aliens_collision(self):
         # See if laser hit the aliens.
         if self.laser:
-            for alien in pg.sprite.spritecollide(self.laser, self.aliens, 1):
+            for alien in self.aliens.spritecollide(self.laser, 1):
                 self._play_boom_sound()
                 self._explode(alien)
                 SCORE.value += 1
@@ -336,7 +853,8 @@ class Game:
 
     def _check_bomb_player_collision(self):
         # See if alien bombs hit the player.
-        for bomb in pg.sprite.spritecollide(self.player, self.bombs, 1):
+        pixel = "bomb_player" in self.pixel_collisions
+        for bomb in self.bombs.spritecollide(self.player, 1, pixel):
             self._play_boom_sound()
             self._explode(self.player)
             self._explode(bomb)
@@ -344,45 +862,122 @@ class Game:
 
     def _check_gift_player_collision(self):
         # Detect collisions between gift and player
-        for gift in pg.sprite.spritecollide(self.player, self.gifts, 1):
+        for gift in self.gifts.spritecollide(self.player, 1):
             #self._play_boom_sound()
             SCORE.value += 10
             self._play_gift_sound()
 
     def _play_boom_sound(self):
-        if pg.mixer and self.boom_sound is not None:
-            self.boom_sound.play()
+        self.audio.request("boom_sound")
 
     def _play_shoot_sound(self):
-        if pg.mixer and self.shoot_sound is not None:
-            self.shoot_sound.play()
+        self.audio.request("shoot_sound")
 
     def _play_rocket_sound(self):
-        if pg.mixer and self.rocket_sound is not None:
-            self.rocket_sound.play()
+        self.audio.request("rocket_sound")
 
     def _play_laser_sound(self):
-        if pg.mixer and self.laser_sound is not None:
-            self.laser_sound.play()
+        self.audio.request("laser_sound")
 
     def _play_gift_sound(self):
-        if pg.mixer and self.gift_sound is not None:
-            self.gift_sound.play()
+        self.audio.request("gift_sound")
 
     def _explode(self, obj):
-        Explosion(obj, self._all)
+        self._explode_area(obj.rect)
+
+    def _explode_area(self, area):
+        if self.explosion_sprites:
+            Explosion.spawn(area, self._all)
+        if self.particles is not None:
+            # bigger blasts throw more particles, further
+            scale = max(1.0, area.width / Alien.images[0].get_width())
+            self.particles.emit(area.center, self.explosion_particles * scale,
+                                speed=3.0 * scale ** 0.5)
 
 
 def main():
     parser = argparse.ArgumentParser(description='Control commands:')
     parser.add_argument('-s', action='store_true', help='Sound off')
+    parser.add_argument('--headless', action='store_true',
+                        help='Run the simulation without window, sound and framerate cap')
+    parser.add_argument('--entity-store', action='store_true',
+                        help='Move aliens, bombs and gifts with the NumPy entity store')
+    parser.add_argument('--particles', type=int, default=EXPLOSION_PARTICLES,
+                        help='NumPy particles thrown by every explosion')
+    parser.add_argument('--no-explosion-sprites', action='store_true',
+                        help='Show explosions with the particles only')
+    parser.add_argument('--pixel-collisions', nargs='*', choices=COLLISION_CATEGORIES,
+                        metavar='PAIR',
+                        help='Collide these pairs of sprites by their masks, not only by '
+                             'their rects (no pair: all of ' + ', '.join(COLLISION_CATEGORIES) + ')')
+    parser.add_argument('--render-scale', type=float, default=RENDER_SCALE,
+                        help='Size of the drawn frames relative to the window, e.g. 0.5')
+    parser.add_argument('--no-governor', action='store_true',
+                        help='Never shed effects or spawns when the frames get slow')
+    parser.add_argument('--low-latency', action='store_true',
+                        help='Sleep first, then read the keys, step and draw at once')
+    parser.add_argument('--latency', action='store_true',
+                        help='Print the input latency histogram on exit')
+    parser.add_argument('--profile', action='store_true',
+                        help='Start with the frame profiler on')
+    parser.add_argument('--profile-export', metavar='FILE',
+                        help='Write the profiled frames to a .csv or .json file on exit')
+    parser.add_argument('--record', metavar='FILE',
+                        help='Record the session for replay.py')
+    parser.add_argument('--capture', metavar='OUTPUT',
+                        help='Capture the frames to PNG files (name.png) or a video file')
+    parser.add_argument('--seed', type=int, default=None,
+                        help='Seed of the random numbers')
+    parser.add_argument('--frames', type=int, default=None,
+                        help='Number of frames to simulate in headless mode '
+                             '(default: until the player dies)')
     args = parser.parse_args()
     print('Sound:', args.s)
 
-    game = Game()
+    game = Game(headless=args.headless,
+                entity_store=args.entity_store or ENTITY_STORE,
+                seed=args.seed,
+                pixel_collisions=(PIXEL_COLLISIONS if args.pixel_collisions is None
+                                  else args.pixel_collisions or COLLISION_CATEGORIES),
+                render_scale=args.render_scale,
+                governor=GOVERNOR and not args.no_governor,
+                low_latency=LOW_LATENCY or args.low_latency,
+                explosion_particles=args.particles,
+                explosion_sprites=EXPLOSION_SPRITES and not args.no_explosion_sprites)
     game.initialize(args.s)
-    game.play()
-    game.close()
+    if args.record:
+        game.start_recording()
+    if args.capture:
+        # headless frames are drawn as fast as possible, none is dropped
+        game.start_capture(args.capture, drop=not args.headless)
+    if args.profile or args.profile_export:
+        game.toggle_profiler()
+    if args.headless:
+        try:
+            frames, elapsed = game.play_headless(args.frames, draw=bool(args.capture))
+        finally:
+            # rewrites a stale asset cache and unmaps it
+            game.close()
+        fps = frames / elapsed if elapsed > 0 else float("inf")
+        print(f"Simulated {frames} frames in {elapsed:.3f} s ({fps:.1f} FPS)")
+        if game.time_to_first_frame is not None:
+            print(f"Time to first frame: {game.time_to_first_frame * 1000:.1f} ms")
+        print('Score:', SCORE.value)
+    else:
+        game.play()
+        game.close()
+        if args.latency:
+            print(game.latency.report())
+    if args.capture:
+        stats = game.stop_capture()
+        print(f"Captured {stats['written']} frames to {args.capture}, "
+              f"dropped {stats['dropped']}")
+    if args.record:
+        game.save_recording(args.record)
+        print(f"Wrote {args.record}")
+    if args.profile_export:
+        game.profiler.export(args.profile_export)
+        print(f"Wrote {args.profile_export}")
 
 
 if __name__ == "__main__":
@@ -18,6 +18,52 @@ BOMB_ODDS = 60          # chances a new bomb will drop
 GIFT_ODDS = 0.1          # chances a new gift appears (0.0 - 1.0)
 GIFT_RELOAD = 200       # frame before new gift
 
+TICK_RATE = 40          # simulation steps per second, all speeds are per step
+MAX_CATCHUP_STEPS = 5   # simulation steps allowed before a frame is drawn
+MAX_RENDER_FPS = None   # cap for rendered frames per second (None - display refresh rate, 0 - no cap)
+FALLBACK_REFRESH_RATE = 60  # refresh rate assumed when SDL cannot tell it
+LOW_LATENCY = False     # read the keys right before stepping and drawing, no interpolation
+LATENCY_SAMPLES = 512   # key presses kept by the input latency tracker
+FULL_UPDATE_COVERAGE = 0.5  # dirty share of the screen above which it is flipped whole
+RENDER_SCALE = 1.0      # size of the drawn frames relative to SCREENRECT, scaled up by SDL
+
+COLLISION_CELL_SIZE = 64  # side of a spatial hash cell for collision checks
+# collisions tested on the sprite masks, not only the rects, any of
+# "alien_player", "bomb_player", "shot_alien"; none by default, the
+# rects alone are how the game has always played
+PIXEL_COLLISIONS = ()
+
+PROFILER_FRAMES = 1024  # frames kept by the frame profiler
+GOVERNOR = True         # shed effects and spawns when the frames take too long
+GOVERNOR_WINDOW = 30    # frames averaged by the performance governor
+GOVERNOR_RESTORE_FRAMES = 120  # fast frames in a row before an effect comes back
+
+CAPTURE_RING = 8        # frame buffers waiting for the capture writer
+CAPTURE_WORKERS = 2     # threads writing captured PNG files
+CAPTURE_PNG_LEVEL = 1   # zlib level of the captured PNG files (0 - 9)
+
+RNG_BLOCK_SIZE = 4096   # random numbers generated at once per random stream
+
+ENTITY_STORE = False    # move aliens, bombs and gifts with the NumPy entity store
+EXPLOSION_PARTICLES = 0  # NumPy particles in an explosion burst (0 - no particles)
+EXPLOSION_SPRITES = True  # animate the explosion sprites
+PARTICLE_CAPACITY = 8192  # particles alive at once
+
+POOL_CAPACITY = 256     # dead sprites kept for reuse per pooled sprite class
+
+NET_PORT = 5555         # UDP port of the game server
+SNAPSHOT_HISTORY = 64   # ticks of snapshots kept as baselines for the deltas
+CLIENT_TIMEOUT = 5.0    # seconds of silence after which a client is dropped
+INTERP_DELAY_TICKS = 2  # ticks behind the server the clients draw the sprites
+
+SOAK_INTERVAL = 2400     # simulated frames between two soak test samples
+SOAK_WINDOW = 8          # samples a metric has to keep growing over to be a leak
+SOAK_MEMORY_SLACK = 128  # KB of traced memory allowed to come on over the window
+SOAK_OBJECT_SLACK = 500  # Python objects allowed to come on over the window
+SOAK_TOP_SITES = 10      # allocation sites listed for a leak
+
+SHOW_HUD = False        # show ammo, weapon state and frame rate next to the score
+
 SCREENRECT = pg.Rect(0, 0, 675, 1000)
 SCORE = ScoreValue()
 
@@ -26,3 +72,7 @@ SCORE = ScoreValue()
 
 
 MAIN_DIR = os.path.split(os.path.abspath(__file__))[0]
+
+ASSET_CACHE = True      # load decoded assets from the packed asset cache
+ASSET_CACHE_FILE = os.path.join(MAIN_DIR, "data", "assets.cache")
+ASSET_LOADER_THREADS = 4  # threads decoding images and sounds at startup
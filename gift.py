@@ -1,10 +1,11 @@
 import pygame as pg
-import random
 from typing import List
 from game_settings import SCREENRECT
+from entity_store import StoredEntity
+from random_streams import STREAMS
 
 
-class Gift(pg.sprite.Sprite):
+class Gift(StoredEntity, pg.sprite.Sprite):
     """The gift appears in a random place at the top of the screen
     and gives +10 points to the player
     when it comes into contact with a spaceship"""
@@ -17,12 +18,15 @@ class Gift(pg.sprite.Sprite):
         pg.sprite.Sprite.__init__(self, *groups)
         self.image = self.images[0]
         self.rect = self.image.get_rect()
-        self.x_vel = random.choice((-1, 1, 0))
+        self.x_vel = STREAMS.movement.choice((-1, 1, 0))
         self.y_vel = 2
         self.frame = 0
-        self.rect.right = random.uniform(111, SCREENRECT.right)
+        self.rect.right = STREAMS.gifts.uniform(111, SCREENRECT.right)
+        self.attach_to_store()
 
     def update(self):
+        if self.slot is not None:
+            return  # moved by the entity store
         self.rect.move_ip(self.x_vel, self.y_vel)
         if not SCREENRECT.contains(self.rect):
             self.x_vel = -self.x_vel
@@ -32,4 +36,4 @@ class Gift(pg.sprite.Sprite):
         if self.frame % self.period == 0:
             self.x_vel = 0
         if self.rect.bottom >= SCREENRECT.height:
-            self.kill()
\ No newline at end of file
+            self.despawn()
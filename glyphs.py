@@ -0,0 +1,93 @@
+import pygame as pg
+
+GLYPH_CHARSET = "".join(chr(code) for code in range(32, 127))
+
+
+class GlyphAtlas:
+    """The characters of a font rendered once into a single surface.
+    Text is composed by blitting the glyphs out of the atlas, so no
+    font rendering and no new surface is needed when it changes.
+    Atlases are shared, one per font size and color.
+    """
+
+    _atlases = {}
+
+    @classmethod
+    def get(cls, size, color):
+        key = (size, str(color))
+        atlas = cls._atlases.get(key)
+        if atlas is None:
+            atlas = cls._atlases[key] = cls(pg.font.Font(None, size), color)
+        return atlas
+
+    def __init__(self, font, color, charset=GLYPH_CHARSET):
+        self.height = font.get_height()
+        rendered = [(char, font.render(char, 0, color)) for char in charset]
+        width = sum(glyph.get_width() for _, glyph in rendered)
+        self.surface = pg.Surface((width, self.height))
+        self.surface.set_colorkey((0, 0, 0))
+        # char -> area of its glyph in the atlas
+        self.glyphs = {}
+        x = 0
+        for char, glyph in rendered:
+            self.surface.blit(glyph, (x, 0))
+            self.glyphs[char] = pg.Rect(x, 0, glyph.get_width(), self.height)
+            x += glyph.get_width()
+        self.max_width = max(area.width for area in self.glyphs.values())
+
+    def size(self, text):
+        glyphs = self.glyphs
+        return sum(glyphs[char].width for char in text if char in glyphs), self.height
+
+    def render_into(self, surface, text, pos=(0, 0)):
+        """Blits 'text' on 'surface'; unknown characters are skipped."""
+        x, y = pos
+        atlas = self.surface
+        blits = []
+        for char in text:
+            area = self.glyphs.get(char)
+            if area is not None:
+                blits.append((atlas, (x, y), area))
+                x += area.width
+        surface.blits(blits, doreturn=False)
+
+
+class TextField(pg.sprite.Sprite):
+    """A line of HUD text drawn from a GlyphAtlas into one reused surface
+    of room for 'max_chars' characters. Subclasses return the text in
+    text(); it is only composed again when it changed. 'dirty' is set
+    then, as the image stays the same surface.
+    """
+
+    def __init__(self, pos, max_chars, size=30, color="white", *groups):
+        pg.sprite.Sprite.__init__(self, *groups)
+        self.atlas = GlyphAtlas.get(size, color)
+        self.image = pg.Surface((self.atlas.max_width * max_chars, self.atlas.height))
+        self.image.set_colorkey((0, 0, 0))
+        self.rect = self.image.get_rect(topleft=pos)
+        self.dirty = 1
+        self.lasttext = None
+        self.update()
+
+    def text(self):
+        return ""
+
+    def update(self):
+        text = self.text()
+        if text != self.lasttext:
+            self.lasttext = text
+            self.image.fill((0, 0, 0))
+            self.atlas.render_into(self.image, text)
+            self.dirty = 1
+
+
+class HudField(TextField):
+    """A 'label: value' field of the HUD, 'value' is called for the value."""
+
+    def __init__(self, label, value, pos, max_chars=16, *groups):
+        self.label = label
+        self.value = value
+        TextField.__init__(self, pos, max_chars, 30, "white", *groups)
+
+    def text(self):
+        return f"{self.label}: {self.value()}"
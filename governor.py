@@ -0,0 +1,84 @@
+from collections import deque
+from game_settings import GOVERNOR_WINDOW, GOVERNOR_RESTORE_FRAMES
+
+# what is given up at every level, from level 0 where nothing is:
+# - explosion_life, explosion_animcycle: scales of EXPLOSION_LIFE and
+#   EXPLOSION_ANIMCYCLE (a longer cycle changes the image less often)
+# - max_explosions: explosions alive at once, None for no cap
+# - spawn_slowdown: scale of the alien reload and the bomb odds
+# - min_sound_priority: sound effects of a lower priority are not played
+# - particle_scale: scale of the explosion particle bursts
+GOVERNOR_LEVELS = (
+    dict(explosion_life=1.0, explosion_animcycle=1, max_explosions=None,
+         spawn_slowdown=1, min_sound_priority=0, particle_scale=1.0),
+    dict(explosion_life=0.75, explosion_animcycle=2, max_explosions=64,
+         spawn_slowdown=1, min_sound_priority=0, particle_scale=0.5),
+    dict(explosion_life=0.5, explosion_animcycle=2, max_explosions=32,
+         spawn_slowdown=1, min_sound_priority=1, particle_scale=0.25),
+    dict(explosion_life=0.5, explosion_animcycle=2, max_explosions=16,
+         spawn_slowdown=2, min_sound_priority=1, particle_scale=0.25),
+    dict(explosion_life=0.34, explosion_animcycle=2, max_explosions=8,
+         spawn_slowdown=3, min_sound_priority=2, particle_scale=0),
+)
+
+
+class PerformanceGovernor:
+    """Watches the frame times and moves between the GOVERNOR_LEVELS.
+    One level more is shed when the average of the last 'window' frames
+    takes more than 'high_load' of the budget; one level is restored
+    only after 'restore_after' frames in a row below 'low_load' of it.
+    After a change the governor waits for a new window of frames.
+    """
+
+    high_load = 0.9
+    low_load = 0.6
+
+    def __init__(self, budget_ms, levels=GOVERNOR_LEVELS,
+                 window=GOVERNOR_WINDOW, restore_after=GOVERNOR_RESTORE_FRAMES):
+        self.budget_ms = budget_ms
+        self.levels = levels
+        self.restore_after = restore_after
+        self.level = 0
+        self.frames = 0
+        # (frame, old level, new level, average frame ms) of every change
+        self.history = deque(maxlen=256)
+        self._times = deque(maxlen=window)
+        self._calm = 0
+
+    @property
+    def settings(self):
+        return self.levels[self.level]
+
+    def observe(self, frame_ms):
+        """Adds a frame time; returns True when the level changed."""
+        self.frames += 1
+        times = self._times
+        times.append(frame_ms)
+        if frame_ms < self.low_load * self.budget_ms:
+            self._calm += 1
+        else:
+            self._calm = 0
+        if len(times) < times.maxlen:
+            return False
+        average = sum(times) / len(times)
+        if average > self.high_load * self.budget_ms and self.level < len(self.levels) - 1:
+            self._set_level(self.level + 1, average)
+            return True
+        if self._calm >= self.restore_after and self.level > 0:
+            self._set_level(self.level - 1, average)
+            return True
+        return False
+
+    def _set_level(self, level, average):
+        self.history.append((self.frames, self.level, level, round(average, 2)))
+        self.level = level
+        self._times.clear()
+        self._calm = 0
+
+    def stats(self):
+        return {
+            "level": self.level,
+            "frames": self.frames,
+            "changes": len(self.history),
+            "history": list(self.history),
+        }
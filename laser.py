@@ -15,7 +15,8 @@ class Laser(pg.sprite.Sprite):
         self.laser_duration_counter = 0
 
     def explode(self):
-        return Blast(self.rect.center, self.groups())
+        """Returns the rect of the area the blast covers."""
+        return Blast.area(self.rect.center)
 
     def update(self):
         """Called every time around the game loop.
@@ -0,0 +1,105 @@
+import time
+from array import array
+from game_settings import LATENCY_SAMPLES
+
+# the parts of the latency of a key press, in the order they happen
+LATENCY_PARTS = ("queued", "present", "total")
+
+
+class LatencyTracker:
+    """Follows every press of the game keys from its KEYDOWN event to
+    the display update of the first frame that shows its effect:
+    - queued: from the event to the simulation step that read the key
+    - present: from that step to the end of the display update
+    - total: the sum, the input to photon latency as far as the game
+      can see it (the event is stamped when the game takes it from
+      SDL's queue, the monitor adds its own delay after the update)
+    The last 'size' presses are kept per part, in nanoseconds.
+    A key released before any step read it is counted as missed.
+    """
+
+    def __init__(self, keys, size=LATENCY_SAMPLES):
+        self.keys = set(keys)
+        self.size = size
+        self._rings = [array("q", bytes(8 * size)) for _ in LATENCY_PARTS]
+        self._head = 0
+        self.count = 0
+        self.missed = 0
+        self._pressed = {}      # key -> time of its KEYDOWN
+        self._sampled = []      # (pressed, sampled) not shown yet
+
+    def key_down(self, key, now=None):
+        if key in self.keys:
+            self._pressed[key] = time.perf_counter_ns() if now is None else now
+
+    def key_up(self, key):
+        if self._pressed.pop(key, None) is not None:
+            self.missed += 1
+
+    def sampled(self, keystate):
+        """Called when a step reads 'keystate'."""
+        if not self._pressed:
+            return
+        now = time.perf_counter_ns()
+        for key in [key for key in self._pressed if keystate[key]]:
+            self._sampled.append((self._pressed.pop(key), now))
+
+    def presented(self):
+        """Called when the display update of a frame is done."""
+        if not self._sampled:
+            return
+        now = time.perf_counter_ns()
+        queued, present, total = self._rings
+        for pressed, sampled in self._sampled:
+            head = self._head
+            queued[head] = sampled - pressed
+            present[head] = now - sampled
+            total[head] = now - pressed
+            self._head = (head + 1) % self.size
+            self.count = min(self.count + 1, self.size)
+        self._sampled.clear()
+
+    def _samples(self, ring):
+        if self.count < self.size:
+            return ring[:self.count].tolist()
+        return ring[self._head:].tolist() + ring[:self._head].tolist()
+
+    @staticmethod
+    def _percentile(values, fraction):
+        return values[min(len(values) - 1, int(fraction * len(values)))] if values else 0
+
+    def summary(self):
+        """p50, p90, p99 and max in milliseconds for every part."""
+        result = {}
+        for name, ring in zip(LATENCY_PARTS, self._rings):
+            values = sorted(self._samples(ring))
+            result[name] = {
+                "p50": self._percentile(values, 0.50) / 1e6,
+                "p90": self._percentile(values, 0.90) / 1e6,
+                "p99": self._percentile(values, 0.99) / 1e6,
+                "max": (values[-1] if values else 0) / 1e6,
+            }
+        return result
+
+    def histogram(self, part="total", bucket_ms=5, buckets=12):
+        """Counts of the 'part' latencies in 'bucket_ms' wide buckets;
+        the last bucket takes everything above.
+        """
+        counts = [0] * buckets
+        for value in self._samples(self._rings[LATENCY_PARTS.index(part)]):
+            counts[min(buckets - 1, int(value / 1e6 // bucket_ms))] += 1
+        return counts
+
+    def report(self, bucket_ms=5, buckets=12):
+        """The summary and the histogram of the total latency as text."""
+        lines = [f"Input latency of {self.count} key presses ({self.missed} missed):"]
+        for name, times in self.summary().items():
+            lines.append(f"  {name:<8} p50 {times['p50']:6.1f} ms  p90 {times['p90']:6.1f} ms  "
+                         f"p99 {times['p99']:6.1f} ms  max {times['max']:6.1f} ms")
+        counts = self.histogram("total", bucket_ms, buckets)
+        widest = max(counts) or 1
+        for i, count in enumerate(counts):
+            low = i * bucket_ms
+            label = f"{low:3d}-{low + bucket_ms:<3d}" if i < buckets - 1 else f"{low:3d}+   "
+            lines.append(f"  {label} ms {'#' * round(40 * count / widest):<40} {count}")
+        return "\n".join(lines)
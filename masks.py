@@ -0,0 +1,32 @@
+import pygame as pg
+
+# the pairs of sprite kinds that can be collided pixel by pixel
+COLLISION_CATEGORIES = ("alien_player", "bomb_player", "shot_alien")
+
+# image -> its pg.mask.Mask, by identity of the image surface
+_masks = {}
+
+
+def add_masks(images):
+    """Computes the masks of 'images' up front, one per animation frame."""
+    for image in images:
+        _masks[image] = pg.mask.from_surface(image)
+
+
+def clear_masks():
+    _masks.clear()
+
+
+def mask_of(image):
+    mask = _masks.get(image)
+    if mask is None:
+        mask = _masks[image] = pg.mask.from_surface(image)
+    return mask
+
+
+def collide_masks(a, b):
+    """True when the opaque pixels of sprites 'a' and 'b' overlap.
+    Meant for pairs whose rects are known to collide already.
+    """
+    offset = (b.rect.left - a.rect.left, b.rect.top - a.rect.top)
+    return mask_of(a.image).overlap(mask_of(b.image), offset) is not None
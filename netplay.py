@@ -0,0 +1,606 @@
+#!/usr/bin/env python
+"""
+Shared sessions over the network: one authoritative simulation, any
+number of clients watching and steering it.
+
+GameServer runs a headless Game and sends every client a snapshot of
+the sprites after every simulation step. A snapshot is delta-encoded
+against the last snapshot the client acknowledged: it lists only the
+sprites that are gone and, for the new and changed ones, only the
+fields that changed. The keys of all the clients are merged into the
+input of the player.
+
+GameClient acknowledges the snapshots and sends its keys once per
+tick. It draws the other sprites interpolated between the snapshots
+INTERP_DELAY_TICKS behind the server and predicts the player from
+the keys the server has not applied yet.
+
+Everything goes over UDP, one datagram per message:
+    python netplay.py serve [--port 5555]       run a server
+    python netplay.py join HOST [--port 5555]   open a client window
+    python netplay.py loopback                  server and clients in one
+                                                process, checks that the
+                                                clients decode every state
+"""
+
+import argparse
+import random
+import socket
+import struct
+import time
+from collections import OrderedDict
+import pygame as pg
+
+from alien import Alien
+from bomb import Bomb
+from explosion import Explosion
+from gift import Gift
+from laser import Laser
+from player import Player
+from rocket import Rocket
+from shot import Shot
+from profiler import FrameProfiler
+from replay import KeyState, KEY_BITS, keystate_bits
+from game_settings import (TICK_RATE, NET_PORT, SNAPSHOT_HISTORY, CLIENT_TIMEOUT,
+                           INTERP_DELAY_TICKS, SCORE, SCREENRECT)
+
+# sprite classes sent to the clients, the kind is the index
+KINDS = (Player, Alien, Bomb, Gift, Shot, Rocket, Laser, Explosion)
+_KIND_OF = {cls: kind for kind, cls in enumerate(KINDS)}
+PLAYER_KIND = 0
+
+MSG_SNAPSHOT = 1
+MSG_INPUT = 2
+MSG_BYE = 3
+# type, tick, baseline tick (0 - none), last input applied, score,
+# removed sprites, new or changed sprites
+_SNAPSHOT = struct.Struct("<BIIIqHH")
+_REMOVED = struct.Struct("<I")
+_CHANGED = struct.Struct("<IB")     # sprite id, mask of the fields that follow
+# the fields of a sprite: kind, image index, x, y, width, height
+_FIELDS = [struct.Struct(fmt) for fmt in ("<B", "<B", "<h", "<h", "<H", "<H")]
+_NO_FIELDS = (0, 0, 0, 0, 0, 0)
+_ALL_FIELDS = (1 << len(_FIELDS)) - 1
+# type, acknowledged tick, input sequence number, key bits
+_INPUT = struct.Struct("<BIIB")
+_BYE = bytes([MSG_BYE])
+_MAX_DATAGRAM = 65507
+
+
+def encode_snapshot(tick, baseline, input_seq, score, state, base):
+    """'state' and 'base' map sprite ids to field tuples; 'base' is the
+    state of the 'baseline' tick, empty for a full snapshot.
+    """
+    removed = [sprite_id for sprite_id in base if sprite_id not in state]
+    parts = []
+    changed = 0
+    for sprite_id, fields in state.items():
+        old = base.get(sprite_id)
+        if old == fields:
+            continue
+        if old is None:
+            mask = _ALL_FIELDS
+        else:
+            mask = 0
+            for i, (new_value, old_value) in enumerate(zip(fields, old)):
+                if new_value != old_value:
+                    mask |= 1 << i
+        parts.append(_CHANGED.pack(sprite_id, mask))
+        changed += 1
+        for i, field in enumerate(_FIELDS):
+            if mask & (1 << i):
+                parts.append(field.pack(fields[i]))
+    header = _SNAPSHOT.pack(MSG_SNAPSHOT, tick, baseline, input_seq, score,
+                            len(removed), changed)
+    return b"".join([header, *(_REMOVED.pack(sprite_id) for sprite_id in removed), *parts])
+
+
+def decode_snapshot(data, states):
+    """Returns (tick, input_seq, score, state), or None when the
+    baseline state is not in 'states' (tick -> state). Raises
+    ValueError when 'data' is not a whole snapshot: it comes from
+    the network and may be truncated, padded or anything else.
+    """
+    try:
+        (kind, tick, baseline, input_seq, score,
+         removed, changed) = _SNAPSHOT.unpack_from(data)
+        if kind != MSG_SNAPSHOT:
+            raise ValueError(f"message type {kind}")
+        if baseline:
+            base = states.get(baseline)
+            if base is None:
+                return None
+            state = dict(base)
+        else:
+            state = {}
+        offset = _SNAPSHOT.size
+        for _ in range(removed):
+            del state[_REMOVED.unpack_from(data, offset)[0]]
+            offset += _REMOVED.size
+        for _ in range(changed):
+            sprite_id, mask = _CHANGED.unpack_from(data, offset)
+            offset += _CHANGED.size
+            fields = list(state.get(sprite_id, _NO_FIELDS))
+            for i, field in enumerate(_FIELDS):
+                if mask & (1 << i):
+                    fields[i] = field.unpack_from(data, offset)[0]
+                    offset += field.size
+            state[sprite_id] = tuple(fields)
+    except struct.error as error:
+        raise ValueError(f"Truncated snapshot: {error}") from None
+    except KeyError as error:
+        raise ValueError(f"Snapshot removes unknown sprite {error}") from None
+    if offset != len(data):
+        raise ValueError(f"Snapshot of {offset} bytes followed by {len(data) - offset} more")
+    return tick, input_seq, score, state
+
+
+class RemoteClient:
+    """What the server knows of a client."""
+
+    def __init__(self, address):
+        self.address = address
+        self.acked = 0          # last snapshot tick the client has
+        self.input_seq = 0      # last input received
+        self.keys = 0
+        self.last_heard = time.perf_counter()
+        self.bytes_sent = 0
+        self.full_snapshots = 0
+        self.delta_snapshots = 0
+        self.send_errors = 0
+
+
+class GameServer:
+    """Runs the simulation and sends the snapshots, see the module doc.
+    tick() makes one step; run() calls it TICK_RATE times per second
+    until it is stopped by a QUIT event (SDL turns Ctrl-C into one).
+    """
+
+    def __init__(self, host="", port=NET_PORT, seed=None):
+        from game import Game
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.bind((host, port))
+        self.socket.setblocking(False)
+        self.address = self.socket.getsockname()
+        self.clients = {}
+        self.tick_count = 0
+        self.rounds = 0
+        # tick -> state, the baselines the snapshots can refer to
+        self.history = OrderedDict()
+        self._ids = {}
+        self._next_id = 1
+        self.bytes_received = 0
+        # datagrams that are no message, anyone can send to the port
+        self.malformed = 0
+        self.send_errors = 0
+        self.stopped = False
+        self.started = time.perf_counter()
+        self.profiler = FrameProfiler(("receive", "simulate", "snapshot", "send"))
+        self.profiler.set_enabled(True)
+        self.game = Game(headless=True, seed=seed, replay=self)
+        self.game.initialize(True)
+
+    def next_keystate(self):
+        """Called by the game: the keys of all the clients."""
+        bits = 0
+        for client in self.clients.values():
+            bits |= client.keys
+        return KeyState(bits)
+
+    def tick(self):
+        profiler = self.profiler
+        profiler.begin_frame()
+        self._receive()
+        profiler.mark("receive")
+        self.game.advance()
+        if not self.game.player.alive():
+            self.rounds += 1
+            self.game.reset(self.game.seed + 1)
+        self.tick_count += 1
+        profiler.mark("simulate")
+        state = self.history[self.tick_count] = self._state()
+        if len(self.history) > SNAPSHOT_HISTORY:
+            self.history.popitem(last=False)
+        profiler.mark("snapshot")
+        for client in list(self.clients.values()):
+            self._send_snapshot(client, state)
+        profiler.mark("send")
+        # the wait for the next tick is not part of its cost
+        profiler.end_frame()
+
+    def run(self, max_ticks=None):
+        """Ticks until 'max_ticks' or until a QUIT event comes; sets
+        'stopped' then.
+        """
+        step_time = 1.0 / TICK_RATE
+        next_tick = time.perf_counter()
+        while max_ticks is None or self.tick_count < max_ticks:
+            if pg.event.get(pg.QUIT):
+                self.stopped = True
+                return
+            self.tick()
+            next_tick += step_time
+            delay = next_tick - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                # too slow, do not try to catch up
+                next_tick = time.perf_counter()
+
+    def _receive(self):
+        now = time.perf_counter()
+        while True:
+            try:
+                data, address = self.socket.recvfrom(_MAX_DATAGRAM)
+            except (BlockingIOError, ConnectionResetError):
+                break
+            self.bytes_received += len(data)
+            if data == _BYE:
+                self.clients.pop(address, None)
+                continue
+            if len(data) != _INPUT.size or data[0] != MSG_INPUT:
+                self.malformed += 1
+                continue
+            client = self.clients.get(address)
+            if client is None:
+                client = self.clients[address] = RemoteClient(address)
+            _, acked, input_seq, keys = _INPUT.unpack(data)
+            client.last_heard = now
+            client.acked = max(client.acked, acked)
+            if input_seq > client.input_seq:
+                client.input_seq = input_seq
+                client.keys = keys
+        for address, client in list(self.clients.items()):
+            if now - client.last_heard > CLIENT_TIMEOUT:
+                del self.clients[address]
+
+    def _state(self):
+        """Maps a sprite id to (kind, image index, x, y, width, height)
+        for every sprite of the KINDS. A pooled sprite gets a new id
+        whenever it is reused.
+        """
+        state = {}
+        ids = {}
+        for sprite in self.game._all:
+            kind = _KIND_OF.get(type(sprite))
+            if kind is None:
+                continue
+            generation = getattr(sprite, "generation", 0)
+            known = self._ids.get(sprite)
+            if known is None or known[0] != generation:
+                known = (generation, self._next_id)
+                self._next_id += 1
+            ids[sprite] = known
+            images = sprite.images
+            image = images.index(sprite.image) if sprite.image in images else 0
+            rect = sprite.rect
+            state[known[1]] = (kind, image, rect.x, rect.y, rect.width, rect.height)
+        # forget the sprites that are gone
+        self._ids = ids
+        return state
+
+    def _send_snapshot(self, client, state):
+        base = self.history.get(client.acked)
+        if base is None:
+            baseline, base = 0, {}
+            client.full_snapshots += 1
+        else:
+            baseline = client.acked
+            client.delta_snapshots += 1
+        data = encode_snapshot(self.tick_count, baseline, client.input_seq,
+                               SCORE.value, state, base)
+        try:
+            self.socket.sendto(data, client.address)
+        except OSError as error:
+            # like an oversized snapshot (EMSGSIZE); reported once per client
+            if not client.send_errors:
+                print(f"Warning, snapshot of {len(data)} bytes to {client.address} "
+                      f"not sent: {error}")
+            client.send_errors += 1
+            self.send_errors += 1
+            return
+        client.bytes_sent += len(data)
+
+    def stats(self):
+        elapsed = time.perf_counter() - self.started
+        bytes_sent = sum(client.bytes_sent for client in self.clients.values())
+        ticks = self.profiler.summary()
+        return {
+            "ticks": self.tick_count,
+            "rounds": self.rounds,
+            "clients": len(self.clients),
+            "sprites": len(self.history[self.tick_count]) if self.history else 0,
+            "tick_ms": ticks["frame"],
+            "phases_ms": {phase: ticks[phase] for phase in self.profiler.phases},
+            "bytes_sent": bytes_sent,
+            "bytes_received": self.bytes_received,
+            "malformed": self.malformed,
+            "send_errors": self.send_errors,
+            "sent_kbps": bytes_sent * 8 / 1000 / elapsed if elapsed > 0 else 0.0,
+            "full_snapshots": sum(client.full_snapshots for client in self.clients.values()),
+            "delta_snapshots": sum(client.delta_snapshots for client in self.clients.values()),
+        }
+
+    def close(self):
+        self.socket.close()
+        self.game.close()
+
+
+class GameClient:
+    """Receives the snapshots of a GameServer at 'address' and sends
+    the keys; view() returns what to draw, see the module doc.
+    """
+
+    def __init__(self, address, tick_rate=TICK_RATE):
+        self.address = address
+        self.tick_rate = tick_rate
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.setblocking(False)
+        # tick -> (state, input_seq, score, receive time)
+        self.states = OrderedDict()
+        self.latest = 0
+        self.input_seq = 0
+        self._pending = OrderedDict()    # input seq -> key bits not applied yet
+        self.bytes_received = 0
+        self.bytes_sent = 0
+        self.snapshots = 0
+        self.undecodable = 0    # without their baseline, or no snapshot at all
+        self.late = 0
+
+    @property
+    def score(self):
+        return self.states[self.latest][2] if self.latest else 0
+
+    def send_input(self, bits):
+        self.input_seq += 1
+        self._pending[self.input_seq] = bits
+        data = _INPUT.pack(MSG_INPUT, self.latest, self.input_seq, bits)
+        self.socket.sendto(data, self.address)
+        self.bytes_sent += len(data)
+
+    def poll(self):
+        """Reads the snapshots that arrived; returns their number."""
+        received = 0
+        while True:
+            try:
+                data = self.socket.recv(_MAX_DATAGRAM)
+            except (BlockingIOError, ConnectionRefusedError):
+                return received
+            self.bytes_received += len(data)
+            try:
+                decoded = decode_snapshot(data, self._base_states())
+            except ValueError:
+                decoded = None
+            if decoded is None:
+                self.undecodable += 1
+                continue
+            tick, input_seq, score, state = decoded
+            if tick <= self.latest:
+                self.late += 1
+                continue
+            self.states[tick] = (state, input_seq, score, time.perf_counter())
+            self.latest = tick
+            if len(self.states) > SNAPSHOT_HISTORY:
+                self.states.popitem(last=False)
+            # the server applied these keys already
+            for seq in [seq for seq in self._pending if seq <= input_seq]:
+                del self._pending[seq]
+            self.snapshots += 1
+            received += 1
+
+    def _base_states(self):
+        return {tick: entry[0] for tick, entry in self.states.items()}
+
+    def view(self, now=None):
+        """Returns (sprite id, kind, image index, rect) tuples: the
+        sprites INTERP_DELAY_TICKS behind the newest snapshot, moved
+        between the two snapshots around that time, and the player
+        predicted from the newest one.
+        """
+        if not self.latest:
+            return []
+        if now is None:
+            now = time.perf_counter()
+        newest = self.states[self.latest]
+        at = self.latest + (now - newest[3]) * self.tick_rate - INTERP_DELAY_TICKS
+        before = after = None
+        for tick in self.states:
+            if tick <= at:
+                before = tick
+            else:
+                after = tick
+                break
+        if before is None:
+            before = after
+        state = self.states[before][0]
+        alpha = 0.0
+        other = {}
+        if after is not None and after != before:
+            alpha = (at - before) / (after - before)
+            other = self.states[after][0]
+        items = []
+        for sprite_id, (kind, image, x, y, width, height) in state.items():
+            if kind == PLAYER_KIND:
+                continue
+            target = other.get(sprite_id)
+            if target is not None:
+                x += round((target[2] - x) * alpha)
+                y += round((target[3] - y) * alpha)
+            items.append((sprite_id, kind, image, pg.Rect(x, y, width, height)))
+        for sprite_id, (kind, image, x, y, width, height) in newest[0].items():
+            if kind == PLAYER_KIND:
+                rect, image = self._predict_player(pg.Rect(x, y, width, height), image)
+                items.append((sprite_id, kind, image, rect))
+        return items
+
+    def _predict_player(self, rect, image):
+        """Moves the player like Player.move() for every pending key state."""
+        origtop = rect.top + rect.left // Player.bounce % 2
+        for bits in self._pending.values():
+            direction = (bool(bits & KEY_BITS[pg.K_RIGHT])
+                         - bool(bits & KEY_BITS[pg.K_LEFT]))
+            rect.move_ip(direction * Player.speed, 0)
+            rect = rect.clamp(SCREENRECT)
+            if direction:
+                image = 0 if direction < 0 else 1
+            rect.top = origtop - (rect.left // Player.bounce % 2)
+        return rect, image
+
+    def stats(self):
+        return {
+            "snapshots": self.snapshots,
+            "undecodable": self.undecodable,
+            "late": self.late,
+            "bytes_received": self.bytes_received,
+            "bytes_sent": self.bytes_sent,
+            "pending_inputs": len(self._pending),
+        }
+
+    def play(self):
+        """Opens a window, draws the view and sends the keys until
+        the window is closed or escape is pressed.
+        """
+        from asset_cache import AssetCache
+        from game import load_sprite_images
+        from renderer import DirtyRenderer
+
+        pg.init()
+        screen = pg.display.set_mode(SCREENRECT.size, pg.SCALED)
+        pg.display.set_caption("Pygame Aliens (client)")
+        assets = AssetCache()
+        load_sprite_images(assets)
+        background = assets.background("fonn.jpg", SCREENRECT.size)
+        renderer = DirtyRenderer(screen, background)
+        scaled = {}
+
+        def image_of(kind, index, size):
+            key = (kind, index, size)
+            image = scaled.get(key)
+            if image is None:
+                cls = KINDS[kind]
+                images = cls.orig_images if cls is Explosion else cls.images
+                image = images[index % len(images)]
+                if image.get_size() != size:
+                    image = pg.transform.scale(image, size)
+                scaled[key] = image
+            return image
+
+        clock = pg.time.Clock()
+        step_time = 1.0 / self.tick_rate
+        next_input = time.perf_counter()
+        try:
+            while True:
+                for event in pg.event.get():
+                    if event.type == pg.QUIT or (
+                            event.type == pg.KEYDOWN and event.key == pg.K_ESCAPE):
+                        return
+                now = time.perf_counter()
+                if now >= next_input:
+                    self.send_input(keystate_bits(pg.key.get_pressed()))
+                    next_input = max(next_input + step_time, now)
+                self.poll()
+                renderer.render([(sprite_id, image_of(kind, image, rect.size), rect)
+                                 for sprite_id, kind, image, rect in self.view(now)])
+                pg.display.set_caption(f"Pygame Aliens (client) - Score: {self.score}")
+                clock.tick(120)
+        finally:
+            self.close()
+
+    def close(self):
+        try:
+            self.socket.sendto(_BYE, self.address)
+        except OSError:
+            pass
+        self.socket.close()
+
+
+def loopback(num_clients, ticks, loss, seed):
+    """A server and clients on the loopback interface; every state a
+    client decodes is compared with the state the server sent.
+    'loss' is the share of the snapshots the clients drop.
+    """
+    server = GameServer("127.0.0.1", 0, seed=seed)
+    clients = [GameClient(server.address) for _ in range(num_clients)]
+    rng = random.Random(seed)
+    moves = [0, KEY_BITS[pg.K_LEFT], KEY_BITS[pg.K_RIGHT]]
+    mismatches = 0
+    for tick in range(ticks):
+        for i, client in enumerate(clients):
+            # the first client plays, the others only watch
+            client.send_input(rng.choice(moves) | KEY_BITS[pg.K_SPACE] * (tick % 2)
+                              if i == 0 else 0)
+        server.tick()
+        for client in clients:
+            if loss and rng.random() < loss:
+                try:
+                    client.socket.recv(_MAX_DATAGRAM)
+                except BlockingIOError:
+                    pass
+            client.poll()
+            if client.latest:
+                sent = server.history.get(client.latest)
+                if sent is not None and sent != client.states[client.latest][0]:
+                    mismatches += 1
+            client.view()
+    stats = server.stats()
+    for client in clients:
+        client.close()
+    server.close()
+    return stats, [client.stats() for client in clients], mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Shared game sessions over UDP")
+    commands = parser.add_subparsers(dest="command", required=True)
+    serve = commands.add_parser("serve", help="run a server")
+    serve.add_argument("--host", default="")
+    serve.add_argument("--port", type=int, default=NET_PORT)
+    serve.add_argument("--seed", type=int, default=None)
+    join = commands.add_parser("join", help="open a client window")
+    join.add_argument("host")
+    join.add_argument("--port", type=int, default=NET_PORT)
+    test = commands.add_parser("loopback", help="check server and clients over loopback")
+    test.add_argument("--clients", type=int, default=3)
+    test.add_argument("--ticks", type=int, default=400)
+    test.add_argument("--loss", type=float, default=0.1,
+                      help="share of the snapshots dropped by the clients")
+    test.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        server = GameServer(args.host, args.port, seed=args.seed)
+        print(f"Serving on {server.address[0] or '*'}:{server.address[1]}")
+        try:
+            while not server.stopped:
+                server.run(server.tick_count + 10 * TICK_RATE)
+                stats = server.stats()
+                print(f"tick {stats['ticks']}  clients {stats['clients']}  "
+                      f"tick p99 {stats['tick_ms']['p99']:.2f} ms  "
+                      f"sent {stats['sent_kbps']:.1f} kbit/s  "
+                      f"send errors {stats['send_errors']}  "
+                      f"malformed {stats['malformed']}")
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.close()
+    elif args.command == "join":
+        GameClient((args.host, args.port)).play()
+    else:
+        stats, client_stats, mismatches = loopback(
+            args.clients, args.ticks, args.loss, args.seed)
+        print(f"{stats['ticks']} ticks, {stats['sprites']} sprites, "
+              f"tick p50 {stats['tick_ms']['p50']:.3f} ms p99 {stats['tick_ms']['p99']:.3f} ms")
+        print(f"sent {stats['bytes_sent']} bytes ({stats['full_snapshots']} full, "
+              f"{stats['delta_snapshots']} delta snapshots), "
+              f"received {stats['bytes_received']} bytes")
+        for i, client in enumerate(client_stats):
+            print(f"client {i}: {client}")
+        if mismatches:
+            print(f"Mismatch: {mismatches} decoded states differ from the server")
+            raise SystemExit(1)
+        print("Every decoded state matches the server")
+
+
+if __name__ == "__main__":
+    main()
+    pg.quit()
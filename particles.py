@@ -0,0 +1,140 @@
+import math
+import pygame as pg
+from game_settings import SCREENRECT, PARTICLE_CAPACITY
+from random_streams import STREAMS
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# explosion colors, from the hot core to the embers
+EXPLOSION_COLORS = ((255, 255, 210), (255, 220, 90), (255, 150, 40), (220, 70, 20))
+
+
+class ParticleSystem(pg.sprite.Sprite):
+    """Thousands of small particles drawn as one sprite.
+    Positions, velocities, lives and colors are kept in NumPy arrays
+    (the live particles packed at the front) and stepped in one pass by
+    update(): move, fall by 'gravity', slow down by 'drag', fade out.
+    compose() writes all the particles into a shared buffer through
+    surfarray and makes the sprite image the part of it they cover,
+    so drawing costs one blit whatever their number.
+    """
+
+    gravity = 0.08
+    drag = 0.96
+    # side of the square drawn for a particle, in pixels
+    size = 2
+
+    def __init__(self, *groups, capacity=PARTICLE_CAPACITY, rng=None):
+        if np is None:
+            raise SystemExit("Sorry, numpy is required for the particles")
+        pg.sprite.Sprite.__init__(self, *groups)
+        self.capacity = capacity
+        # a RandomStream of its own, the effects do not shift the gameplay
+        self.rng = rng if rng is not None else STREAMS.effects
+        # scale of the emitted bursts, lowered when frames get slow
+        self.burst_scale = 1.0
+        self.count = 0
+        self.emitted = 0
+        self.dropped = 0
+        self.pos = np.zeros((capacity, 2), dtype=np.float32)
+        self.vel = np.zeros((capacity, 2), dtype=np.float32)
+        self.life = np.zeros(capacity, dtype=np.int16)
+        self.max_life = np.ones(capacity, dtype=np.int16)
+        self.color = np.zeros((capacity, 3), dtype=np.float32)
+        self._buffer = pg.Surface(SCREENRECT.size, 0, 32)
+        self._buffer.set_colorkey((0, 0, 0))
+        self._shifts = np.array(self._buffer.get_shifts()[:3], dtype=np.uint32)
+        self._empty = self._buffer.subsurface((0, 0, 1, 1))
+        self._covered = None
+        self.image = self._empty
+        self.rect = pg.Rect(0, 0, 0, 0)
+        # a new generation every frame: the image is not to be interpolated
+        self.generation = 0
+
+    def __len__(self):
+        return self.count
+
+    def emit(self, center, count, speed=3.0, life=24, colors=EXPLOSION_COLORS):
+        """Starts a burst of 'count' particles (scaled by 'burst_scale')
+        flying out of 'center' at up to 'speed' pixels per step and
+        living up to 'life' steps. Returns the number started.
+        """
+        count = min(int(count * self.burst_scale), self.capacity - self.count)
+        if count <= 0:
+            return 0
+        start, end = self.count, self.count + count
+        rolls = self.rng.floats(count * 4).reshape(4, count)
+        angle = rolls[0] * (2 * math.pi)
+        velocity = speed * np.sqrt(rolls[1])
+        self.pos[start:end] = center
+        self.vel[start:end, 0] = np.cos(angle) * velocity
+        self.vel[start:end, 1] = np.sin(angle) * velocity
+        self.life[start:end] = self.max_life[start:end] = (life * (0.5 + 0.5 * rolls[2])).astype(np.int16) + 1
+        palette = np.array(colors, dtype=np.float32)
+        self.color[start:end] = palette[(rolls[3] * len(palette)).astype(np.intp)]
+        self.count = end
+        self.emitted += count
+        return count
+
+    def clear(self):
+        self.count = 0
+
+    def update(self):
+        n = self.count
+        if not n:
+            return
+        pos, vel = self.pos[:n], self.vel[:n]
+        pos += vel
+        vel *= self.drag
+        vel[:, 1] += self.gravity
+        self.life[:n] -= 1
+        alive = self.life[:n] > 0
+        alive &= (pos[:, 0] >= 0) & (pos[:, 0] < SCREENRECT.width)
+        alive &= (pos[:, 1] >= 0) & (pos[:, 1] < SCREENRECT.height)
+        if not alive.all():
+            # keep the live particles packed at the front
+            keep = np.flatnonzero(alive)
+            self.count = len(keep)
+            self.dropped += n - self.count
+            for array in (self.pos, self.vel, self.life, self.max_life, self.color):
+                array[:self.count] = array[keep]
+
+    def compose(self):
+        """Draws the particles into the image; called once per drawn frame."""
+        self.generation += 1
+        buffer = self._buffer
+        if self._covered is not None:
+            buffer.fill((0, 0, 0), self._covered)
+            self._covered = None
+        n = self.count
+        if not n:
+            self.image = self._empty
+            self.rect = pg.Rect(0, 0, 0, 0)
+            return
+        size = self.size
+        xs = np.minimum(self.pos[:n, 0].astype(np.intp), SCREENRECT.width - size)
+        ys = np.minimum(self.pos[:n, 1].astype(np.intp), SCREENRECT.height - size)
+        # fade to black over the life, black itself is the colorkey
+        fade = (self.life[:n] / self.max_life[:n]).astype(np.float32)
+        rgb = (self.color[:n] * fade[:, None]).astype(np.uint32)
+        pixels = (rgb << self._shifts).sum(axis=1, dtype=np.uint32)
+        view = pg.surfarray.pixels2d(buffer)
+        for dx in range(size):
+            for dy in range(size):
+                view[xs + dx, ys + dy] = pixels
+        del view
+        left, top = int(xs.min()), int(ys.min())
+        covered = pg.Rect(left, top, int(xs.max()) + size - left, int(ys.max()) + size - top)
+        self._covered = covered
+        self.image = buffer.subsurface(covered)
+        self.rect = covered.copy()
+
+    def stats(self):
+        return {
+            "live": self.count,
+            "emitted": self.emitted,
+            "dropped": self.dropped,
+        }
@@ -0,0 +1,78 @@
+import pygame as pg
+from game_settings import POOL_CAPACITY
+
+
+class SpritePool:
+    """Free list of dead sprites of one class.
+    acquire() revives a free sprite through its reset() method
+    and only constructs a new one when the list is empty.
+    """
+
+    def __init__(self, sprite_class, capacity=POOL_CAPACITY):
+        self.sprite_class = sprite_class
+        self.capacity = capacity
+        self._free = []
+        self.live = 0
+        self.high_water = 0
+        self.created = 0
+        self.reused = 0
+
+    def acquire(self, *args):
+        if self._free:
+            sprite = self._free.pop()
+            sprite.generation += 1
+            sprite.reset(*args)
+            self.reused += 1
+        else:
+            sprite = self.sprite_class(*args)
+            self.created += 1
+        sprite.leased = True
+        self.live += 1
+        if self.live > self.high_water:
+            self.high_water = self.live
+        return sprite
+
+    def release(self, sprite):
+        if sprite.leased:
+            sprite.leased = False
+            self.live -= 1
+        if len(self._free) < self.capacity:
+            self._free.append(sprite)
+
+    def clear(self):
+        self._free.clear()
+
+    def stats(self):
+        return {
+            "live": self.live,
+            "free": len(self._free),
+            "high_water": self.high_water,
+            "created": self.created,
+            "reused": self.reused,
+        }
+
+
+class Pooled:
+    """Mixin for sprites recycled through a SpritePool.
+    The class must list Pooled before pg.sprite.Sprite and move the
+    set up of its __init__ into reset(*args), which also adds the
+    sprite to its groups. Killed sprites go back to the pool.
+    """
+
+    pool = None
+    # bumped every time the sprite is reused, so that per-sprite data
+    # kept elsewhere (like previous positions) can tell lives apart
+    generation = 0
+    leased = False
+
+    @classmethod
+    def spawn(cls, *args):
+        if cls.pool is None:
+            return cls(*args)
+        return cls.pool.acquire(*args)
+
+    def kill(self):
+        was_alive = self.alive()
+        pg.sprite.Sprite.kill(self)
+        if was_alive and self.pool is not None:
+            self.pool.release(self)
@@ -0,0 +1,147 @@
+import csv
+import json
+import time
+from array import array
+import pygame as pg
+from game_settings import PROFILER_FRAMES
+
+
+class FrameProfiler:
+    """Times the phases of every frame with perf_counter_ns.
+    The game calls begin_frame() once per frame and mark(phase) after
+    each phase; the time since the previous mark goes to that phase.
+    The last 'size' frames are kept in one ring buffer per phase.
+    When disabled, mark() returns at once.
+    """
+
+    def __init__(self, phases, size=PROFILER_FRAMES):
+        self.enabled = False
+        self.phases = list(phases)
+        self.size = size
+        self._index = {phase: i for i, phase in enumerate(self.phases)}
+        # one more ring for the whole frame
+        self._rings = [array("q", bytes(8 * size)) for _ in range(len(self.phases) + 1)]
+        self._current = [0] * len(self.phases)
+        self._head = 0
+        self.count = 0
+        self._frame_start = None
+        self._last = 0
+
+    def set_enabled(self, enabled):
+        self.enabled = enabled
+        self._frame_start = None
+
+    def begin_frame(self):
+        if not self.enabled:
+            return
+        now = time.perf_counter_ns()
+        if self._frame_start is not None:
+            self._record(now)
+        self._frame_start = now
+        self._last = now
+
+    def end_frame(self):
+        """Records the frame now, so that the time until the next
+        begin_frame() (a sleep, say) is not counted in it.
+        """
+        if not self.enabled or self._frame_start is None:
+            return
+        self._record(time.perf_counter_ns())
+        self._frame_start = None
+
+    def _record(self, now):
+        head = self._head
+        current = self._current
+        for i, ring in enumerate(self._rings[:-1]):
+            ring[head] = current[i]
+            current[i] = 0
+        self._rings[-1][head] = now - self._frame_start
+        self._head = (head + 1) % self.size
+        self.count = min(self.count + 1, self.size)
+
+    def mark(self, phase):
+        if not self.enabled:
+            return
+        now = time.perf_counter_ns()
+        self._current[self._index[phase]] += now - self._last
+        self._last = now
+
+    def _samples(self, ring):
+        """The recorded values of a ring, oldest first."""
+        if self.count < self.size:
+            return ring[:self.count].tolist()
+        return ring[self._head:].tolist() + ring[:self._head].tolist()
+
+    @staticmethod
+    def _percentile(values, fraction):
+        if not values:
+            return 0
+        values = sorted(values)
+        return values[min(len(values) - 1, int(fraction * len(values)))]
+
+    def summary(self):
+        """p50, p99 and mean in milliseconds for every phase and the frame."""
+        result = {}
+        for name, ring in zip(self.phases + ["frame"], self._rings):
+            values = self._samples(ring)
+            result[name] = {
+                "p50": self._percentile(values, 0.50) / 1e6,
+                "p99": self._percentile(values, 0.99) / 1e6,
+                "mean": sum(values) / len(values) / 1e6 if values else 0.0,
+            }
+        return result
+
+    def fps(self):
+        frames = self._samples(self._rings[-1])
+        total = sum(frames)
+        return len(frames) * 1e9 / total if total else 0.0
+
+    def export(self, path):
+        """Writes the recorded frames (in nanoseconds) to a .json or .csv file."""
+        columns = self.phases + ["frame"]
+        rows = list(zip(*(self._samples(ring) for ring in self._rings)))
+        if path.endswith(".json"):
+            with open(path, "w") as f:
+                json.dump({
+                    "phases": columns,
+                    "frames_ns": [list(row) for row in rows],
+                    "summary_ms": self.summary(),
+                }, f, indent=1)
+        else:
+            with open(path, "w", newline="") as f:
+                writer = csv.writer(f)
+                writer.writerow(columns)
+                writer.writerows(rows)
+
+
+class ProfilerHud(pg.sprite.Sprite):
+    """Shows the FPS and the p50/p99 phase times of a FrameProfiler."""
+
+    refresh = 20        # frames between redraws of the text
+
+    def __init__(self, profiler, *groups):
+        pg.sprite.Sprite.__init__(self, *groups)
+        self.profiler = profiler
+        self.font = pg.font.Font(None, 20)
+        self.color = "yellow"
+        self.frame = 0
+        self.redraw()
+        self.rect = self.image.get_rect().move(10, 40)
+
+    def redraw(self):
+        summary = self.profiler.summary()
+        lines = [f"FPS {self.profiler.fps():.1f}   p50 / p99 ms"]
+        for name, times in summary.items():
+            lines.append(f"{name:<16} {times['p50']:6.2f} {times['p99']:6.2f}")
+        rendered = [self.font.render(line, 0, self.color) for line in lines]
+        height = self.font.get_linesize()
+        self.image = pg.Surface(
+            (max(line.get_width() for line in rendered), height * len(rendered)))
+        self.image.set_colorkey((0, 0, 0))
+        for i, line in enumerate(rendered):
+            self.image.blit(line, (0, i * height))
+
+    def update(self):
+        self.frame += 1
+        if self.frame % self.refresh == 0:
+            self.redraw()
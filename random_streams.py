@@ -0,0 +1,121 @@
+import copy
+import itertools
+import operator
+import random
+from game_settings import RNG_BLOCK_SIZE
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# one stream per subsystem, so a random call in one of them does not
+# shift the outcomes of the others
+STREAM_NAMES = ("spawn", "bombs", "gifts", "movement", "effects")
+
+
+class RandomStream:
+    """Seeded random numbers handed out of blocks of 'block_size' floats
+    in [0.0, 1.0), generated in bulk by NumPy (or by the random module
+    without it; the numbers differ then). The state can be saved with
+    snapshot() and brought back with restore().
+    random() is the __next__ of an iterator over the blocks, so a number
+    costs about as much as a call of random.random().
+    """
+
+    def __init__(self, seed, block_size=RNG_BLOCK_SIZE):
+        self.block_size = block_size
+        self.seed(seed)
+
+    def seed(self, seed):
+        if np is not None:
+            self._generator = np.random.default_rng(seed)
+        else:
+            self._generator = random.Random(str(seed))
+        self._fill()
+        self._start(0)
+
+    def _state(self):
+        if np is not None:
+            return copy.deepcopy(self._generator.bit_generator.state)
+        return self._generator.getstate()
+
+    def _fill(self):
+        # the state before the block, to generate it again on restore()
+        self._block_state = self._state()
+        if np is not None:
+            self._array = self._generator.random(self.block_size)
+            self._values = self._array.tolist()
+        else:
+            self._values = [self._generator.random() for _ in range(self.block_size)]
+            self._array = None
+        self._it = iter(self._values)
+
+    def _blocks(self):
+        while True:
+            yield self._it
+            self._fill()
+
+    def _start(self, pos):
+        """Hands out the current block from 'pos' on."""
+        self._it = iter(self._values[pos:])
+        self.random = itertools.chain.from_iterable(self._blocks()).__next__
+
+    def _pos(self):
+        return self.block_size - operator.length_hint(self._it)
+
+    def uniform(self, a, b):
+        return a + (b - a) * self.random()
+
+    def choice(self, seq):
+        return seq[int(self.random() * len(seq))]
+
+    def floats(self, n):
+        """The next 'n' numbers as a NumPy array."""
+        chunks = []
+        pos = self._pos()
+        while n:
+            if pos == self.block_size:
+                self._fill()
+                pos = 0
+            take = min(n, self.block_size - pos)
+            chunks.append(self._array[pos:pos + take])
+            pos += take
+            n -= take
+        self._start(pos)
+        return np.concatenate(chunks) if chunks else np.empty(0)
+
+    def snapshot(self):
+        return self._block_state, self._pos()
+
+    def restore(self, snapshot):
+        state, pos = snapshot
+        if np is not None:
+            self._generator.bit_generator.state = copy.deepcopy(state)
+        else:
+            self._generator.setstate(state)
+        self._fill()
+        self._start(pos)
+
+
+class RandomStreams:
+    """The random streams of the subsystems, all derived from one seed."""
+
+    def __init__(self, seed=0):
+        for index, name in enumerate(STREAM_NAMES):
+            setattr(self, name, RandomStream([seed, index]))
+
+    def seed(self, seed):
+        """Restarts every stream; the stream objects stay the same."""
+        for index, name in enumerate(STREAM_NAMES):
+            getattr(self, name).seed([seed, index])
+
+    def snapshot(self):
+        return {name: getattr(self, name).snapshot() for name in STREAM_NAMES}
+
+    def restore(self, snapshot):
+        for name, state in snapshot.items():
+            getattr(self, name).restore(state)
+
+
+STREAMS = RandomStreams()
@@ -0,0 +1,197 @@
+import weakref
+import pygame as pg
+from game_settings import FULL_UPDATE_COVERAGE
+
+# rounds of growing the dirty area by the sprites it touches, after
+# which the whole screen is drawn instead
+MAX_MERGE_PASSES = 8
+
+
+def merge_rects(rects):
+    """Unites overlapping rects until none of the results overlap.
+    A sweep over the rects sorted by their left edge only compares a
+    rect with the merged ones not ended left of it; a united rect can
+    reach rects that were passed already, so the sweep is repeated
+    until it unites nothing (once or twice for the rects of a frame).
+    Empty rects are dropped.
+    """
+    rects = [pg.Rect(rect) for rect in rects]
+    rects = [rect for rect in rects if rect.width and rect.height]
+    united = True
+    while united:
+        united = False
+        rects.sort(key=_left)
+        merged = []
+        active = []
+        for rect in rects:
+            left = rect.left
+            # an emptied rect was united into another one
+            active = [other for other in active if other.right > left and other.width]
+            i = rect.collidelist(active)
+            while i >= 0:
+                other = active.pop(i)
+                rect.union_ip(other)
+                other.width = 0
+                united = True
+                i = rect.collidelist(active)
+            active.append(rect)
+            merged.append(rect)
+        rects = [rect for rect in merged if rect.width]
+    return rects
+
+
+def _left(rect):
+    return rect.left
+
+
+class ScaledImages:
+    """Maps sprites drawn in SCREENRECT coordinates to a render target
+    'scale' times the size. The scaled images are cached per image and
+    go with it; images whose sprite is 'dirty' are scaled again.
+    """
+
+    def __init__(self, scale):
+        self.scale = scale
+        self._images = weakref.WeakKeyDictionary()
+
+    def image(self, sprite, image):
+        scaled = self._images.get(image)
+        if scaled is None or getattr(sprite, "dirty", 0):
+            width, height = image.get_size()
+            size = (max(1, round(width * self.scale)), max(1, round(height * self.scale)))
+            # no smoothing, it would blend the colorkey into the edges
+            scaled = self._images[image] = pg.transform.scale(image, size)
+        return scaled
+
+    def scale_items(self, items):
+        scale = self.scale
+        scaled_items = []
+        for sprite, image, rect in items:
+            image = self.image(sprite, image)
+            rect = image.get_rect(topleft=(round(rect.x * scale), round(rect.y * scale)))
+            scaled_items.append((sprite, image, rect))
+        return scaled_items
+
+
+class DirtyRenderer:
+    """Draws sprites over a background and updates only the parts of the
+    display that changed since the last frame:
+    - sprites whose image and rect did not change are not redrawn,
+      unless something changed under or over them or their 'dirty'
+      attribute is set
+    - overlapping dirty rects are merged
+    - the whole display is flipped when the dirty area covers more
+      than 'full_update_coverage' of the screen
+    - background restores and sprite draws go through Surface.blits
+    """
+
+    def __init__(self, screen, background, full_update_coverage=FULL_UPDATE_COVERAGE):
+        self.screen = screen
+        self.background = background
+        self.full_update_coverage = full_update_coverage
+        # sprite -> (image, rect) as drawn in the last frame
+        self._drawn = {}
+        self._full_redraw = True
+        self.frames = 0
+        self.full_updates = 0
+        self.sprites_drawn = 0
+        self.sprites_skipped = 0
+
+    def invalidate(self, screen=None):
+        """Redraws everything in the next frame, on a new 'screen' if given."""
+        if screen is not None:
+            self.screen = screen
+        self._full_redraw = True
+
+    def render(self, items):
+        """Draws 'items', (sprite, image, rect) tuples in drawing order,
+        and updates the display.
+        """
+        self.frames += 1
+        if self._full_redraw:
+            self._render_all(items)
+            return
+
+        screen_rect = self.screen.get_rect()
+        drawn = self._drawn
+        self._drawn = new_drawn = {}
+        dirty = []
+        changed = []
+        for sprite, image, rect in items:
+            old = drawn.pop(sprite, None)
+            new_drawn[sprite] = (image, pg.Rect(rect))
+            # like pg.sprite.DirtySprite: 1 - redraw once, 2 - always redraw
+            dirty_flag = getattr(sprite, "dirty", 0)
+            if dirty_flag == 1:
+                sprite.dirty = 0
+            if (old is not None and old[0] is image and old[1] == rect
+                    and not dirty_flag):
+                changed.append(False)
+                continue
+            changed.append(True)
+            dirty.append(pg.Rect(rect))
+            if old is not None:
+                dirty.append(old[1])
+        # sprites gone since the last frame
+        dirty.extend(rect for _, rect in drawn.values())
+
+        # an unchanged sprite touching a dirty area is cleared with it,
+        # so it has to be redrawn as a whole; the areas are merged first
+        # as the merged rects clear more than the rects they came from.
+        # Only the merged rects that are new since the last pass can
+        # touch a sprite that is still unchanged.
+        dirty = merge_rects(dirty)
+        fresh = dirty
+        unchanged = [i for i, redraw in enumerate(changed) if not redraw]
+        passes = 0
+        while fresh and unchanged:
+            rects = [items[i][2] for i in unchanged]
+            hits = set()
+            for rect in fresh:
+                hits.update(rect.collidelistall(rects))
+            if not hits:
+                break
+            passes += 1
+            if passes > MAX_MERGE_PASSES:
+                # the redrawn area keeps spreading, drawing it all is cheaper
+                self._render_all(items)
+                return
+            for j in hits:
+                changed[unchanged[j]] = True
+            unchanged = [i for j, i in enumerate(unchanged) if j not in hits]
+            before = {tuple(rect) for rect in dirty}
+            dirty = merge_rects(dirty + [rects[j] for j in hits])
+            fresh = [rect for rect in dirty if tuple(rect) not in before]
+
+        merged = [rect.clip(screen_rect) for rect in dirty]
+        merged = [rect for rect in merged if rect.width and rect.height]
+        background = self.background
+        self.screen.blits([(background, rect, rect) for rect in merged], doreturn=False)
+        blits = [(image, rect) for (_, image, rect), redraw in zip(items, changed) if redraw]
+        self.screen.blits(blits, doreturn=False)
+        self.sprites_drawn += len(blits)
+        self.sprites_skipped += len(items) - len(blits)
+
+        area = sum(rect.width * rect.height for rect in merged)
+        if area > self.full_update_coverage * screen_rect.width * screen_rect.height:
+            self.full_updates += 1
+            pg.display.flip()
+        elif merged:
+            pg.display.update(merged)
+
+    def _render_all(self, items):
+        self._full_redraw = False
+        self.screen.blit(self.background, (0, 0))
+        self.screen.blits([(image, rect) for _, image, rect in items], doreturn=False)
+        self._drawn = {sprite: (image, pg.Rect(rect)) for sprite, image, rect in items}
+        self.sprites_drawn += len(items)
+        self.full_updates += 1
+        pg.display.flip()
+
+    def stats(self):
+        return {
+            "frames": self.frames,
+            "full_updates": self.full_updates,
+            "sprites_drawn": self.sprites_drawn,
+            "sprites_skipped": self.sprites_skipped,
+        }
@@ -0,0 +1,148 @@
+"""
+Recording and replaying of game sessions.
+
+A recording holds the random seed of the session and, for every
+simulation step, the state of the game keys, run-length encoded.
+Replaying it runs the same session headless, as fast as possible,
+and checks that it ends with the same score after the same number
+of steps:
+    python replay.py session.rec
+With --capture the frames are drawn and written to PNG files or a
+video file while replaying, still as fast as possible:
+    python replay.py session.rec --capture session.mp4
+"""
+
+import argparse
+import struct
+import pygame as pg
+from masks import COLLISION_CATEGORIES
+
+REPLAY_MAGIC = b"GSSREC"
+REPLAY_VERSION = 3
+_HEADER = struct.Struct("<6sBBQIq")  # magic, version, flags, seed, frames, score
+_ENTITY_STORE_FLAG = 1
+# flags of the collision categories tested pixel by pixel
+_PIXEL_COLLISION_FLAGS = {category: 2 << i for i, category in enumerate(COLLISION_CATEGORIES)}
+_RUN = struct.Struct("<BH")         # key bits, number of frames
+_MAX_RUN = 0xFFFF
+
+# the keys that drive the game, one bit each
+KEY_BITS = {
+    pg.K_LEFT: 1,
+    pg.K_RIGHT: 2,
+    pg.K_SPACE: 4,
+    pg.K_n: 8,
+    pg.K_m: 16,
+    pg.K_l: 32,
+}
+
+
+def keystate_bits(keystate):
+    bits = 0
+    for key, bit in KEY_BITS.items():
+        if keystate[key]:
+            bits |= bit
+    return bits
+
+
+class KeyState:
+    """Stands in for pg.key.get_pressed() with recorded key bits."""
+
+    def __init__(self, bits):
+        self.bits = bits
+
+    def __getitem__(self, key):
+        return bool(self.bits & KEY_BITS.get(key, 0))
+
+
+class Recorder:
+    """Collects the key bits of every simulation step."""
+
+    def __init__(self, seed, entity_store=False, pixel_collisions=()):
+        self.seed = seed
+        self.entity_store = entity_store
+        self.pixel_collisions = pixel_collisions
+        self.frames = 0
+        self._runs = []
+
+    def record(self, keystate):
+        bits = keystate_bits(keystate)
+        runs = self._runs
+        if runs and runs[-1][0] == bits and runs[-1][1] < _MAX_RUN:
+            runs[-1][1] += 1
+        else:
+            runs.append([bits, 1])
+        self.frames += 1
+
+    def save(self, path, score):
+        with open(path, "wb") as f:
+            flags = _ENTITY_STORE_FLAG if self.entity_store else 0
+            for category in self.pixel_collisions:
+                flags |= _PIXEL_COLLISION_FLAGS[category]
+            f.write(_HEADER.pack(REPLAY_MAGIC, REPLAY_VERSION, flags,
+                                 self.seed, self.frames, score))
+            for bits, length in self._runs:
+                f.write(_RUN.pack(bits, length))
+
+
+class Replay:
+    """Hands out the recorded key states step by step."""
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            data = f.read()
+        magic, version, flags, self.seed, self.frames, self.score = (
+            _HEADER.unpack_from(data))
+        if magic != REPLAY_MAGIC or version != REPLAY_VERSION:
+            raise SystemExit(f'Not a recording: "{path}"')
+        self.entity_store = bool(flags & _ENTITY_STORE_FLAG)
+        self.pixel_collisions = tuple(category for category, flag in _PIXEL_COLLISION_FLAGS.items()
+                                      if flags & flag)
+        self._runs = [(KeyState(bits), length)
+                      for bits, length in _RUN.iter_unpack(data[_HEADER.size:])]
+        self._run = 0
+        self._left = self._runs[0][1] if self._runs else 0
+
+    def next_keystate(self):
+        """The key state of the next step; no keys after the end."""
+        while self._left == 0:
+            self._run += 1
+            if self._run >= len(self._runs):
+                return KeyState(0)
+            self._left = self._runs[self._run][1]
+        self._left -= 1
+        return self._runs[self._run][0]
+
+
+def main():
+    from game import Game
+    from game_settings import SCORE, TICK_RATE
+
+    parser = argparse.ArgumentParser(description="Replay a recorded session")
+    parser.add_argument("recording")
+    parser.add_argument("--capture", metavar="OUTPUT",
+                        help="write the frames to PNG files (name.png) or a video file")
+    args = parser.parse_args()
+    replay = Replay(args.recording)
+    game = Game(headless=True, entity_store=replay.entity_store,
+                seed=replay.seed, replay=replay,
+                pixel_collisions=replay.pixel_collisions)
+    game.initialize(True)
+    if args.capture:
+        game.start_capture(args.capture, drop=False)
+    frames, elapsed = game.play_headless(replay.frames, draw=bool(args.capture))
+    speed = frames / elapsed / TICK_RATE if elapsed > 0 else float("inf")
+    print(f"Replayed {frames} frames in {elapsed:.3f} s ({speed:.0f}x realtime)")
+    if args.capture:
+        stats = game.stop_capture()
+        print(f"Captured {stats['written']} frames to {args.capture}")
+    if frames != replay.frames or SCORE.value != replay.score:
+        print(f"Mismatch: recorded {replay.frames} frames with score {replay.score},"
+              f" replayed {frames} frames with score {SCORE.value}")
+        raise SystemExit(1)
+    print("Score:", SCORE.value, "(matches the recording)")
+
+
+if __name__ == "__main__":
+    main()
+    pg.quit()
@@ -14,7 +14,8 @@ class Rocket(pg.sprite.Sprite):
         self.rect = self.image.get_rect(midbottom=pos)
 
     def explode(self):
-        return Blast(self.rect.center, self.groups())
+        """Returns the rect of the area the blast covers."""
+        return Blast.area(self.rect.center)
 
     def update(self):
         """called every time around the game loop.
@@ -1,16 +1,23 @@
 import pygame as pg
 from typing import List
+from pool import Pooled
 
 
-class Shot(pg.sprite.Sprite):
+class Shot(Pooled, pg.sprite.Sprite):
     """a bullet the Player sprite fires."""
     speed = -11
     images: List[pg.Surface] = []
 
     def __init__(self, pos, *groups):
-        pg.sprite.Sprite.__init__(self, *groups)
+        pg.sprite.Sprite.__init__(self)
+        self.rect = pg.Rect(0, 0, 0, 0)
+        self.reset(pos, *groups)
+
+    def reset(self, pos, *groups):
         self.image = self.images[0]
-        self.rect = self.image.get_rect(midbottom=pos)
+        self.rect.size = self.image.get_size()
+        self.rect.midbottom = pos
+        self.add(*groups)
 
     def update(self):
         """called every time around the game loop.
@@ -0,0 +1,263 @@
+#!/usr/bin/env python
+"""
+Soak test: plays the headless game for hours with an autopilot at the
+keys and watches what the process holds on to.
+
+Every SOAK_INTERVAL simulated frames a sample is taken: a tracemalloc
+snapshot, the sprite count of every group, the live and free sprites
+of every pool, the sizes of the image caches, the bytes of the
+surfaces the game references and the number of Python objects. A new
+round is started, with the next seed, whenever the player dies.
+
+A metric that went up from every sample to the next over the last
+SOAK_WINDOW samples (memory may dip a little) and grew by more than
+its slack is reported as a leak; the run fails then
+with the allocation sites that grew the most between the first and
+the last of those samples.
+
+    python soak.py --hours 8             run for 8 hours of wall time
+    python soak.py --frames 200000       run for a number of frames
+"""
+
+import argparse
+import gc
+import random
+import time
+import tracemalloc
+from collections import deque
+import pygame as pg
+
+from game import Game
+from explosion import Explosion
+from replay import KeyState, KEY_BITS
+from game_settings import (SCREENRECT, TICK_RATE, EXPLOSION_PARTICLES, SOAK_INTERVAL,
+                           SOAK_WINDOW, SOAK_MEMORY_SLACK, SOAK_OBJECT_SLACK, SOAK_TOP_SITES)
+
+LEFT = KEY_BITS[pg.K_LEFT]
+RIGHT = KEY_BITS[pg.K_RIGHT]
+SPACE = KEY_BITS[pg.K_SPACE]
+ROCKET = KEY_BITS[pg.K_n]
+DETONATE = KEY_BITS[pg.K_m]
+LASER = KEY_BITS[pg.K_l]
+
+# growth over the window below which a metric is not a leak; the
+# metrics with a slack may also drop by a share of it between samples
+SLACK = {"traced_kb": SOAK_MEMORY_SLACK, "gc_objects": SOAK_OBJECT_SLACK}
+
+
+class Autopilot:
+    """Plays the game through the replay interface: follows the lowest
+    alien, fires all the time, launches a rocket every 'rocket_period'
+    frames and detonates every other one (the rest fly off the top of
+    the screen) and fires the laser every 'laser_period' frames.
+    """
+
+    rocket_period = 120
+    laser_period = 300
+
+    def __init__(self, seed=0):
+        self.game = None
+        self.frame = 0
+        self.rng = random.Random(seed)
+
+    def next_keystate(self):
+        frame = self.frame
+        self.frame += 1
+        bits = SPACE if frame % 2 == 0 else 0
+        player = self.game.player.rect
+        aliens = self.game.aliens.sprites()
+        if aliens:
+            target = max(aliens, key=lambda alien: alien.rect.bottom).rect.centerx
+            # now and then wander off, to get hit too
+            if self.rng.random() < 0.1:
+                target = self.rng.uniform(0, SCREENRECT.width)
+            if target < player.centerx - 8:
+                bits |= LEFT
+            elif target > player.centerx + 8:
+                bits |= RIGHT
+        phase = frame % self.rocket_period
+        if phase == 0:
+            bits |= ROCKET
+        elif phase == 30 and frame // self.rocket_period % 2:
+            bits |= DETONATE
+        if frame % self.laser_period == 0:
+            bits |= LASER
+        return KeyState(bits)
+
+
+def surface_bytes(game):
+    """Bytes of the distinct surfaces the sprites, pools, caches and the
+    renderer refer to.
+    """
+    surfaces = {}
+
+    def add(surface):
+        surfaces[id(surface)] = surface
+
+    sprites = list(game._all)
+    for pool in game.pools.values():
+        sprites.extend(pool._free)
+    for sprite in sprites:
+        add(sprite.image)
+        for image in getattr(sprite, "images", ()):
+            add(image)
+    for images in Explosion._scaled_cache.values():
+        for image in images:
+            add(image)
+    if game.scaled_images is not None:
+        for image in game.scaled_images._images.values():
+            add(image)
+    for image, _ in game.renderer._drawn.values():
+        add(image)
+    return sum(surface.get_pitch() * surface.get_height() for surface in surfaces.values())
+
+
+def game_metrics(game, snapshot):
+    metrics = {
+        "traced_kb": sum(stat.size for stat in snapshot.statistics("filename")) // 1024,
+        "gc_objects": len(gc.get_objects()),
+        "surface_kb": surface_bytes(game) // 1024,
+        "prev_positions": len(game._prev_positions),
+        "renderer_drawn": len(game.renderer._drawn),
+        "explosion_cache": len(Explosion._scaled_cache),
+        "rocket_held": int(game.rocket is not None and not game.rocket.alive()),
+        "laser_held": int(game.laser is not None and not game.laser.alive()),
+    }
+    for name in ("_all", "aliens", "shots", "bombs", "gifts"):
+        metrics["group." + name.lstrip("_")] = len(getattr(game, name))
+    for name, stats in game.pool_stats().items():
+        metrics[f"pool.{name}.live"] = stats["live"]
+        metrics[f"pool.{name}.free"] = stats["free"]
+    if game.scaled_images is not None:
+        metrics["scaled_images"] = len(game.scaled_images._images)
+    if game.particles is not None:
+        metrics["particles"] = len(game.particles)
+    return metrics
+
+
+class SoakMonitor:
+    """Keeps the samples of the metrics and the tracemalloc snapshots of
+    the last 'window' samples, and finds the metrics that keep growing.
+    """
+
+    def __init__(self, game, window=SOAK_WINDOW):
+        self.game = game
+        self.window = window
+        self.samples = []
+        self._snapshots = deque(maxlen=window)
+        # the snapshots and samples kept here are not the game's memory
+        self._filters = [tracemalloc.Filter(False, tracemalloc.__file__),
+                         tracemalloc.Filter(False, __file__),
+                         tracemalloc.Filter(False, "<frozen importlib._bootstrap*>")]
+
+    def sample(self, frame):
+        gc.collect()
+        snapshot = tracemalloc.take_snapshot().filter_traces(self._filters)
+        self.samples.append((frame, game_metrics(self.game, snapshot)))
+        self._snapshots.append(snapshot)
+
+    def growing(self):
+        """Names of the metrics that rose at every sample of the window
+        (the ones held at a cap, like the shots, rise and stop).
+        """
+        if len(self.samples) < self.window:
+            return []
+        recent = [metrics for _, metrics in self.samples[-self.window:]]
+        leaks = []
+        for name in recent[-1]:
+            values = [metrics.get(name, 0) for metrics in recent]
+            slack = SLACK.get(name, 0)
+            noise = slack / self.window
+            rising = all(b - a > -noise for a, b in zip(values, values[1:]))
+            if rising and values[-1] - values[0] > slack:
+                leaks.append(name)
+        return leaks
+
+    def allocation_diff(self, top=SOAK_TOP_SITES):
+        """The allocation sites that grew the most over the window."""
+        first, last = self._snapshots[0], self._snapshots[-1]
+        return last.compare_to(first, "lineno")[:top]
+
+    def report(self):
+        lines = [f"{'metric':<24}{'first':>10}{'min':>10}{'max':>10}{'last':>10}"]
+        for name in self.samples[-1][1]:
+            values = [metrics.get(name, 0) for _, metrics in self.samples]
+            lines.append(f"{name:<24}{values[0]:>10}{min(values):>10}"
+                         f"{max(values):>10}{values[-1]:>10}")
+        return "\n".join(lines)
+
+
+def soak(seed=0, hours=None, frames=None, interval=SOAK_INTERVAL, window=SOAK_WINDOW,
+         particles=EXPLOSION_PARTICLES, quiet=False):
+    """Runs the game until 'hours' of wall time or 'frames' frames have
+    passed (the first to come), checking for leaks after every sample.
+    Returns (monitor, leaking metric names, rounds played).
+    """
+    autopilot = Autopilot(seed)
+    game = Game(headless=True, seed=seed, replay=autopilot,
+                explosion_particles=particles)
+    autopilot.game = game
+    game.initialize(True)
+    tracemalloc.start()
+    monitor = SoakMonitor(game, window)
+    deadline = None if hours is None else time.perf_counter() + hours * 3600
+    frame = 0
+    rounds = 1
+    leaks = []
+    try:
+        while ((frames is None or frame < frames)
+                and (deadline is None or time.perf_counter() < deadline)):
+            game.advance(draw=True)
+            frame += 1
+            if not game.player.alive():
+                game.reset(seed + rounds)
+                rounds += 1
+            if frame % interval == 0:
+                monitor.sample(frame)
+                if not quiet:
+                    metrics = monitor.samples[-1][1]
+                    print(f"frame {frame}  round {rounds}  traced {metrics['traced_kb']} KB  "
+                          f"objects {metrics['gc_objects']}  surfaces {metrics['surface_kb']} KB  "
+                          f"sprites {metrics['group.all']}")
+                leaks = monitor.growing()
+                if leaks:
+                    break
+    finally:
+        tracemalloc.stop()
+        game.close()
+    return monitor, leaks, rounds
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Long-run leak test of the headless game")
+    parser.add_argument("--hours", type=float, help="wall time to run for")
+    parser.add_argument("--frames", type=int, help="frames to run for")
+    parser.add_argument("--interval", type=int, default=SOAK_INTERVAL,
+                        help="frames between two samples")
+    parser.add_argument("--window", type=int, default=SOAK_WINDOW,
+                        help="samples of growth reported as a leak")
+    parser.add_argument("--particles", type=int, default=EXPLOSION_PARTICLES,
+                        help="NumPy particles thrown by every explosion")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    frames = args.frames
+    if args.hours is None and frames is None:
+        # an hour of game time
+        frames = 3600 * TICK_RATE
+
+    monitor, leaks, rounds = soak(args.seed, args.hours, frames, args.interval,
+                                  args.window, args.particles)
+    print(f"{len(monitor.samples)} samples, {rounds} rounds")
+    if monitor.samples:
+        print(monitor.report())
+    if leaks:
+        print(f"LEAK: {', '.join(leaks)} grew over the last {args.window} samples")
+        print("Top allocation sites by growth:")
+        for stat in monitor.allocation_diff():
+            print(f"  {stat}")
+        raise SystemExit(1)
+    print("No growth found")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+import pygame as pg
+from game_settings import SCREENRECT, COLLISION_CELL_SIZE
+from masks import collide_masks
+
+
+class SpatialHash:
+    """Uniform grid over 'bounds' that maps every item to the cells its
+    rect covers. Rects outside the bounds are kept in the border cells,
+    so a query never misses an overlapping item.
+    """
+
+    def __init__(self, bounds, cell_size):
+        self.bounds = pg.Rect(bounds)
+        self.cell_size = cell_size
+        self.cols = max(1, -(-self.bounds.width // cell_size))
+        self.rows = max(1, -(-self.bounds.height // cell_size))
+        self._cells = [set() for _ in range(self.cols * self.rows)]
+        self._spans = {}
+
+    def __len__(self):
+        return len(self._spans)
+
+    def _span(self, rect):
+        size = self.cell_size
+        x = rect.x - self.bounds.x
+        y = rect.y - self.bounds.y
+        last_col = self.cols - 1
+        last_row = self.rows - 1
+        return (min(max(x // size, 0), last_col),
+                min(max(y // size, 0), last_row),
+                min(max((x + max(rect.width, 1) - 1) // size, 0), last_col),
+                min(max((y + max(rect.height, 1) - 1) // size, 0), last_row))
+
+    def _cell_ids(self, span):
+        left, top, right, bottom = span
+        cols = self.cols
+        for row in range(top, bottom + 1):
+            base = row * cols
+            for col in range(left, right + 1):
+                yield base + col
+
+    def move(self, item, rect):
+        """Inserts the item or re-bins it if it crossed a cell border."""
+        span = self._span(rect)
+        old_span = self._spans.get(item)
+        if span == old_span:
+            return
+        cells = self._cells
+        if old_span is not None:
+            for cell_id in self._cell_ids(old_span):
+                cells[cell_id].discard(item)
+        for cell_id in self._cell_ids(span):
+            cells[cell_id].add(item)
+        self._spans[item] = span
+
+    def remove(self, item):
+        span = self._spans.pop(item, None)
+        if span is not None:
+            cells = self._cells
+            for cell_id in self._cell_ids(span):
+                cells[cell_id].discard(item)
+
+    def query(self, rect):
+        """Returns the items sharing a cell with 'rect' (a superset of the
+        items that really overlap it).
+        """
+        found = set()
+        cells = self._cells
+        for cell_id in self._cell_ids(self._span(rect)):
+            found.update(cells[cell_id])
+        return found
+
+
+class SpatialGroup(pg.sprite.Group):
+    """A sprite group with a spatial hash of its members, to collide
+    against a few sprites without testing every pair.
+    Sprites are binned when they are first queried and re-binned
+    by refresh(), which the game calls after the sprites moved.
+    The index is not updated when a rect changes: refresh() must run
+    after every movement, or a query misses the members that moved
+    into other cells since the last one.
+    """
+
+    def __init__(self, *sprites, cell_size=COLLISION_CELL_SIZE):
+        self.index = SpatialHash(SCREENRECT, cell_size)
+        # insertion order of the members, to report hits in group order
+        self._order = {}
+        self._counter = 0
+        self._pending = set()
+        pg.sprite.Group.__init__(self, *sprites)
+
+    def add_internal(self, sprite, layer=None):
+        pg.sprite.Group.add_internal(self, sprite, layer)
+        self._counter += 1
+        self._order[sprite] = self._counter
+        # the sprite might not have a rect yet, bin it later
+        self._pending.add(sprite)
+
+    def remove_internal(self, sprite):
+        pg.sprite.Group.remove_internal(self, sprite)
+        del self._order[sprite]
+        self._pending.discard(sprite)
+        self.index.remove(sprite)
+
+    def refresh(self, moved=None):
+        """Re-bins every member whose rect moved to other cells. With
+        'moved', only the members among those sprites are looked at:
+        the caller knows that the others stayed in their cells.
+        """
+        move = self.index.move
+        if moved is None:
+            for sprite in self._order:
+                move(sprite, sprite.rect)
+            self._pending.clear()
+            return
+        order = self._order
+        for sprite in moved:
+            if sprite in order:
+                move(sprite, sprite.rect)
+        self._flush_pending()
+
+    def _flush_pending(self):
+        if self._pending:
+            move = self.index.move
+            for sprite in self._pending:
+                move(sprite, sprite.rect)
+            self._pending.clear()
+
+    def candidates(self, rect):
+        self._flush_pending()
+        return self.index.query(rect)
+
+    def collide_rect(self, rect, dokill, narrow=None):
+        """Same result as pg.sprite.spritecollide for a sprite with 'rect',
+        as long as refresh() ran after the members moved.
+        'narrow' is called for each member whose rect collides and
+        drops it from the hits when it returns False.
+        """
+        hits = [sprite for sprite in self.candidates(rect)
+                if rect.colliderect(sprite.rect)]
+        if narrow is not None:
+            hits = [sprite for sprite in hits if narrow(sprite)]
+        hits.sort(key=self._order.__getitem__)
+        if dokill:
+            for sprite in hits:
+                sprite.kill()
+        return hits
+
+    def collide_circle(self, center, radius, dokill):
+        """Returns (sprite, distance) pairs for the members whose rect is
+        within 'radius' of 'center', the distance being measured from the
+        center to the nearest point of the rect.
+        """
+        cx, cy = center
+        area = pg.Rect(cx - radius, cy - radius, 2 * radius + 1, 2 * radius + 1)
+        hits = []
+        for sprite in self.candidates(area):
+            rect = sprite.rect
+            dx = max(rect.left - cx, 0, cx - rect.right + 1)
+            dy = max(rect.top - cy, 0, cy - rect.bottom + 1)
+            distance = (dx * dx + dy * dy) ** 0.5
+            if distance <= radius:
+                hits.append((sprite, distance))
+        hits.sort(key=lambda hit: self._order[hit[0]])
+        if dokill:
+            for sprite, _ in hits:
+                sprite.kill()
+        return hits
+
+    def spritecollide(self, sprite, dokill, pixel=False):
+        """With 'pixel' the rect hits are narrowed down to the members
+        whose mask overlaps the mask of 'sprite'.
+        """
+        if pixel:
+            return self.collide_rect(sprite.rect, dokill,
+                                     lambda member: collide_masks(sprite, member))
+        return self.collide_rect(sprite.rect, dokill)
+
+
+def groupcollide(groupa, groupb, dokilla, dokillb, pixel=False):
+    """Same result as pg.sprite.groupcollide for two SpatialGroups,
+    or as with pg.sprite.collide_mask when 'pixel' is set, provided
+    both groups were refreshed after their members moved.
+    Only the members of 'groupa' that share a cell with a member
+    of 'groupb' are tested, in the order of 'groupa'.
+    """
+    candidates = set()
+    for sprite in groupb:
+        candidates.update(groupa.candidates(sprite.rect))
+    crashed = {}
+    for sprite in sorted(candidates, key=groupa._order.__getitem__):
+        collision = groupb.spritecollide(sprite, dokillb, pixel)
+        if collision:
+            crashed[sprite] = collision
+            if dokilla:
+                sprite.kill()
+    return crashed
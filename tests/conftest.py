@@ -0,0 +1,22 @@
+import os
+import sys
+import pygame as pg
+import pytest
+
+# the game modules live at the repository root; no window or audio device
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+
+@pytest.fixture(scope="session")
+def game():
+    """The one headless Game of the test run; the sprite classes and
+    SCORE are shared, so tests reset it instead of making another.
+    """
+    from game import Game
+
+    game = Game(headless=True, seed=0, asset_cache=False)
+    game.initialize(True)
+    yield game
+    pg.quit()
@@ -0,0 +1,229 @@
+import math
+import types
+import pygame as pg
+import pytest
+
+from audio import VoiceManager
+
+
+class FakeChannel:
+    """A mixer channel that is busy until the test ends what it plays."""
+
+    def __init__(self, index):
+        self.index = index
+        self.sound = None
+        self.volume = None
+        self.plays = 0
+
+    def play(self, sound):
+        self.sound = sound
+        self.plays += 1
+
+    def set_volume(self, volume):
+        self.volume = volume
+
+    def get_busy(self):
+        return self.sound is not None
+
+    def stop(self):
+        self.sound = None
+
+
+class FakeMixer(types.SimpleNamespace):
+    def __init__(self):
+        super().__init__(channels=8, reserved=0)
+        self.made = {}
+
+    def get_num_channels(self):
+        return self.channels
+
+    def set_num_channels(self, count):
+        self.channels = count
+
+    def set_reserved(self, count):
+        self.reserved = count
+
+    def Channel(self, index):
+        return self.made.setdefault(index, FakeChannel(index))
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """The milliseconds of pg.time.get_ticks(), set by the test."""
+    clock = types.SimpleNamespace(now=1000)
+    monkeypatch.setattr(pg.time, "get_ticks", lambda: clock.now)
+    return clock
+
+
+@pytest.fixture
+def mixer(monkeypatch, clock):
+    mixer = FakeMixer()
+    # the headless game of the other tests runs without a mixer
+    monkeypatch.setattr(pg, "mixer", mixer)
+    return mixer
+
+
+def manager(*sounds):
+    """A VoiceManager with (name, priority, voices) sounds; each sound
+    is its name.
+    """
+    audio = VoiceManager()
+    for name, priority, voices in sounds:
+        audio.add_sound(name, name, 0.5, priority, voices)
+    return audio
+
+
+def channels(audio, name):
+    return [voice.channel for voice in audio._voices if voice.owner == name]
+
+
+def test_channels_are_reserved_for_the_sounds(mixer):
+    audio = manager(("shot", 0, 3), ("boom", 2, 2))
+    assert mixer.reserved == 5
+    assert [channel.index for channel in channels(audio, "shot")] == [0, 1, 2]
+    assert [channel.index for channel in channels(audio, "boom")] == [3, 4]
+    audio = manager(*[(str(i), 0, 2) for i in range(6)])
+    assert mixer.channels == mixer.reserved == 12
+
+
+def test_sounds_without_a_mixer_or_not_loaded_are_ignored(mixer, monkeypatch):
+    audio = manager(("shot", 0, 1))
+    audio.add_sound("boom", None, voices=2)
+    audio.request("boom")
+    monkeypatch.setattr(pg, "mixer", None)
+    audio.add_sound("late", "late")
+    audio.request("late")
+    audio.flush()
+    assert len(audio._voices) == 1
+    assert audio.stats()["requests"] == 2
+    assert audio.stats()["played"] == 0
+
+
+def test_requests_of_a_step_are_merged_into_one_louder_play(mixer):
+    audio = manager(("shot", 0, 2), ("boom", 0, 1))
+    for _ in range(4):
+        audio.request("shot")
+    audio.request("boom")
+    audio.flush()
+    shot, spare = channels(audio, "shot")
+    assert (shot.plays, spare.plays) == (1, 0)
+    assert shot.volume == pytest.approx(0.5 * (1 + VoiceManager.hit_gain * math.log2(4)))
+    assert channels(audio, "boom")[0].volume == 0.5
+    assert audio.stats() == {"requests": 5, "played": 2, "merged": 3,
+                             "dropped": 0, "stolen": 0, "shed": 0}
+    # the queue is empty after a flush
+    audio.flush()
+    assert audio.played == 2
+    # a loud burst is not louder than full volume
+    channels(audio, "boom")[0].stop()
+    for _ in range(1 << 10):
+        audio.request("boom")
+    audio.flush()
+    assert channels(audio, "boom")[0].volume == 1.0
+
+
+def test_sounds_below_the_min_priority_are_shed(mixer):
+    audio = manager(("shot", 0, 1), ("boom", 2, 1))
+    audio.min_priority = 1
+    audio.request("shot")
+    audio.request("boom")
+    audio.flush()
+    assert channels(audio, "shot")[0].plays == 0
+    assert channels(audio, "boom")[0].plays == 1
+    assert audio.stats()["shed"] == 1
+    assert audio.stats()["played"] == 1
+
+
+def test_higher_priority_borrows_free_channels_of_lower_ones(mixer):
+    audio = manager(("shot", 0, 2), ("boom", 2, 1))
+    audio.request("boom")
+    audio.flush()
+    audio.request("boom")
+    audio.flush()
+    # the second boom plays on a free channel of the shot
+    assert [channel.sound for channel in channels(audio, "shot")] == ["boom", None]
+    assert audio.stolen == 0
+    # a lower priority does not borrow from a higher one, it cuts
+    # one of its own channels that played long enough
+    for channel in channels(audio, "shot"):
+        channel.sound = "shot"
+    audio.request("shot")
+    audio.flush()
+    assert channels(audio, "boom")[0].sound == "boom"
+    assert audio.stats()["dropped"] == 0
+    assert audio.stats()["stolen"] == 1
+
+
+def test_the_first_requests_of_a_flush_are_of_the_highest_priority(mixer):
+    audio = manager(("shot", 0, 1), ("boom", 2, 1), ("alarm", 1, 0))
+    audio.request("shot")
+    audio.request("alarm")
+    audio.request("boom")
+    audio.flush()
+    # boom and alarm take the channels before the shot asks for one
+    assert channels(audio, "boom")[0].sound == "boom"
+    assert channels(audio, "shot")[0].sound == "alarm"
+    assert audio.stats()["dropped"] == 1
+
+
+def test_voices_are_stolen_only_after_they_played_long_enough(mixer, clock):
+    audio = manager(("shot", 0, 2))
+    first, second = channels(audio, "shot")
+    audio.request("shot")
+    audio.flush()
+    clock.now += 10
+    audio.request("shot")
+    audio.flush()
+    assert (first.plays, second.plays) == (1, 1)
+
+    clock.now += VoiceManager.min_voice_time - 20
+    audio.request("shot")
+    audio.flush()
+    assert audio.stats()["dropped"] == 1
+    assert audio.stats()["stolen"] == 0
+
+    # the oldest voice is cut first
+    clock.now += 10
+    audio.request("shot")
+    audio.flush()
+    assert (first.plays, second.plays) == (2, 1)
+    assert audio.stats()["stolen"] == 1
+
+
+def test_own_channels_lent_to_other_sounds_are_stolen_first(mixer, clock):
+    audio = manager(("boom", 2, 2), ("shot", 0, 1))
+    own, lent = channels(audio, "boom")
+    shot = channels(audio, "shot")[0]
+    # the boom plays on its first channel, the shot borrowed the second
+    for voice, channel, name in zip(audio._voices, (own, lent, shot), ("boom", "shot", "shot")):
+        channel.play(name)
+        voice.playing = name
+        voice.started = clock.now
+        clock.now += 10
+    clock.now += VoiceManager.min_voice_time
+    audio.request("boom")
+    audio.flush()
+    # the lent channel goes before the older one playing the boom
+    assert (own.plays, lent.plays, shot.plays) == (1, 2, 1)
+    assert lent.sound == "boom"
+    assert audio.stats()["stolen"] == 1
+
+
+def test_a_sound_takes_its_channel_back_from_a_higher_one(mixer, clock):
+    audio = manager(("shot", 0, 1), ("boom", 2, 1))
+    shot, boom = channels(audio, "shot")[0], channels(audio, "boom")[0]
+    audio.request("boom")
+    audio.flush()
+    audio.request("boom")
+    audio.flush()
+    assert shot.sound == boom.sound == "boom"
+    audio.request("shot")
+    audio.flush()
+    assert shot.sound == "boom"
+    clock.now += VoiceManager.min_voice_time
+    audio.request("shot")
+    audio.flush()
+    # the shot cuts the boom on its own channel, never on the boom's
+    assert (shot.sound, boom.sound) == ("shot", "boom")
+    assert audio.stats() == {"requests": 4, "played": 3, "merged": 0,
+                             "dropped": 1, "stolen": 1, "shed": 0}
@@ -0,0 +1,158 @@
+import random
+import pygame as pg
+import pytest
+
+pytest.importorskip("numpy")
+
+from alien import Alien
+from bomb import Bomb
+from gift import Gift
+from entity_store import EntityStore
+from explosion import Explosion
+from random_streams import STREAMS
+from game_settings import SCREENRECT
+
+STEPS = 400
+
+
+def stores():
+    """The stores of Game._init_entity_stores(), by class."""
+    return {
+        Alien: EntityStore(Alien, bounce=True, animcycle=Alien.animcycle,
+                           period=Alien.period, x_vels=(-1, 1, 0)),
+        Bomb: EntityStore(Bomb),
+        Gift: EntityStore(Gift, bounce=True, animcycle=Gift.animcycle,
+                          period=Gift.period, x_vels=(0,)),
+    }
+
+
+def make_sprites(game, kind, count, seed):
+    """'count' sprites of 'kind' in random places, moving and animated
+    at random; the same for the same seed.
+    """
+    rng = random.Random(seed)
+    group = pg.sprite.Group()
+    sprites = []
+    for _ in range(count):
+        if kind is Bomb:
+            sprite = Bomb(game.player, game._all, group)
+        else:
+            sprite = kind(group)
+        # the aliens stay on the screen for all the steps, some of the
+        # faster bombs and gifts reach the bottom
+        top = rng.randrange(0, SCREENRECT.height // 3 if kind is Alien else
+                            SCREENRECT.height - 40)
+        sprite.rect.topleft = (rng.randrange(-20, SCREENRECT.width), top)
+        if kind is not Bomb:
+            sprite.x_vel = rng.choice((-3, -1, 0, 1, 3))
+            sprite.frame = rng.randrange(100)
+            sprite.image = kind.images[sprite.frame // kind.animcycle % 3]
+        sprites.append(sprite)
+    return group, sprites
+
+
+def trace(game, kind, store, seed, count=60):
+    """Steps sprites of 'kind' with the store or one by one; returns the
+    state of every sprite after every step.
+    """
+    kind.store = None
+    group, sprites = make_sprites(game, kind, count, seed)
+    STREAMS.seed(seed)
+    if store is not None:
+        kind.store = store
+        for sprite in sprites:
+            store.attach(sprite)
+
+    def x_vel(sprite):
+        # the store keeps the velocities in its arrays only
+        if sprite.slot is not None:
+            return int(store.x_vel[sprite.slot])
+        return sprite.velocity()[0]
+
+    states = []
+    for _ in range(STEPS):
+        if store is not None:
+            store.update()
+        else:
+            group.update()
+        states.append([(sprite.alive(), tuple(sprite.rect), kind.images.index(sprite.image),
+                        x_vel(sprite) if sprite.alive() else None) for sprite in sprites])
+    return states
+
+
+@pytest.fixture
+def clean_game(game):
+    game.reset(0)
+    yield game
+    # the sprites of the game die with the stores of the test
+    game.reset(0)
+
+
+@pytest.mark.parametrize("kind", [Alien, Bomb, Gift])
+@pytest.mark.parametrize("seed", [1, 2])
+def test_store_moves_like_the_sprites(clean_game, kind, seed):
+    one_by_one = trace(clean_game, kind, None, seed)
+    stored = trace(clean_game, kind, stores()[kind], seed)
+    assert stored == one_by_one
+    if kind is not Alien:
+        assert not all(alive for alive, *_ in stored[-1])
+
+
+def test_bombs_explode_at_the_bottom(clean_game):
+    store = stores()[Bomb]
+    Bomb.store = store
+    bomb = Bomb(clean_game.player, clean_game._all, clean_game.bombs, clean_game._all)
+    bomb.rect.bottom = SCREENRECT.height - 2 * Bomb.speed
+    store.detach(bomb)
+    store.attach(bomb)
+    store.update()
+    assert bomb.alive() and len(store) == 1
+    explosions = Explosion.alive_count
+    store.update()
+    assert not bomb.alive() and len(store) == 0
+    assert Explosion.alive_count == explosions + 1
+
+
+def test_crossed_lists_the_sprites_in_other_cells(clean_game):
+    store = stores()[Bomb]
+    Bomb.store = store
+    bombs = [Bomb(clean_game.player, clean_game._all, clean_game.bombs, clean_game._all)
+             for _ in range(3)]
+    for bomb, top in zip(bombs, (0, 64 - 2 * Bomb.speed, 64 - 1)):
+        bomb.rect.top = top
+        store.detach(bomb)
+        store.attach(bomb)
+    store.update()
+    # new to the store: all of them
+    assert set(store.crossed) == set(bombs)
+    for _ in range(40):
+        tops = [bomb.rect.top for bomb in bombs]
+        store.update()
+        expected = [bomb for bomb, top in zip(bombs, tops) if bomb.alive()
+                    and (top // 64, (top + bomb.rect.height - 1) // 64)
+                    != (bomb.rect.top // 64, (bomb.rect.bottom - 1) // 64)]
+        assert [bomb for bomb in store.crossed if bomb.alive()] == expected
+
+
+@pytest.mark.parametrize("seed", [3, 4])
+def test_game_with_the_store_finds_the_same_collisions(clean_game, seed):
+    """The spatial index refreshed from 'crossed' answers like one
+    refreshed from every member.
+    """
+    game = clean_game
+    game.entity_store = True
+    try:
+        game.reset(seed)
+        rng = random.Random(seed)
+        for _ in range(300):
+            Alien.spawn(game.aliens, game._all)
+        for _ in range(200):
+            game._step()
+            for group in (game.aliens, game.bombs, game.gifts):
+                for _ in range(5):
+                    rect = pg.Rect(rng.randrange(SCREENRECT.width),
+                                   rng.randrange(SCREENRECT.height), 30, 30)
+                    expected = [sprite for sprite in group if rect.colliderect(sprite.rect)]
+                    assert set(group.collide_rect(rect, False)) == set(expected)
+    finally:
+        game.entity_store = False
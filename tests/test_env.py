@@ -0,0 +1,135 @@
+import multiprocessing as mp
+import random
+from multiprocessing import shared_memory
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from env import GameEnv, VecGameEnv, WorkerError, NUM_ACTIONS
+
+SCREEN_SIZE = (64, 48)
+
+
+def in_own_process(function, *args):
+    """A GameEnv owns the pygame of its process, its close() quits it;
+    so it is run in a process of its own.
+    """
+    with mp.get_context("spawn").Pool(1) as pool:
+        return pool.apply(function, args)
+
+
+def play(env, observation, steps, seed):
+    """Random actions from 'seed' until the round ends; returns the
+    observations and rewards.
+    """
+    rng = random.Random(seed)
+    trace = [observation.tobytes()]
+    for _ in range(steps):
+        observation, reward, done, _ = env.step(rng.randrange(NUM_ACTIONS))
+        trace.append((observation.tobytes(), reward))
+        if done:
+            break
+    return trace
+
+
+def episodes(seed, steps):
+    env = GameEnv(seed=0, max_steps=steps)
+    try:
+        return {
+            "first": play(env, env.reset(seed), steps, 1),
+            "again": play(env, env.reset(seed), steps, 1),
+            "next": play(env, env.reset(), steps, 1),
+            "after_next": play(env, env.reset(), steps, 1),
+            "seed_plus_one": play(env, env.reset(seed + 1), steps, 1),
+        }
+    finally:
+        env.close()
+
+
+def test_game_env_reseeds_only_when_told():
+    traces = in_own_process(episodes, 7, 400)
+    assert traces["again"] == traces["first"]
+    # without a seed the rounds go on with the next seeds
+    assert traces["next"] != traces["first"]
+    assert traces["after_next"] != traces["next"]
+    assert traces["next"] == traces["seed_plus_one"]
+
+
+def screens_after_reset(steps):
+    env = GameEnv(seed=0, screen_size=SCREEN_SIZE, max_steps=steps)
+    try:
+        screens = []
+        for before in (1, 3):
+            env.reset(before)
+            for _ in range(steps):
+                env.step(0)
+            _, screen = env.reset(2)
+            screens.append(screen)
+        return screens
+    finally:
+        env.close()
+
+
+def test_game_env_reset_draws_the_new_round():
+    first, second = in_own_process(screens_after_reset, 60)
+    assert first.any()
+    # what the earlier round left on the screen is gone
+    assert np.array_equal(first, second)
+
+
+def vec_rollout(seed, steps, num_envs=2, max_steps=25):
+    env = VecGameEnv(num_envs, seed=seed, screen_size=SCREEN_SIZE, max_steps=max_steps)
+    try:
+        rng = random.Random(seed)
+        # every game plays the same keys in every round
+        actions = [rng.randrange(NUM_ACTIONS) for _ in range(max_steps)]
+        sprites, screens = env.reset()
+        trace = [(sprites.copy(), screens.copy())]
+        for step in range(steps):
+            action = actions[step % max_steps]
+            (sprites, screens), rewards, dones, infos = env.step([action] * num_envs)
+            assert sprites.shape == (num_envs, 128, 5)
+            assert screens.shape == (num_envs, SCREEN_SIZE[1], SCREEN_SIZE[0], 3)
+            trace.append((sprites.copy(), screens.copy(), rewards, dones,
+                          [info["steps"] for info in infos]))
+        return trace
+    finally:
+        env.close()
+
+
+def test_vec_game_env_steps_every_game_and_starts_new_rounds():
+    steps = 75
+    trace = vec_rollout(0, steps)
+    assert len(trace) == steps + 1
+    for step, entry in enumerate(trace[1:], 1):
+        dones = entry[3]
+        assert list(dones) == [step % 25 == 0] * 2
+        assert entry[4] == [25 if step % 25 == 0 else step % 25] * 2
+    # the games and their rounds have seeds of their own
+    rounds = [[entry[0][index] for entry in trace[1 + 25 * n:25 * (n + 1)]]
+              for index in range(2) for n in range(3)]
+    for i, one in enumerate(rounds):
+        for other in rounds[i + 1:]:
+            assert any(not np.array_equal(a, b) for a, b in zip(one, other))
+
+
+def test_vec_game_env_is_deterministic():
+    one, other = vec_rollout(3, 40), vec_rollout(3, 40)
+    for a, b in zip(one, other):
+        assert all(np.array_equal(x, y) for x, y in zip(a, b))
+
+
+def test_vec_game_env_close():
+    env = VecGameEnv(2, seed=0)
+    names = [block.name for block in env._blocks]
+    processes = list(env._processes)
+    env.reset()
+    env.close()
+    assert env.closed
+    assert not any(process.is_alive() for process in processes)
+    for name in names:
+        with pytest.raises(FileNotFoundError):
+            shared_memory.SharedMemory(name=name)
+    env.close()
+    with pytest.raises(WorkerError):
+        env.step([0, 0])
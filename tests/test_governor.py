@@ -0,0 +1,125 @@
+import pygame as pg
+import pytest
+
+from explosion import Explosion, EXPLOSION_LIFE, EXPLOSION_ANIMCYCLE
+from governor import PerformanceGovernor, GOVERNOR_LEVELS
+
+BUDGET = 10.0
+WINDOW = 4
+RESTORE = 6
+SLOW = BUDGET                   # above high_load of the budget
+FAST = BUDGET * 0.5             # below low_load
+MIDDLE = BUDGET * 0.75          # between the two
+
+
+def governor():
+    return PerformanceGovernor(BUDGET, window=WINDOW, restore_after=RESTORE)
+
+
+def feed(governor, frame_ms, frames):
+    """Returns the frames (counted from 1) after which the level changed."""
+    return [frame for frame in range(1, frames + 1) if governor.observe(frame_ms)]
+
+
+def test_sheds_a_level_per_window_of_slow_frames():
+    gov = governor()
+    assert feed(gov, SLOW, WINDOW - 1) == []
+    assert gov.level == 0
+    # one level, then a new window of frames before the next
+    assert feed(gov, SLOW, 3 * WINDOW) == [1, WINDOW + 1, 2 * WINDOW + 1]
+    assert gov.level == 3
+
+
+def test_stops_at_the_last_level():
+    gov = governor()
+    feed(gov, SLOW, 100 * WINDOW)
+    assert gov.level == len(GOVERNOR_LEVELS) - 1
+    assert gov.settings is GOVERNOR_LEVELS[-1]
+    assert gov.stats()["changes"] == len(GOVERNOR_LEVELS) - 1
+
+
+def test_restores_a_level_after_calm_frames_in_a_row():
+    gov = governor()
+    feed(gov, SLOW, 2 * WINDOW)
+    assert gov.level == 2
+    assert feed(gov, FAST, 2 * RESTORE) == [RESTORE, 2 * RESTORE]
+    assert gov.level == 0
+    assert feed(gov, FAST, 10 * RESTORE) == []
+    assert [(old, new) for _, old, new, _ in gov.history] == [(0, 1), (1, 2), (2, 1), (1, 0)]
+
+
+def test_frames_between_the_loads_hold_the_level():
+    gov = governor()
+    feed(gov, SLOW, WINDOW)
+    assert gov.level == 1
+    # neither slow enough to shed nor fast enough to restore
+    assert feed(gov, MIDDLE, 10 * RESTORE) == []
+    # a frame that is not calm starts the count of calm frames over
+    feed(gov, FAST, RESTORE - 1)
+    feed(gov, MIDDLE, 1)
+    assert feed(gov, FAST, RESTORE - 1) == []
+    assert feed(gov, FAST, 1) == [1]
+    assert gov.level == 0
+
+
+def test_a_slow_spike_does_not_shed():
+    gov = governor()
+    feed(gov, FAST, WINDOW)
+    # the average of the window stays below the high load
+    assert feed(gov, BUDGET * 1.5, 1) == []
+    assert gov.level == 0
+
+
+def test_explosion_limits_come_back(game):
+    Explosion.set_limits(0.5, 2, 8)
+    assert (Explosion.defaultlife, Explosion.animcycle, Explosion.max_alive) == (
+        EXPLOSION_LIFE // 2, EXPLOSION_ANIMCYCLE * 2, 8)
+    Explosion.set_limits()
+    assert (Explosion.defaultlife, Explosion.animcycle, Explosion.max_alive) == (
+        EXPLOSION_LIFE, EXPLOSION_ANIMCYCLE, None)
+
+
+def test_explosion_cap_counts_the_live_explosions(game):
+    game.reset(0)
+    rect = pg.Rect(100, 100, 20, 20)
+    try:
+        Explosion.set_limits(max_alive=3)
+        started = [Explosion.spawn(rect, game._all) for _ in range(5)]
+        assert started[3:] == [None, None]
+        assert Explosion.alive_count == 3
+        started[0].kill()
+        assert Explosion.spawn(rect, game._all) is not None
+        # an explosion in no group is never killed, it is not counted
+        Explosion(rect)
+        assert Explosion.alive_count == 3
+        game.reset(0)
+        assert Explosion.alive_count == 0
+    finally:
+        Explosion.set_limits()
+
+
+def test_reset_forgets_a_stale_explosion_count(game):
+    Explosion.alive_count = 50
+    Explosion.set_limits(max_alive=8)
+    try:
+        game.reset(0)
+        assert Explosion.alive_count == 0
+        assert Explosion.spawn(pg.Rect(0, 0, 10, 10), game._all) is not None
+    finally:
+        Explosion.set_limits()
+        game.reset(0)
+
+
+@pytest.mark.parametrize("level", range(len(GOVERNOR_LEVELS)))
+def test_governor_levels_are_applied(game, level):
+    saved, game.governor = game.governor, governor()
+    try:
+        game.governor.level = level
+        game._apply_governor_level()
+        settings = GOVERNOR_LEVELS[level]
+        assert Explosion.max_alive == settings["max_explosions"]
+        assert Explosion.animcycle == EXPLOSION_ANIMCYCLE * settings["explosion_animcycle"]
+    finally:
+        game.governor.level = 0
+        game._apply_governor_level()
+        game.governor = saved
@@ -0,0 +1,75 @@
+import pygame as pg
+import pytest
+
+from alien import Alien
+from bomb import Bomb
+from masks import add_masks, collide_masks, mask_of
+
+
+def disc(size, center):
+    """A sprite with a filled circle on a transparent (colorkey) square."""
+    sprite = pg.sprite.Sprite()
+    sprite.image = pg.Surface((size, size))
+    sprite.image.set_colorkey((0, 0, 0))
+    pg.draw.circle(sprite.image, (255, 255, 255), (size // 2, size // 2), size // 2)
+    sprite.rect = sprite.image.get_rect(center=center)
+    return sprite
+
+
+def test_transparent_corners_do_not_collide():
+    a = disc(20, (100, 100))
+    # the rects overlap by 4x4 pixels, corner to corner
+    b = disc(20, (116, 116))
+    assert a.rect.colliderect(b.rect)
+    assert not collide_masks(a, b)
+    assert not collide_masks(b, a)
+
+
+def test_opaque_pixels_collide():
+    a = disc(20, (100, 100))
+    assert collide_masks(a, disc(20, (110, 100)))
+    assert collide_masks(a, disc(4, (100, 100)))
+
+
+def test_masks_are_computed_once_per_image():
+    image, other = disc(10, (0, 0)).image, disc(10, (0, 0)).image
+    add_masks([image])
+    assert mask_of(image) is mask_of(image)
+    # one missed by add_masks() is computed on first use
+    assert mask_of(other) is mask_of(other)
+
+
+def corner_overlap(a, b):
+    """Moves sprite 'b' to a place where its rect overlaps the rect of
+    'a' but none of their opaque pixels do; returns False when there
+    is no such place.
+    """
+    for dx in range(-b.rect.width + 1, a.rect.width):
+        for dy in range(-b.rect.height + 1, a.rect.height):
+            b.rect.topleft = (a.rect.left + dx, a.rect.top + dy)
+            if not collide_masks(a, b):
+                return True
+    return False
+
+
+@pytest.mark.parametrize("category, kind", [("alien_player", Alien), ("bomb_player", Bomb)])
+@pytest.mark.parametrize("pixel", [False, True])
+def test_pixel_collisions_spare_the_player(game, category, kind, pixel):
+    saved = game.pixel_collisions
+    game.pixel_collisions = frozenset([category] if pixel else [])
+    try:
+        game.reset(0)
+        if kind is Alien:
+            group, check = game.aliens, game._check_alien_player_collision
+            sprite = Alien.spawn(game.aliens, game._all)
+        else:
+            group, check = game.bombs, game._check_bomb_player_collision
+            sprite = Bomb.spawn(game.player, game._all, game.bombs, game._all)
+        assert corner_overlap(game.player, sprite)
+        group.refresh()
+        check()
+        assert game.player.alive() == pixel
+        assert sprite.alive() == pixel
+    finally:
+        game.pixel_collisions = saved
+        game.reset(0)
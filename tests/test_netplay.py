@@ -0,0 +1,215 @@
+import random
+import socket
+import time
+import pygame as pg
+import pytest
+
+from game_settings import INTERP_DELAY_TICKS, TICK_RATE
+from netplay import (KINDS, PLAYER_KIND, MSG_BYE, MSG_INPUT, MSG_SNAPSHOT,
+                     GameClient, GameServer, encode_snapshot, decode_snapshot)
+from player import Player
+from replay import KEY_BITS
+
+LEFT = KEY_BITS[pg.K_LEFT]
+RIGHT = KEY_BITS[pg.K_RIGHT]
+
+
+def random_fields(rng):
+    """(kind, image index, x, y, width, height) across the field ranges."""
+    return (rng.randrange(len(KINDS)), rng.randrange(256),
+            rng.randint(-32768, 32767), rng.randint(-32768, 32767),
+            rng.randrange(65536), rng.randrange(65536))
+
+
+def random_state(rng, ids):
+    return {sprite_id: random_fields(rng) for sprite_id in ids}
+
+
+def next_state(rng, base):
+    """'base' with some sprites gone, some new and some fields changed."""
+    state = {}
+    for sprite_id, fields in base.items():
+        roll = rng.random()
+        if roll < 0.2:
+            continue
+        if roll < 0.6:
+            fields = list(fields)
+            for i in rng.sample(range(len(fields)), rng.randint(1, len(fields))):
+                fields[i] = random_fields(rng)[i]
+            fields = tuple(fields)
+        state[sprite_id] = fields
+    top = max(base, default=0)
+    state.update(random_state(rng, range(top + 1, top + 1 + rng.randint(0, 20))))
+    return state
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_delta_snapshot_round_trip(seed):
+    rng = random.Random(seed)
+    base = random_state(rng, rng.sample(range(1, 2 ** 32), rng.randint(0, 60)))
+    state = next_state(rng, base)
+    data = encode_snapshot(12, 7, 99, -5, state, base)
+    assert decode_snapshot(data, {7: base}) == (12, 99, -5, state)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_full_snapshot_round_trip(seed):
+    rng = random.Random(seed)
+    state = random_state(rng, range(1, rng.randint(1, 200)))
+    data = encode_snapshot(3, 0, 1, 2 ** 40, state, {})
+    assert decode_snapshot(data, {}) == (3, 1, 2 ** 40, state)
+
+
+def test_chain_of_deltas_follows_the_states():
+    rng = random.Random(1)
+    states = {1: random_state(rng, range(1, 40))}
+    decoded = {1: decode_snapshot(encode_snapshot(1, 0, 0, 0, states[1], {}), {})[3]}
+    for tick in range(2, 200):
+        # like a client that acknowledged a tick a few ticks ago
+        baseline = rng.randint(max(1, tick - 5), tick - 1)
+        states[tick] = next_state(rng, states[tick - 1])
+        data = encode_snapshot(tick, baseline, 0, 0, states[tick], states[baseline])
+        decoded[tick] = decode_snapshot(data, decoded)[3]
+        assert decoded[tick] == states[tick]
+
+
+def test_unchanged_state_sends_no_sprites():
+    rng = random.Random(2)
+    state = random_state(rng, range(1, 50))
+    data = encode_snapshot(5, 4, 0, 0, state, dict(state))
+    full = encode_snapshot(5, 0, 0, 0, state, {})
+    assert len(data) < len(full)
+    assert decode_snapshot(data, {4: state})[3] == state
+
+
+def test_unknown_baseline_is_not_decoded():
+    rng = random.Random(3)
+    base = random_state(rng, range(1, 10))
+    data = encode_snapshot(9, 8, 0, 0, next_state(rng, base), base)
+    assert decode_snapshot(data, {7: base}) is None
+
+
+def test_broken_snapshots_raise_value_error():
+    rng = random.Random(4)
+    base = random_state(rng, range(1, 20))
+    data = encode_snapshot(6, 5, 0, 0, next_state(rng, base), base)
+    for size in range(len(data)):
+        with pytest.raises(ValueError):
+            decode_snapshot(data[:size], {5: base})
+    with pytest.raises(ValueError):
+        decode_snapshot(data + b"\0", {5: base})
+    with pytest.raises(ValueError):
+        decode_snapshot(bytes([MSG_INPUT]) + data[1:], {5: base})
+    # removes a sprite the baseline does not have
+    with pytest.raises(ValueError):
+        decode_snapshot(encode_snapshot(6, 5, 0, 0, {}, {99: base[1]}), {5: base})
+
+
+JUNK = [b"", bytes([MSG_BYE]) + b"\0", bytes([MSG_SNAPSHOT]), bytes([MSG_INPUT]) * 3,
+        bytes([MSG_INPUT]) * 50, bytes(range(256)) * 4]
+
+
+@pytest.fixture
+def server():
+    server = GameServer("127.0.0.1", 0, seed=3)
+    yield server
+    server.close()
+
+
+def test_server_and_client_survive_malformed_datagrams(server):
+    client = GameClient(server.address)
+    junk = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        for _ in range(3):
+            client.send_input(0)
+            for data in JUNK:
+                junk.sendto(data, server.address)
+            server.tick()
+        time.sleep(0.05)
+        assert server.stats()["malformed"] == 3 * len(JUNK)
+        assert [port for _, port in server.clients] == [client.socket.getsockname()[1]]
+
+        for data in JUNK:
+            junk.sendto(data, client.socket.getsockname())
+        time.sleep(0.05)
+        client.poll()
+        assert client.stats()["undecodable"] == len(JUNK)
+        assert client.latest == server.tick_count
+        assert client.states[client.latest][0] == server.history[server.tick_count]
+    finally:
+        junk.close()
+        client.close()
+
+
+def client_with(*states, tick_rate=TICK_RATE):
+    """A GameClient that received 'states' on the ticks 1, 2, ... one
+    tick apart, the last just now.
+    """
+    client = GameClient(("127.0.0.1", 9), tick_rate)
+    now = time.perf_counter()
+    for tick, state in enumerate(states, 1):
+        client.states[tick] = (state, 0, 0, now - (len(states) - tick) / tick_rate)
+    client.latest = len(states)
+    return client, now
+
+
+def test_view_interpolates_between_the_snapshots():
+    client, now = client_with({5: (1, 0, 0, 0, 8, 8)},
+                              {5: (1, 2, 10, 20, 8, 8)},
+                              {5: (1, 2, 40, 40, 8, 8)})
+    try:
+        # halfway between the ticks 1 and 2
+        at = now + (INTERP_DELAY_TICKS - 1.5) / TICK_RATE
+        assert client.view(at) == [(5, 1, 0, pg.Rect(5, 10, 8, 8))]
+        # before the first snapshot the first is shown as it is
+        early = now - INTERP_DELAY_TICKS / TICK_RATE
+        assert client.view(early) == [(5, 1, 0, pg.Rect(0, 0, 8, 8))]
+        # past the newest snapshot the newest is shown
+        late = now + (INTERP_DELAY_TICKS + 5) / TICK_RATE
+        assert client.view(late) == [(5, 1, 2, pg.Rect(40, 40, 8, 8))]
+    finally:
+        client.close()
+
+
+def test_view_shows_the_sprites_of_the_older_snapshot():
+    # 5 is gone in the newer one and 7 not there yet in the older one
+    client, now = client_with({5: (1, 0, 0, 0, 8, 8), 6: (2, 0, 30, 30, 4, 4)},
+                              {6: (2, 0, 50, 30, 4, 4), 7: (3, 0, 1, 1, 2, 2)})
+    try:
+        at = now + (INTERP_DELAY_TICKS - 0.5) / TICK_RATE
+        assert client.view(at) == [(5, 1, 0, pg.Rect(0, 0, 8, 8)),
+                                   (6, 2, 0, pg.Rect(40, 30, 4, 4))]
+    finally:
+        client.close()
+
+
+@pytest.mark.parametrize("keys", [[LEFT] * 3, [RIGHT] * 5, [0, RIGHT, 0, LEFT, LEFT],
+                                  [RIGHT] * 60, [LEFT | RIGHT, 0]])
+def test_predicted_player_moves_like_the_player(game, keys):
+    player = Player()
+    client, _ = client_with({1: (PLAYER_KIND, 0, *player.rect)})
+    try:
+        for bits in keys:
+            client._pending[len(client._pending) + 1] = bits
+            direction = bool(bits & RIGHT) - bool(bits & LEFT)
+            player.move(direction)
+        image = player.images.index(player.image)
+        assert client.view() == [(1, PLAYER_KIND, image, player.rect)]
+    finally:
+        client.close()
+
+
+def test_acknowledged_inputs_are_not_predicted_again(server):
+    client = GameClient(server.address)
+    try:
+        for _ in range(4):
+            client.send_input(RIGHT)
+        time.sleep(0.05)
+        server.tick()
+        time.sleep(0.05)
+        client.poll()
+        assert client.stats()["pending_inputs"] == 0
+        client.send_input(RIGHT)
+        assert list(client._pending) == [5]
+    finally:
+        client.close()
@@ -0,0 +1,123 @@
+import pygame as pg
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from game_settings import SCREENRECT
+from particles import ParticleSystem
+from random_streams import RandomStream
+
+CENTER = (SCREENRECT.centerx, SCREENRECT.centery)
+
+
+def particles(capacity=256, seed=0, **attributes):
+    system = ParticleSystem(capacity=capacity, rng=RandomStream(seed))
+    for name, value in attributes.items():
+        setattr(system, name, value)
+    return system
+
+
+def test_emit_starts_a_burst_at_the_center():
+    system = particles()
+    assert system.emit(CENTER, 50, speed=3.0, life=24) == 50
+    assert len(system) == 50
+    assert np.all(system.pos[:50] == CENTER)
+    speeds = np.hypot(system.vel[:50, 0], system.vel[:50, 1])
+    assert np.all(speeds <= 3.0 + 1e-5)
+    assert speeds.min() < speeds.max()
+    # between half the life and all of it, plus the step of the emit
+    assert np.all((system.life[:50] >= 13) & (system.life[:50] <= 25))
+    assert np.array_equal(system.life[:50], system.max_life[:50])
+    assert system.stats() == {"live": 50, "emitted": 50, "dropped": 0}
+
+
+def test_bursts_are_the_same_for_the_same_seed():
+    one, other, third = particles(seed=4), particles(seed=4), particles(seed=5)
+    for system in (one, other, third):
+        system.emit(CENTER, 40)
+        system.emit((10, 10), 40)
+    assert np.array_equal(one.vel[:80], other.vel[:80])
+    assert np.array_equal(one.color[:80], other.color[:80])
+    assert not np.array_equal(one.vel[:80], third.vel[:80])
+
+
+def test_capacity_limits_the_live_particles():
+    system = particles(capacity=100)
+    assert system.emit(CENTER, 70) == 70
+    assert system.emit(CENTER, 70) == 30
+    assert system.emit(CENTER, 70) == 0
+    assert len(system) == 100
+    assert system.stats()["emitted"] == 100
+
+
+def test_burst_scale_shrinks_the_bursts():
+    system = particles(burst_scale=0.25)
+    assert system.emit(CENTER, 40) == 10
+    system.burst_scale = 0.0
+    assert system.emit(CENTER, 40) == 0
+    assert len(system) == 10
+
+
+def test_particles_move_fall_and_slow_down():
+    system = particles(gravity=0.5, drag=0.5)
+    system.emit(CENTER, 20)
+    pos, vel = system.pos[:20].copy(), system.vel[:20].copy()
+    system.update()
+    assert np.allclose(system.pos[:20], pos + vel)
+    expected = vel * 0.5
+    expected[:, 1] += 0.5
+    assert np.allclose(system.vel[:20], expected)
+
+
+def test_particles_age_out_and_stay_packed():
+    system = particles(gravity=0.0)
+    system.emit(CENTER, 30, speed=0.5, life=4)
+    system.emit(CENTER, 30, speed=0.5, life=40)
+    lives = []
+    for _ in range(40):
+        system.update()
+        lives.append(len(system))
+        # the live particles are at the front
+        assert np.all(system.life[:len(system)] > 0)
+    # the short ones live 3 to 5 steps, the long ones 21 to 41
+    assert lives[1] == 60
+    assert lives[4] == lives[19] == 30
+    assert np.all(system.max_life[:len(system)] >= 21)
+    assert lives[-1] < 30
+    assert system.stats()["dropped"] == 60 - len(system)
+    while len(system):
+        system.update()
+    assert system.stats() == {"live": 0, "emitted": 60, "dropped": 60}
+
+
+def test_particles_leaving_the_screen_are_dropped():
+    system = particles(gravity=0.0, drag=1.0)
+    system.emit((1, 1), 100, speed=4.0, life=100)
+    system.update()
+    left = len(system)
+    # the ones flying up or left are off the screen at once
+    assert 0 < left < 100
+    assert np.all(system.pos[:left] >= 0)
+    assert system.stats()["dropped"] == 100 - left
+
+
+def test_compose_covers_the_particles():
+    system = particles()
+    system.compose()
+    assert system.rect.size == (0, 0)
+    system.emit(CENTER, 40)
+    for _ in range(3):
+        system.update()
+    generation = system.generation
+    system.compose()
+    assert system.generation == generation + 1
+    assert system.image.get_size() == system.rect.size
+    xs, ys = system.pos[:len(system), 0], system.pos[:len(system), 1]
+    assert system.rect.left <= xs.min() and system.rect.right >= xs.max()
+    assert system.rect.top <= ys.min() and system.rect.bottom >= ys.max()
+    assert pg.mask.from_surface(system.image).count() > 0
+    # cleared, the next compose draws nothing
+    system.clear()
+    system.compose()
+    assert len(system) == 0
+    assert system.rect.size == (0, 0)
@@ -0,0 +1,96 @@
+import random
+import pytest
+
+import random_streams
+from random_streams import RandomStream, RandomStreams, STREAM_NAMES
+
+# small blocks, so that the draws cross many block borders
+BLOCK_SIZE = 7
+
+
+def draw(stream, rng, count=50):
+    """A random mix of single numbers and arrays from 'stream'."""
+    values = []
+    for _ in range(count):
+        if rng.random() < 0.2:
+            values.extend(stream.floats(rng.randint(0, 3 * BLOCK_SIZE)).tolist())
+        else:
+            values.append(stream.random())
+    return values
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_restore_repeats_the_numbers_after_the_snapshot(seed):
+    rng = random.Random(seed)
+    stream = RandomStream([seed, 0], block_size=BLOCK_SIZE)
+    draw(stream, rng, rng.randint(0, 30))
+    snapshot = stream.snapshot()
+    plan = rng.getstate()
+    first = draw(stream, rng)
+    rng.setstate(plan)
+    stream.restore(snapshot)
+    assert draw(stream, rng) == first
+
+
+@pytest.mark.parametrize("drawn", [BLOCK_SIZE - 1, BLOCK_SIZE, BLOCK_SIZE + 1, 2 * BLOCK_SIZE])
+def test_snapshot_at_a_block_border(drawn):
+    stream = RandomStream(1, block_size=BLOCK_SIZE)
+    stream.floats(drawn)
+    snapshot = stream.snapshot()
+    first = [stream.random() for _ in range(20)]
+    stream.restore(snapshot)
+    assert stream.floats(20).tolist() == first
+
+
+def test_restore_into_another_stream():
+    rng = random.Random(1)
+    stream = RandomStream(1, block_size=BLOCK_SIZE)
+    draw(stream, rng, 13)
+    other = RandomStream(2, block_size=BLOCK_SIZE)
+    other.restore(stream.snapshot())
+    assert [other.random() for _ in range(40)] == [stream.random() for _ in range(40)]
+
+
+def test_floats_are_the_next_numbers_of_the_stream():
+    a = RandomStream(3, block_size=BLOCK_SIZE)
+    b = RandomStream(3, block_size=BLOCK_SIZE)
+    a.random()
+    b.random()
+    assert a.floats(25).tolist() == [b.random() for _ in range(25)]
+    assert a.random() == b.random()
+
+
+def test_streams_do_not_shift_each_other():
+    quiet = RandomStreams(5)
+    busy = RandomStreams(5)
+    for _ in range(1000):
+        busy.spawn.random()
+    for name in STREAM_NAMES:
+        if name != "spawn":
+            assert getattr(busy, name).random() == getattr(quiet, name).random()
+
+
+def test_seed_restarts_every_stream():
+    streams = RandomStreams(7)
+    first = {name: getattr(streams, name).random() for name in STREAM_NAMES}
+    streams.seed(7)
+    assert {name: getattr(streams, name).random() for name in STREAM_NAMES} == first
+
+
+def test_streams_snapshot_round_trip():
+    streams = RandomStreams(9)
+    streams.bombs.floats(100)
+    snapshot = streams.snapshot()
+    first = [getattr(streams, name).random() for name in STREAM_NAMES for _ in range(30)]
+    streams.restore(snapshot)
+    assert [getattr(streams, name).random() for name in STREAM_NAMES for _ in range(30)] == first
+
+
+def test_restore_without_numpy(monkeypatch):
+    monkeypatch.setattr(random_streams, "np", None)
+    stream = RandomStream(4, block_size=BLOCK_SIZE)
+    [stream.random() for _ in range(10)]
+    snapshot = stream.snapshot()
+    first = [stream.random() for _ in range(30)]
+    stream.restore(snapshot)
+    assert [stream.random() for _ in range(30)] == first
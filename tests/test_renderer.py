@@ -0,0 +1,103 @@
+import random
+import pygame as pg
+import pytest
+
+from renderer import DirtyRenderer, merge_rects
+from game_settings import SCREENRECT
+
+
+def random_rects(rng, count, size=120):
+    return [pg.Rect(rng.randrange(-20, SCREENRECT.width), rng.randrange(-20, SCREENRECT.height),
+                    rng.randrange(0, size), rng.randrange(0, size)) for _ in range(count)]
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_merged_rects_cover_the_same_and_do_not_overlap(seed):
+    rng = random.Random(seed)
+    rects = random_rects(rng, rng.choice((5, 50, 400)))
+    merged = merge_rects(rects)
+    for i, rect in enumerate(merged):
+        assert rect.collidelist(merged[i + 1:]) < 0
+    # every pixel of the rects is in a merged rect
+    for rect in rects:
+        if rect.width and rect.height:
+            assert rect.collidelistall(merged)
+            assert rect.unionall(merged) == pg.Rect(rect).unionall(merged)
+            assert any(other.contains(rect) for other in merged)
+
+
+def test_merging_a_chain_reaches_back():
+    # the last rect joins the second one, which then reaches the first
+    rects = [pg.Rect(0, 0, 10, 10), pg.Rect(5, 20, 20, 10), pg.Rect(22, 5, 5, 20)]
+    assert merge_rects(rects) == [pg.Rect(0, 0, 27, 30)]
+
+
+class Thing:
+    """A sprite of the scene; 'dirty' like pg.sprite.DirtySprite."""
+
+    def __init__(self, image, rect):
+        self.image = image
+        self.rect = rect
+        self.dirty = 0
+
+
+def images(rng, count):
+    result = []
+    for _ in range(count):
+        image = pg.Surface((rng.randrange(4, 90), rng.randrange(4, 90)))
+        image.fill((0, 0, 0))
+        image.set_colorkey((0, 0, 0))
+        color = (rng.randrange(1, 256), rng.randrange(256), rng.randrange(256))
+        pg.draw.ellipse(image, color, image.get_rect())
+        result.append(image)
+    return result
+
+
+def full_redraw(background, things):
+    screen = background.copy()
+    screen.blits([(thing.image, thing.rect) for thing in things], doreturn=False)
+    return screen
+
+
+def change_scene(rng, things, pictures, moving):
+    for thing in things:
+        roll = rng.random()
+        if roll < moving:
+            thing.rect = thing.rect.move(rng.randint(-6, 6), rng.randint(-6, 6))
+        elif roll < moving + 0.03:
+            thing.image = rng.choice(pictures)
+            thing.rect = thing.image.get_rect(center=thing.rect.center)
+        elif roll < moving + 0.04:
+            thing.dirty = rng.choice((1, 2))
+    for thing in [thing for thing in things if rng.random() < 0.02]:
+        things.remove(thing)
+    for _ in range(rng.randrange(3)):
+        image = rng.choice(pictures)
+        things.insert(rng.randrange(len(things) + 1), Thing(
+            image, image.get_rect(center=(rng.randrange(SCREENRECT.width),
+                                          rng.randrange(SCREENRECT.height)))))
+
+
+@pytest.mark.parametrize("seed, count, moving", [(1, 10, 0.5), (2, 80, 0.2), (3, 300, 0.05),
+                                                 (4, 300, 0.5), (5, 40, 0.0)])
+@pytest.mark.parametrize("coverage", [0.5, 2.0])
+def test_screen_matches_a_full_redraw(game, seed, count, moving, coverage):
+    rng = random.Random(seed)
+    background = pg.Surface(SCREENRECT.size)
+    for rect in random_rects(rng, 30, 300):
+        background.fill((rng.randrange(256), rng.randrange(256), rng.randrange(256)), rect)
+    pictures = images(rng, 12)
+    things = [Thing(image, image.get_rect(center=(rng.randrange(SCREENRECT.width),
+                                                  rng.randrange(SCREENRECT.height))))
+              for image in (rng.choice(pictures) for _ in range(count))]
+    renderer = DirtyRenderer(pg.Surface(SCREENRECT.size), background, coverage)
+    for frame in range(40):
+        renderer.render([(thing, thing.image, thing.rect) for thing in things])
+        expected = full_redraw(background, things)
+        assert renderer.screen.get_view("2").raw == expected.get_view("2").raw, frame
+        change_scene(rng, things, pictures, moving)
+    stats = renderer.stats()
+    assert stats["frames"] == 40
+    if count <= 80 and moving < 0.5:
+        # a sparse scene that mostly stands still is not drawn as a whole
+        assert stats["sprites_skipped"] > 0
@@ -0,0 +1,69 @@
+import random
+import pytest
+
+from game_settings import SCORE
+from replay import KeyState, Replay, REPLAY_VERSION, _HEADER
+
+FRAMES = 1500
+
+
+class RandomKeys:
+    """Random key bits, held for a few steps at a time like a player."""
+
+    def __init__(self, seed):
+        self.rng = random.Random(seed)
+        self.bits = 0
+        self.left = 0
+
+    def next_keystate(self):
+        if self.left == 0:
+            self.bits = self.rng.getrandbits(8)
+            self.left = self.rng.randint(1, 12)
+        self.left -= 1
+        return KeyState(self.bits)
+
+
+def run(game, frames=FRAMES):
+    """Steps 'game' until the player dies or 'frames' steps were made;
+    returns the sprite rects and the score after every step.
+    """
+    trace = []
+    for _ in range(frames):
+        game.advance()
+        trace.append((SCORE.value, [(type(sprite).__name__, tuple(sprite.rect))
+                                    for sprite in game._all]))
+        if not game.player.alive():
+            break
+    return trace
+
+
+@pytest.mark.parametrize("entity_store", [False, True])
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_replay_reproduces_the_recorded_session(game, tmp_path, entity_store, seed):
+    path = tmp_path / "session.rec"
+    game.entity_store = entity_store
+    game.recorder = None
+    game.replay = RandomKeys(seed)
+    game.reset(seed)
+    game.start_recording()
+    recorded = run(game)
+    game.save_recording(path)
+    game.recorder = None
+
+    replay = Replay(path)
+    assert (replay.seed, replay.frames, replay.score) == (seed, len(recorded), SCORE.value)
+    assert replay.entity_store == entity_store
+    assert set(replay.pixel_collisions) == game.pixel_collisions
+    game.replay = replay
+    game.reset(replay.seed)
+    assert run(game, replay.frames) == recorded
+
+    game.replay = None
+    game.entity_store = False
+
+
+def test_replay_rejects_other_versions(tmp_path):
+    path = tmp_path / "old.rec"
+    path.write_bytes(_HEADER.pack(b"GSSREC", REPLAY_VERSION - 1, 0, 0, 0, 0))
+    with pytest.raises(SystemExit):
+        Replay(path)
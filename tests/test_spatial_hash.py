@@ -0,0 +1,129 @@
+import random
+import pygame as pg
+import pytest
+
+from game_settings import SCREENRECT
+from masks import clear_masks
+from spatial_hash import SpatialGroup, groupcollide
+
+TRIALS = 300
+
+
+class Block(pg.sprite.Sprite):
+    def __init__(self, image, topleft, *groups):
+        pg.sprite.Sprite.__init__(self, *groups)
+        self.image = image
+        self.rect = image.get_rect(topleft=topleft)
+
+
+def make_images(rng, count=4):
+    """Images with holes, so that the masks differ from the rects."""
+    images = []
+    for _ in range(count):
+        image = pg.Surface((rng.randint(4, 60), rng.randint(4, 60)))
+        image.set_colorkey((0, 0, 0))
+        image.fill((255, 255, 255))
+        for _ in range(5):
+            image.fill((0, 0, 0), (rng.randrange(image.get_width()), rng.randrange(image.get_height()),
+                                   rng.randint(1, 20), rng.randint(1, 20)))
+        images.append(image)
+    return images
+
+
+def random_topleft(rng):
+    # some of the sprites stick out of the screen
+    return (rng.randint(-40, SCREENRECT.width), rng.randint(-40, SCREENRECT.height))
+
+
+def twin_worlds(rng, images, counts):
+    """The same sprites twice: in SpatialGroups and in plain groups.
+    Returns (spatial groups, plain groups, spatial to plain sprite map).
+    """
+    spatial = [SpatialGroup() for _ in counts]
+    plain = [pg.sprite.Group() for _ in counts]
+    twin = {}
+    for spatial_group, plain_group, count in zip(spatial, plain, counts):
+        for _ in range(count):
+            image = rng.choice(images)
+            topleft = random_topleft(rng)
+            twin[Block(image, topleft, spatial_group)] = Block(image, topleft, plain_group)
+    return spatial, plain, twin
+
+
+def move_all(rng, spatial, twin):
+    for group in spatial:
+        for sprite in group:
+            topleft = random_topleft(rng)
+            sprite.rect.topleft = twin[sprite].rect.topleft = topleft
+
+
+def as_plain(twin, hits):
+    return [twin[sprite] for sprite in hits]
+
+
+@pytest.fixture(autouse=True)
+def masks():
+    yield
+    clear_masks()
+
+
+@pytest.mark.parametrize("pixel", [False, True])
+def test_spritecollide_matches_pygame(pixel):
+    rng = random.Random(1)
+    images = make_images(rng)
+    collided = pg.sprite.collide_mask if pixel else None
+    for _ in range(TRIALS):
+        (group,), (plain_group,), twin = twin_worlds(rng, images, [rng.randint(0, 40)])
+        image = rng.choice(images)
+        topleft = random_topleft(rng)
+        probe, plain_probe = Block(image, topleft), Block(image, topleft)
+        if rng.random() < 0.5:
+            # a stale index gives other results, refresh() brings it up to date
+            group.candidates(probe.rect)
+            move_all(rng, [group], twin)
+            group.refresh()
+        dokill = rng.random() < 0.5
+        expected = pg.sprite.spritecollide(plain_probe, plain_group, dokill, collided)
+        assert as_plain(twin, group.spritecollide(probe, dokill, pixel)) == expected
+        assert sorted(map(id, as_plain(twin, group))) == sorted(map(id, plain_group))
+
+
+@pytest.mark.parametrize("pixel", [False, True])
+def test_groupcollide_matches_pygame(pixel):
+    rng = random.Random(2)
+    images = make_images(rng)
+    collided = pg.sprite.collide_mask if pixel else None
+    for _ in range(TRIALS):
+        counts = [rng.randint(0, 40), rng.randint(0, 40)]
+        (group_a, group_b), (plain_a, plain_b), twin = twin_worlds(rng, images, counts)
+        if rng.random() < 0.5:
+            group_a.candidates(SCREENRECT)
+            group_b.candidates(SCREENRECT)
+            move_all(rng, [group_a, group_b], twin)
+            group_a.refresh()
+            group_b.refresh()
+        dokill_a, dokill_b = rng.random() < 0.5, rng.random() < 0.5
+        expected = pg.sprite.groupcollide(plain_a, plain_b, dokill_a, dokill_b, collided)
+        result = groupcollide(group_a, group_b, dokill_a, dokill_b, pixel)
+        assert [(twin[sprite], as_plain(twin, hits)) for sprite, hits in result.items()] \
+            == list(expected.items())
+        assert sorted(map(id, as_plain(twin, group_a))) == sorted(map(id, plain_a))
+        assert sorted(map(id, as_plain(twin, group_b))) == sorted(map(id, plain_b))
+
+
+def test_collide_circle_finds_the_rects_within_the_radius():
+    rng = random.Random(3)
+    images = make_images(rng)
+    for _ in range(TRIALS):
+        (group,), _, _ = twin_worlds(rng, images, [rng.randint(0, 40)])
+        center = random_topleft(rng)
+        radius = rng.randint(1, 200)
+        hits = [sprite for sprite, _ in group.collide_circle(center, radius, False)]
+        expected = []
+        for sprite in group.sprites():
+            rect = sprite.rect
+            dx = max(rect.left - center[0], 0, center[0] - rect.right + 1)
+            dy = max(rect.top - center[1], 0, center[1] - rect.bottom + 1)
+            if dx * dx + dy * dy <= radius * radius:
+                expected.append(sprite)
+        assert hits == expected
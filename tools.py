@@ -3,14 +3,19 @@ import pygame as pg
 from game_settings import MAIN_DIR
 
 
-def load_image(file):
-    """loads an image, prepares it for play"""
+def decode_image(file):
+    """loads an image without converting it,
+    safe to call outside the main thread"""
     file = os.path.join(MAIN_DIR, "data", file)
     try:
-        surface = pg.image.load(file)
+        return pg.image.load(file)
     except pg.error:
         raise SystemExit(f'Could not load image "{file}" {pg.get_error()}')
-    return surface.convert()
+
+
+def load_image(file):
+    """loads an image, prepares it for play"""
+    return decode_image(file).convert()
 
 
 def load_sound(file):